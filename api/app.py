@@ -1,11 +1,29 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
+from flask_sock import Sock
 import openai
 import os
 from datetime import datetime
 import json
 import requests
-import tempfile
+import time
+import atexit
+import copy
+import hashlib
+import hmac
+import io
+from concurrent.futures import ThreadPoolExecutor
+from conversation_journal import ConversationJournal
+from emergency_phrases import EmergencyMatcher
+from kb_compiled import load_knowledge_base
+from knowledge_base import SEARCHABLE_SECTIONS
+from message_store import MessageLog
+from speculation import Speculator
+from streaming_stt import SAMPLE_RATE, SAMPLE_RATES, ElevenLabsTranscriber, StreamingTranscription
+from token_usage import UsageTracker, extract_usage
+from treatment_state import TreatmentState
+from tts_formats import DEFAULT_FORMAT, AudioCache, UnsupportedFormat, negotiate
+from typeahead import TypeaheadIndex
 
 app = Flask(__name__)
 CORS(app, origins=[
@@ -13,10 +31,19 @@ CORS(app, origins=[
     "https://solstis-frontend.onrender.com",
     "https://*.onrender.com"
 ])
+sock = Sock(app)
 
 # Configure OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+# ElevenLabs base URL (override to point at a local stand-in for load testing)
+ELEVENLABS_API_BASE = os.getenv('ELEVENLABS_API_BASE', 'https://api.elevenlabs.io').rstrip('/')
+DEFAULT_VOICE_ID = os.getenv('ELEVENLABS_VOICE_ID', 'XcXEQzuLXRU9RcfWzEJt')
+
+# One keep-alive session for OpenAI and ElevenLabs, so requests reuse open TLS connections
+upstream = requests.Session()
+openai.requestssession = upstream
+
 # Kit data
 KITS = [
     {
@@ -119,8 +146,92 @@ KITS = [
 # Global conversation storage (in production, use a proper database)
 conversations = {}
 
-def get_system_prompt(kit_type):
-    """Generate system prompt based on kit type"""
+# zlib-compress turns that have left the prompt window (saves memory at high session counts)
+MessageLog.compress_cold = os.getenv('COMPRESS_COLD_TURNS', '0') == '1'
+
+# Optional durable journal so conversations survive redeploys and worker restarts.
+# Point CONVERSATION_JOURNAL_DIR at a persistent disk to enable it.
+# The journal belongs to one process: a second worker raises JournalLocked at import and fails to boot.
+journal = None
+if os.getenv('CONVERSATION_JOURNAL_DIR'):
+    journal = ConversationJournal(
+        os.getenv('CONVERSATION_JOURNAL_DIR'),
+        flush_interval=float(os.getenv('CONVERSATION_JOURNAL_FLUSH_MS', 100)) / 1000,
+        compact_every=int(os.getenv('CONVERSATION_JOURNAL_COMPACT_EVERY', 5000)),
+        session_ttl=int(os.getenv('CONVERSATION_SESSION_TTL', 24 * 3600))
+    )
+    restore_start = time.perf_counter()
+    conversations = journal.recover()
+    for restored in conversations.values():
+        restored['messages'] = MessageLog.from_dicts(restored['messages'])
+        restored['treatment'] = TreatmentState.from_messages(
+            restored['messages'], next((k for k in KITS if k["id"] == restored['kit_type']), None))
+    journal.state_provider = lambda: conversations
+    atexit.register(journal.close)
+    print(f"Restored {len(conversations)} conversations in {(time.perf_counter() - restore_start) * 1000:.1f} ms")
+
+# 'state' sends a compact treatment-state block plus the last few turns instead of
+# the last 10 raw messages, keeping prompt size near-constant over long sessions
+PROMPT_HISTORY_MODE = os.getenv('PROMPT_HISTORY_MODE', 'full')
+STATE_HISTORY_WINDOW = int(os.getenv('STATE_HISTORY_WINDOW', 4))
+
+# Protocols and example exchanges the system prompt is composed from. 'retrieval'
+# includes only the top matches for the recent user turns instead of all of them
+prompt_knowledge = load_knowledge_base(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompt_knowledge.json'))
+PROMPT_MODE = os.getenv('PROMPT_MODE', 'full')
+PROMPT_PROTOCOLS_TOP_K = int(os.getenv('PROMPT_PROTOCOLS_TOP_K', 2))
+PROMPT_EXAMPLES_TOP_K = int(os.getenv('PROMPT_EXAMPLES_TOP_K', 2))
+PROMPT_RETRIEVAL_TURNS = 3
+
+# Prefix and typo-tolerant completions over kit items and knowledge-base symptoms
+typeahead = TypeaheadIndex(KITS, prompt_knowledge)
+
+# TRUE EMERGENCY phrases answered with a vetted 9-1-1 directive before the model replies
+EMERGENCY_FAST_PATH = os.getenv('EMERGENCY_FAST_PATH', '1') == '1'
+emergency_matcher = EmergencyMatcher()
+
+# Token accounting; SESSION_TOKEN_BUDGET=0 disables budget degradation
+usage_tracker = UsageTracker(session_budget=int(os.getenv('SESSION_TOKEN_BUDGET', 0)),
+                             session_ttl=int(os.getenv('CONVERSATION_SESSION_TTL', 24 * 3600)))
+
+# Opt-in: after each reply, answer its likely short follow-ups ("Done.", "Found it.") in the background
+speculator = None
+if os.getenv('SPECULATIVE_REPLIES', '0') == '1':
+    speculator = Speculator(
+        lambda messages, max_tokens: generate_reply(messages, max_tokens),
+        synthesize=(lambda text: synthesize_speech(text)) if os.getenv('SPECULATE_TTS', '0') == '1' else None,
+        fanout=int(os.getenv('SPECULATION_FANOUT', 2)),
+        session_budget=int(os.getenv('SPECULATION_SESSION_BUDGET', 20000)),
+        workers=int(os.getenv('SPECULATION_WORKERS', 4)),
+        session_ttl=int(os.getenv('CONVERSATION_SESSION_TTL', 24 * 3600))
+    )
+# Turns copied into a speculative conversation: the history window plus retrieval's recent user turns
+SPECULATION_CONTEXT = 20
+
+# Full prompts by kit; they only change with the code and prompt_knowledge.json
+full_system_prompts = {}
+
+def retrieve_prompt_sections(section, situation, top_k):
+    """The `top_k` prompt protocols or examples matching `situation`, in prompt order"""
+    hits = prompt_knowledge.search_knowledge_base(situation, top_k, types=[SEARCHABLE_SECTIONS[section]])
+    names = {hit['name'] for hit in hits}
+    return [(name, data) for name, data in prompt_knowledge.knowledge_base[section].items() if name in names]
+
+def get_system_prompt(kit_type, situation=None):
+    """Generate system prompt based on kit type.
+
+    With a `situation` (recent user text), only the protocols and examples
+    retrieved for it are included; otherwise all of them are, and the prompt
+    is built once per kit.
+    """
+    if situation is not None:
+        return compose_system_prompt(kit_type, situation)
+    prompt = full_system_prompts.get(kit_type)
+    if prompt is None:
+        prompt = full_system_prompts[kit_type] = compose_system_prompt(kit_type)
+    return prompt
+
+def compose_system_prompt(kit_type, situation=None):
     kit = next((k for k in KITS if k["id"] == kit_type), None)
     if not kit:
         return "You are a helpful medical assistant."
@@ -136,6 +247,17 @@ def get_system_prompt(kit_type):
         contents_list.append(item_str)
     
     contents_str = "\n".join([f"- {item}" for item in contents_list])
+
+    if situation is None:
+        protocols = list(prompt_knowledge.knowledge_base['protocols'].items())
+        examples = list(prompt_knowledge.knowledge_base['examples'].items())
+    else:
+        protocols = retrieve_prompt_sections('protocols', situation, PROMPT_PROTOCOLS_TOP_K)
+        # Always show at least one exchange so the reply style stays anchored
+        examples = (retrieve_prompt_sections('examples', situation, PROMPT_EXAMPLES_TOP_K)
+                    or list(prompt_knowledge.knowledge_base['examples'].items())[:1])
+    protocols_str = "".join(f"{name}:\n" + "\n".join(data['steps']) + "\n\n" for name, data in protocols)
+    examples_str = "\n\n".join("\n\n".join(data['steps']) for name, data in examples)
     
     # Use a simpler approach to avoid quote issues
     prompt = f"""You are Solstis, a calm and supportive AI medical assistant. You help users with first aid using only the items available in their specific kit.
@@ -190,101 +312,14 @@ EMERGENCY ASSESSMENT FRAMEWORK:
 - ESCALATION: Only recommend emergency care if first aid fails or symptoms worsen significantly
 - ALWAYS assess severity before deciding on emergency vs first aid treatment
 
-IF THE USER CAN'T FIND AN ITEM:
-1) Acknowledge and give location help (e.g., "It should be in the small pack highlighted in orange on the top row.")
-2) Offer the closest in-kit alternative and ask to confirm before switching (e.g., "If you don't see it, we can use the large gauze highlighted in blue instead—should we use that?")
-3) Do not jump to unrelated items unless confirmed.
-
-BANDAGE PLACEMENT—HANDS (DEFAULT TIPS):
-- For small cuts: clean, dry, thin layer of antibiotic ointment if available, center the pad over the cut, smooth adhesive around the skin, avoid wrapping too tight, check movement and circulation. "Let me know when you're ready."
-- For finger joints: place the pad over the cut, angle the adhesive so it doesn't bunch at the knuckle; if needed, reinforce with tape from the highlighted space. "Let me know when you're ready."
-
-BLEEDING CONTROL ESCALATION:
-- First attempt: Direct pressure with gauze for 5 minutes
-- If bleeding continues: Apply QuickClot/hemostatic agent with firm pressure
-- If still bleeding: Apply more pressure and hold longer
-- If bleeding persists after multiple attempts: ESCALATE TO EMERGENCY CARE
-- NEVER repeat failed treatment methods - move to next option or emergency care
-
-SEVERED BODY PARTS PROTOCOL:
-- Call 9-1-1 immediately
-- Control bleeding at injury site
-- Preserve severed part: wrap in clean, damp cloth, place in plastic bag, put bag in ice water bath
-- Do NOT put severed part directly on ice
-- Keep severed part cool but not frozen
-
-BURN ASSESSMENT PROTOCOL:
-- Assess burn severity: size, depth, location
-- Minor burns: Cool with water, pain relief, keep clean
-- Major burns: Call 9-1-1 only if truly severe (large area, deep tissue, face/hands/genitals)
-- Most burns can be treated with first aid first
-
-COMMON SYMPTOMS - TREAT WITH FIRST AID FIRST:
-- Fainting/Dizziness: Lie down, elevate legs, improve blood flow to brain
-- Mild Shock: Keep warm, lie down, elevate legs if no spine injury
-- Nausea: Rest, small sips of water, avoid sudden movements
-- Mild Pain: Use pain relievers from kit, apply cold/heat as appropriate
-- Cramps/Muscle Pain: Assess hydration, suggest electrolytes, stretching, massage
-- Sexual Pain/Discomfort: Discuss openly and suggest appropriate relief methods
-- Only escalate to emergency care if symptoms worsen or persist despite first aid
-
-BLEEDING ASSESSMENT PROTOCOL:
-- ALWAYS ask about amount of blood and size of injury first
-- If heavy bleeding: Control bleeding BEFORE treating other symptoms
-- If light bleeding: Treat other symptoms first, then address bleeding
-- Severity determines treatment order and emergency escalation
-
-Opening message (ONLY use this for the very first message in a new conversation):
+{protocols_str}Opening message (ONLY use this for the very first message in a new conversation):
 "Hey [name]. I'm here to help. If this is life-threatening, please call 9-1-1 now. Otherwise, I'll guide you step by step. Can you tell me what happened?"
 
 IMPORTANT: Do NOT use this opening message for follow-up responses. Once the conversation has started, focus on the current situation and next steps.
 
 Examples:
 
-USER: I cut my finger with a kitchen knife. It's bleeding a lot.
-SOLSTIS: First—are you feeling faint, dizzy, or having trouble breathing?
-
-USER: No, just a little shaky.
-SOLSTIS: Good. Do you have access to clean, running water?
-
-USER: Yes.
-SOLSTIS: Great. Rinse the cut under cool water. Remove any rings first. Let me know when you're done.
-
-USER: Done.
-SOLSTIS: From the highlighted space, take the small gauze. Press gently for 5 minutes. Let me know when you're done.
-
-USER: I can't find it.
-SOLSTIS: No problem—check the small highlighted section. If it's not there, we can use the large gauze in the highlighted section instead.
-
-USER: Found it.
-SOLSTIS: Well done. After the bleeding slows, add a thin layer of antibiotic ointment if you have it, then place a bandage from the highlighted space so the pad covers the cut; smooth the tabs so they don't pinch. Let me know when you're done.
-
-USER: It's been 5 minutes and the bleeding hasn't stopped.
-SOLSTIS: Since direct pressure didn't work, let's try the QuickClot gauze from the highlighted space. Apply it directly to the cut and press firmly for 3 minutes. Let me know when you're done.
-
-USER: It still hasn't stopped bleeding.
-SOLSTIS: The bleeding is not responding to standard treatment. This requires immediate medical attention. Please call 9-1-1 or go to the nearest emergency room. Keep applying pressure while you get help.
-
-USER: I cut my foot and I'm feeling faint.
-SOLSTIS: Feeling faint is common with foot injuries. First, lie down and elevate your legs to improve blood flow to your brain. This should help with the dizziness. Once you're stable, we can address the foot injury. Let me know when you're feeling better.
-
-USER: I'm still feeling dizzy after lying down.
-SOLSTIS: Stay lying down and keep your legs elevated. If the dizziness persists for more than 10 minutes or you feel worse, then we should consider medical help. For now, focus on staying calm and breathing normally.
-
-USER: I cut my foot and I'm feeling faint.
-SOLSTIS: How much blood is there and how big is the cut? This will help me determine the best approach.
-
-USER: There's a lot of blood and it's a deep cut.
-SOLSTIS: Since there's heavy bleeding, we need to control that first. Apply direct pressure with gauze from the highlighted space. Once the bleeding slows, then we can address the faintness by having you lie down and elevate your legs.
-
-USER: I have a really bad cramp in my shoulder.
-SOLSTIS: How's your hydration? Cramps are often caused by dehydration. If you're not well-hydrated, try mixing the electrolyte powder from the highlighted space with water and drink it. Also, gentle stretching and massage can help.
-
-USER: I got a burn.
-SOLSTIS: How bad is the burn? What size is it and where is it located? This will help me determine if we can treat it here or need emergency care.
-
-USER: [Image uploaded for analysis]
-SOLSTIS: I can see a small cut on your finger in the image. Let's clean it with the antiseptic wipes from the highlighted space. Do you have access to clean water?
+{examples_str}
 
 Only give instructions using supplies from this kit (or common home items). Do not invent tools or procedures. You are not a diagnostic or medical authority—you are a calm first responder assistant.
 
@@ -292,11 +327,69 @@ Only give instructions using supplies from this kit (or common home items). Do n
     
     return prompt
 
+def prompt_situation(conversation):
+    """Retrieval query for 'retrieval' mode: tracked injuries and body parts plus the latest user turns"""
+    treatment = conversation['treatment']
+    recent = [msg['content'] for msg in conversation['messages'] if msg['role'] == 'user'][-PROMPT_RETRIEVAL_TURNS:]
+    return ' '.join(treatment.injuries + treatment.body_parts + recent)
+
+def build_chat_messages(conversation, history_limit):
+    """Messages for the model: system prompt, treatment state in 'state' mode, recent history"""
+    situation = prompt_situation(conversation) if PROMPT_MODE == 'retrieval' else None
+    messages = [{'role': 'system', 'content': get_system_prompt(conversation['kit_type'], situation)}]
+    if PROMPT_HISTORY_MODE == 'state':
+        # Separate system message so the kit prompt above stays an identical, cacheable prefix
+        messages.append({'role': 'system', 'content': conversation['treatment'].to_prompt_block()})
+        history_limit = min(history_limit, STATE_HISTORY_WINDOW)
+    for msg in conversation['messages'][-history_limit:]:
+        messages.append({
+            'role': msg['role'],
+            'content': msg['content']
+        })
+    return messages
+
+def speculative_conversation(conversation, user_input):
+    """A copy of the recent conversation as it would be after `user_input`"""
+    treatment = copy.deepcopy(conversation['treatment'])
+    treatment.observe_user(user_input)
+    messages = conversation['messages'][-SPECULATION_CONTEXT:]
+    messages.append({'role': 'user', 'content': user_input})
+    return {'kit_type': conversation['kit_type'], 'messages': messages, 'treatment': treatment}
+
 @app.route('/api/kits', methods=['GET'])
 def get_kits():
     """Get all available kits"""
     return jsonify(KITS)
 
+@app.route('/api/typeahead', methods=['GET'])
+def typeahead_completions():
+    """Complete a partial item name or symptom, scoped to a kit"""
+    query = request.args.get('q', '')
+    kit_type = request.args.get('kit_type')
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    return jsonify({'query': query, 'completions': typeahead.complete(query, kit_type, limit)})
+
+@app.route('/api/knowledge/match', methods=['GET'])
+def match_knowledge():
+    """Rank knowledge-base entries by reported symptoms and by what the kit can perform"""
+    symptoms = request.args.getlist('symptom')
+    text = request.args.get('text')
+    if text:
+        symptoms += prompt_knowledge.facets.symptoms_in_text(text)
+    kit = next((k for k in KITS if k["id"] == request.args.get('kit_type')), None)
+    try:
+        top_k = int(request.args.get('top_k', 5))
+        min_coverage = float(request.args.get('min_coverage', 0))
+    except ValueError:
+        return jsonify({'error': 'top_k must be an integer and min_coverage a number'}), 400
+    
+    matches = prompt_knowledge.match_symptoms(symptoms, kit, top_k, min_coverage)
+    return jsonify({'symptoms': symptoms, 'matches': matches})
+
 @app.route('/api/setup', methods=['POST'])
 def setup():
     """Initialize user session"""
@@ -310,8 +403,14 @@ def setup():
     # Initialize conversation for this user
     conversations[user_name] = {
         'kit_type': kit_type,
-        'messages': []
+        'messages': MessageLog(),
+        'treatment': TreatmentState()
     }
+    usage_tracker.reset_session(user_name)
+    if speculator:
+        speculator.reset_session(user_name)
+    if journal:
+        journal.record_setup(user_name, kit_type)
     
     return jsonify({'status': 'success'})
 
@@ -330,54 +429,56 @@ def chat():
     if user_name not in conversations:
         conversations[user_name] = {
             'kit_type': kit_type,
-            'messages': []
+            'messages': MessageLog(),
+            'treatment': TreatmentState()
         }
+        if journal:
+            journal.record_setup(user_name, kit_type)
     
     conversation = conversations[user_name]
+    kit = next((k for k in KITS if k["id"] == conversation['kit_type']), None)
     
     # Add user message to conversation
-    conversation['messages'].append({
-        'role': 'user',
-        'content': user_input,
-        'timestamp': datetime.now().isoformat()
-    })
+    conversation['messages'].append('user', user_input)
+    conversation['treatment'].observe_user(user_input)
+    if journal:
+        journal.record_message(user_name, conversation)
+    
+    # Last 10 messages, fewer as the session nears its token budget
+    history_limit, max_tokens = usage_tracker.limits_for(user_name)
+    messages = build_chat_messages(conversation, history_limit)
+    
+    speculated = speculator.take(user_name, user_input, conversation['messages']) if speculator else None
+    emergency = emergency_matcher.match(user_input) if EMERGENCY_FAST_PATH else None
+    if emergency:
+        # Recorded before the model replies, so the next turn's history already has it
+        add_assistant_message(user_name, conversation, kit, emergency.directive)
+    
+    if data.get('stream'):
+        # Newline-delimited JSON: the emergency directive (if any) right away, then the model's reply
+        def events():
+            if emergency:
+                yield json.dumps({'type': 'emergency', 'emergency': emergency.emergency,
+                                  'response': emergency.directive}) + '\n'
+            try:
+                reply = complete_chat(user_name, conversation, kit, messages, max_tokens, speculated)
+                yield json.dumps({'type': 'response', 'response': reply, 'status': 'success'}) + '\n'
+            except Exception as e:
+                print(f"Error in chat: {e}")
+                yield json.dumps({'type': 'error', 'error': 'Failed to get response', 'details': str(e)}) + '\n'
+        
+        return Response(stream_with_context(events()), mimetype='application/x-ndjson')
     
     try:
-        # Get system prompt
-        system_prompt = get_system_prompt(conversation['kit_type'])
-        
-        # Prepare messages for OpenAI
-        messages = [{'role': 'system', 'content': system_prompt}]
-        
-        # Add conversation history (last 10 messages to avoid token limits)
-        recent_messages = conversation['messages'][-10:]
-        for msg in recent_messages:
-            messages.append({
-                'role': msg['role'],
-                'content': msg['content']
-            })
-        
-        # Call OpenAI
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        assistant_response = response.choices[0].message.content
-        
-        # Add assistant response to conversation
-        conversation['messages'].append({
-            'role': 'assistant',
-            'content': assistant_response,
-            'timestamp': datetime.now().isoformat()
-        })
+        assistant_response = complete_chat(user_name, conversation, kit, messages, max_tokens, speculated)
         
-        return jsonify({
+        result = {
             'response': assistant_response,
             'status': 'success'
-        })
+        }
+        if emergency:
+            result['emergency'] = {'type': emergency.emergency, 'directive': emergency.directive}
+        return jsonify(result)
         
     except Exception as e:
         print(f"Error in chat: {e}")
@@ -386,6 +487,42 @@ def chat():
             'details': str(e)
         }), 500
 
+def complete_chat(user_name, conversation, kit, messages, max_tokens, speculated=None):
+    """Call the model (unless its reply was speculated) and record the reply in the conversation"""
+    if speculated:
+        assistant_response, usage, latency_ms = speculated.text, speculated.usage, speculated.latency_ms
+    else:
+        assistant_response, usage, latency_ms = generate_reply(messages, max_tokens)
+    usage_tracker.record(user_name, conversation['kit_type'], usage, latency_ms)
+    
+    add_assistant_message(user_name, conversation, kit, assistant_response)
+    if speculator:
+        # Next turn's limits, now that this reply is counted
+        history_limit, max_tokens = usage_tracker.limits_for(user_name)
+        speculator.speculate(
+            user_name, conversation['messages'], assistant_response,
+            lambda follow_up: build_chat_messages(speculative_conversation(conversation, follow_up), history_limit),
+            max_tokens
+        )
+    return assistant_response
+
+def generate_reply(messages, max_tokens):
+    """One chat completion: (reply, token usage, latency in ms)"""
+    start_time = time.perf_counter()
+    response = openai.ChatCompletion.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=0.7
+    )
+    return response.choices[0].message.content, extract_usage(response), (time.perf_counter() - start_time) * 1000
+
+def add_assistant_message(user_name, conversation, kit, text):
+    conversation['messages'].append('assistant', text)
+    conversation['treatment'].observe_assistant(text, kit)
+    if journal:
+        journal.record_message(user_name, conversation)
+
 @app.route('/api/clear', methods=['POST'])
 def clear_conversation():
     """Clear conversation history"""
@@ -393,19 +530,32 @@ def clear_conversation():
     user_name = data.get('user_name')
     
     if user_name and user_name in conversations:
-        conversations[user_name]['messages'] = []
+        conversations[user_name]['messages'] = MessageLog()
+        conversations[user_name]['treatment'] = TreatmentState()
+        if speculator:
+            speculator.discard(user_name)
+        if journal:
+            journal.record_clear(user_name)
     
     return jsonify({'status': 'success'})
 
-@app.route('/api/tts', methods=['POST'])
+@app.route('/api/tts', methods=['GET', 'POST'])
 def text_to_speech():
-    """Convert text to speech using ElevenLabs"""
-    data = request.get_json()
-    text = data.get('text')
-    voice_id = data.get('voice_id')  # Allow custom voice selection
+    """Convert text to speech using ElevenLabs, in the format the client negotiated (tts_formats.py).
+
+    GET takes the same fields as query parameters, so the URL can be played
+    directly and cached audio is served with Range support.
+    """
+    params = request.args if request.method == 'GET' else (request.get_json(silent=True) or {})
+    text = params.get('text')
+    voice_id = params.get('voice_id')  # Allow custom voice selection
     
     if not text:
         return jsonify({'error': 'No text provided'}), 400
+    try:
+        tts = negotiate(params, request.accept_mimetypes)
+    except UnsupportedFormat as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
         # ElevenLabs API configuration
@@ -413,47 +563,110 @@ def text_to_speech():
         
         # Use provided voice_id or fall back to environment variable or default
         if not voice_id:
-            voice_id = os.getenv('ELEVENLABS_VOICE_ID', 'XcXEQzuLXRU9RcfWzEJt')
-        
-        if not ELEVENLABS_API_KEY:
-            return jsonify({'error': 'ElevenLabs API key not configured'}), 500
-        
-        # ElevenLabs API call - Updated for current API
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-        
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVENLABS_API_KEY
-        }
-        
-        data = {
-            "text": text,
-            "model_id": "eleven_turbo_v2",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5,
-                "style": 0.0,
-                "use_speaker_boost": True
-            }
-        }
-        
-        response = requests.post(url, json=data, headers=headers)
-        
-        if response.status_code == 200:
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-                temp_file.write(response.content)
-                temp_file_path = temp_file.name
-            
-            return send_file(temp_file_path, mimetype='audio/mpeg')
-        else:
-            return jsonify({'error': f'ElevenLabs API error: {response.status_code}'}), 500
+            voice_id = DEFAULT_VOICE_ID
+        
+        # Greeting phrases synthesized at startup, audio served recently, or audio made with a speculated reply
+        key = (voice_id, text, tts.output_format)
+        audio = tts_cache.get(key)
+        if audio is None and speculator and voice_id == DEFAULT_VOICE_ID and tts == DEFAULT_FORMAT:
+            audio = speculator.take_audio(text)
+        if audio is None:
+            if not ELEVENLABS_API_KEY:
+                return jsonify({'error': 'ElevenLabs API key not configured'}), 500
+            response = elevenlabs_tts(text, voice_id, ELEVENLABS_API_KEY, tts=tts)
+            if response.status_code != 200:
+                return jsonify({'error': f'ElevenLabs API error: {response.status_code}'}), 500
+            audio = response.content
+        tts_cache.put(key, audio)
+        return send_audio(audio, tts)
             
     except Exception as e:
         print(f"TTS error: {e}")
         return jsonify({'error': 'Failed to generate speech'}), 500
 
+def send_audio(audio, tts):
+    """The audio as a response; GET requests get Range and If-None-Match handling"""
+    # The ETag names the bytes, so a re-synthesis that differs (new model or voice settings) is a new version
+    response = send_file(io.BytesIO(audio), mimetype=tts.mimetype, conditional=True,
+                         etag=hashlib.sha1(audio).hexdigest(), max_age=3600)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['X-Audio-Format'] = tts.output_format
+    response.vary.add('Accept')
+    return response
+
+def elevenlabs_tts(text, voice_id, api_key, session=None, tts=DEFAULT_FORMAT):
+    """POST text to ElevenLabs text-to-speech; returns the response (audio in `tts` format on 200)"""
+    # ElevenLabs API call - Updated for current API
+    url = f"{ELEVENLABS_API_BASE}/v1/text-to-speech/{voice_id}?output_format={tts.output_format}"
+    
+    headers = {
+        "Accept": tts.mimetype,
+        "Content-Type": "application/json",
+        "xi-api-key": api_key
+    }
+    
+    data = {
+        "text": text,
+        "model_id": "eleven_turbo_v2",
+        "voice_settings": {
+            "stability": 0.5,
+            "similarity_boost": 0.5,
+            "style": 0.0,
+            "use_speaker_boost": True
+        }
+    }
+    
+    return (session or upstream).post(url, json=data, headers=headers)
+
+def synthesize_speech(text, session=None):
+    """MP3 of `text` in the default voice, or None if it could not be made"""
+    api_key = os.getenv('ELEVENLABS_API_KEY')
+    if not api_key:
+        return None
+    response = elevenlabs_tts(text, DEFAULT_VOICE_ID, api_key, session)
+    return response.content if response.status_code == 200 else None
+
+# Said at the start of every session (after "Hey <name>."), so synthesized once at startup
+GREETING = ("I'm here to help with your {kit_name}. If this is a life-threatening emergency, please call 911 "
+            "immediately. Otherwise, I'll guide you step-by-step. Can you tell me what happened?")
+WARM_START_TTS = os.getenv('WARM_START_TTS', '1') == '1'
+# (voice_id, text, output format) -> audio: the startup phrases, pinned, and the most recent replies
+tts_cache = AudioCache(max_bytes=int(os.getenv('TTS_CACHE_MB', 32)) * 1024 * 1024)
+
+def warm_up_master():
+    """Work every worker shares, done once before they fork: full prompts and greeting audio.
+
+    Audio is fetched on a throwaway session so that no open socket is
+    inherited by the workers.
+    """
+    start_time = time.perf_counter()
+    for kit in KITS:
+        get_system_prompt(kit['id'])
+    if WARM_START_TTS:
+        phrases = [GREETING.format(kit_name=kit['name']) for kit in KITS] + list(emergency_matcher.directives.values())
+        with requests.Session() as session, ThreadPoolExecutor(max_workers=4) as pool:
+            for text, audio in zip(phrases, pool.map(lambda phrase: synthesize_speech(phrase, session), phrases)):
+                if audio:
+                    tts_cache.put((DEFAULT_VOICE_ID, text, DEFAULT_FORMAT.output_format), audio, pinned=True)
+    print(f"Prepared {len(full_system_prompts)} kit prompts and {len(tts_cache)} phrases of audio "
+          f"in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+def warm_up_worker():
+    """Open this worker's pooled upstream connections before it accepts requests"""
+    start_time = time.perf_counter()
+    checks = []
+    if openai.api_key:
+        checks.append((f"{openai.api_base.rstrip('/')}/models", {'Authorization': f"Bearer {openai.api_key}"}))
+    if os.getenv('ELEVENLABS_API_KEY'):
+        checks.append((f"{ELEVENLABS_API_BASE}/v1/voices", {'xi-api-key': os.getenv('ELEVENLABS_API_KEY')}))
+    for url, headers in checks:
+        try:
+            upstream.get(url, headers=headers, timeout=5)
+        except requests.RequestException as e:
+            print(f"Warm-up request to {url} failed: {e}")
+    print(f"Worker {os.getpid()} opened {len(checks)} upstream connections "
+          f"in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
 @app.route('/api/stt', methods=['POST'])
 def speech_to_text():
     """Convert speech to text using ElevenLabs"""
@@ -477,7 +690,7 @@ def speech_to_text():
             return jsonify({'error': 'ElevenLabs API key not configured'}), 500
         
         # ElevenLabs Speech-to-Text API - Updated endpoint
-        url = "https://api.elevenlabs.io/v1/speech-to-text"
+        url = f"{ELEVENLABS_API_BASE}/v1/speech-to-text"
         
         headers = {
             "xi-api-key": ELEVENLABS_API_KEY
@@ -520,7 +733,7 @@ def speech_to_text():
         print(f"STT Debug: Headers being sent: {headers}")
         
         try:
-            response = requests.post(url, headers=headers, files=files, data=data, timeout=30)
+            response = upstream.post(url, headers=headers, files=files, data=data, timeout=30)
             
             print(f"STT Debug: Response status: {response.status_code}")
             print(f"STT Debug: Response content: {response.text}")
@@ -560,6 +773,64 @@ def speech_to_text():
         print(f"STT error: {e}")
         return jsonify({'error': 'Failed to transcribe speech'}), 500
 
+# Streaming STT: the browser sends PCM frames while the user speaks; see streaming_stt.py
+STT_ENDPOINT_MS = int(os.getenv('STT_ENDPOINT_MS', 500))
+STT_PARTIAL_INTERVAL_MS = int(os.getenv('STT_PARTIAL_INTERVAL_MS', 700))
+STT_SPEECH_RMS = float(os.getenv('STT_SPEECH_RMS', 500))
+STT_NO_SPEECH_MS = int(os.getenv('STT_NO_SPEECH_MS', 8000))
+STT_IDLE_TIMEOUT = 10
+stt_executor = ThreadPoolExecutor(max_workers=int(os.getenv('STT_STREAM_WORKERS', 8)), thread_name_prefix='stt')
+
+@sock.route('/api/stt/stream')
+def speech_to_text_stream(ws):
+    """Partial transcripts while audio frames arrive, and the final one as soon as the user stops talking"""
+    ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
+    if not ELEVENLABS_API_KEY:
+        ws.send(json.dumps({'type': 'error', 'error': 'ElevenLabs API key not configured'}))
+        return
+    transcribe = ElevenLabsTranscriber(upstream, ELEVENLABS_API_BASE, ELEVENLABS_API_KEY)
+    sample_rate = SAMPLE_RATE
+    transcription = None
+    last_message = time.perf_counter()
+    while transcription is None or not transcription.done:
+        message = ws.receive(timeout=0.02)
+        wait = False
+        if message is None:
+            if time.perf_counter() - last_message > STT_IDLE_TIMEOUT:
+                ws.send(json.dumps({'type': 'error', 'error': 'No audio received'}))
+                return
+        else:
+            last_message = time.perf_counter()
+            control = None
+            if isinstance(message, str):
+                try:
+                    control = json.loads(message)
+                    if not isinstance(control, dict):
+                        raise ValueError(message)
+                    if transcription is None and control.get('type') == 'start':
+                        sample_rate = int(control.get('sample_rate', SAMPLE_RATE))
+                        if sample_rate not in SAMPLE_RATES:
+                            ws.send(json.dumps({'type': 'error', 'error': 'Unsupported sample_rate'}))
+                            return
+                        continue
+                except (ValueError, TypeError):
+                    ws.send(json.dumps({'type': 'error', 'error': 'Malformed control message'}))
+                    return
+            if transcription is None:
+                transcription = StreamingTranscription(transcribe, stt_executor, sample_rate=sample_rate,
+                                                       end_ms=STT_ENDPOINT_MS,
+                                                       partial_interval_ms=STT_PARTIAL_INTERVAL_MS,
+                                                       no_speech_ms=STT_NO_SPEECH_MS,
+                                                       speech_threshold=STT_SPEECH_RMS)
+            if control is None:
+                transcription.feed(message)
+            elif control.get('type') == 'stop':
+                transcription.finish('stop')
+                wait = True
+        if transcription is not None:
+            for event in transcription.poll(wait=wait):
+                ws.send(json.dumps(event))
+
 @app.route('/api/voices', methods=['GET'])
 def get_voices():
     """Get available ElevenLabs voices"""
@@ -569,10 +840,10 @@ def get_voices():
         if not ELEVENLABS_API_KEY:
             return jsonify({'error': 'ElevenLabs API key not configured'}), 500
         
-        url = "https://api.elevenlabs.io/v1/voices"
+        url = f"{ELEVENLABS_API_BASE}/v1/voices"
         headers = {"xi-api-key": ELEVENLABS_API_KEY}
         
-        response = requests.get(url, headers=headers)
+        response = upstream.get(url, headers=headers)
         
         if response.status_code == 200:
             voices = response.json()
@@ -597,6 +868,22 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
+@app.route('/api/admin/usage', methods=['GET'])
+def admin_usage():
+    """Token and latency accounting per session and per kit"""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Admin endpoints disabled (ADMIN_TOKEN not set)'}), 404
+    supplied = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), admin_token.encode('utf-8')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    usage = usage_tracker.snapshot()
+    if speculator:
+        usage['speculation'] = speculator.snapshot()
+    usage['tts_cache'] = tts_cache.snapshot()
+    return jsonify(usage)
+
 @app.route('/api/test-stt', methods=['GET'])
 def test_stt():
     """Test ElevenLabs STT API connection"""
@@ -607,11 +894,11 @@ def test_stt():
             return jsonify({'error': 'ElevenLabs API key not configured'}), 500
         
         # Test the STT endpoint with a simple GET request
-        url = "https://api.elevenlabs.io/v1/speech-to-text"
+        url = f"{ELEVENLABS_API_BASE}/v1/speech-to-text"
         headers = {"xi-api-key": ELEVENLABS_API_KEY}
         
         # This should return a 405 Method Not Allowed, which means the endpoint exists
-        response = requests.get(url, headers=headers, timeout=10)
+        response = upstream.get(url, headers=headers, timeout=10)
         
         return jsonify({
             'status': 'STT endpoint accessible',
@@ -678,6 +965,7 @@ def analyze_image():
         
         # Call OpenAI Vision API
         try:
+            start_time = time.perf_counter()
             response = openai.ChatCompletion.create(
                 model="gpt-4o",
                 messages=[
@@ -705,6 +993,8 @@ def analyze_image():
                 temperature=0.7
             )
             
+            usage_tracker.record(request.form.get('user_name', 'anonymous'), kit_type, extract_usage(response),
+                                 (time.perf_counter() - start_time) * 1000)
             analysis = response.choices[0].message.content
             
             return jsonify({
@@ -722,4 +1012,5 @@ def analyze_image():
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
-    app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
+    # The reloader's parent process imports the app too and would take the journal lock from the server
+    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=journal is None)
\ No newline at end of file
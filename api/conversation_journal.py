@@ -0,0 +1,250 @@
+"""Append-only, fsync-batched journal for the in-memory conversation store.
+
+Every state change (setup, message, clear) is appended as one JSON line. A
+background thread writes and fsyncs buffered events every `flush_interval`
+seconds, so the request path only pays for serialising one small event.
+
+Compaction writes a snapshot of the active sessions (atomically, by rename)
+and starts a new journal segment, so restart recovery reads one snapshot plus
+a bounded tail instead of the whole history.
+
+Files in the journal directory:
+    snapshot-<seq>.json   sessions as of the start of segment <seq>
+    journal-<seq>.log     events appended after that snapshot
+    .lock                 held by the one process allowed to write
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+
+SNAPSHOT_PREFIX = 'snapshot-'
+JOURNAL_PREFIX = 'journal-'
+
+
+class JournalLocked(RuntimeError):
+    """Another process owns the journal directory."""
+
+
+def _seq_of(filename, prefix):
+    return int(filename[len(prefix):].split('.', 1)[0])
+
+
+class ConversationJournal:
+    """Durable event log for `conversations` with snapshot compaction."""
+
+    def __init__(self, directory, flush_interval=0.1, compact_every=5000, session_ttl=24 * 3600,
+                 clock=time.time):
+        self.directory = directory
+        self.clock = clock
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.session_ttl = session_ttl
+
+        self.lock = threading.Lock()
+        self.compact_lock = threading.Lock()
+        self.pending = []
+        self.events_in_segment = 0
+        self.compact_requested = False
+        self.last_active = {}
+        self.state_provider = None
+        self.file = None
+        self.seq = 0
+        self.closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        self.lock_file = open(os.path.join(directory, '.lock'), 'w')
+        # Only one process may own the journal. A second one would silently drop every
+        # conversation it serves, so it refuses to start instead.
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            raise JournalLocked(
+                f"Conversation journal in {directory} is owned by another process; "
+                "run a single worker (scale with threads) when CONVERSATION_JOURNAL_DIR is set") from None
+
+        self.wakeup = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+
+    # --- recovery ---
+
+    def recover(self):
+        """Load the latest snapshot and replay the journal segments after it.
+
+        Returns the restored conversations dict and opens a fresh segment.
+        """
+        files = os.listdir(self.directory)
+        snapshots = sorted(_seq_of(f, SNAPSHOT_PREFIX) for f in files
+                           if f.startswith(SNAPSHOT_PREFIX) and f.endswith('.json'))
+        segments = sorted(_seq_of(f, JOURNAL_PREFIX) for f in files if f.startswith(JOURNAL_PREFIX))
+
+        conversations = {}
+        base_seq = 0
+        if snapshots:
+            base_seq = snapshots[-1]
+            with open(self._snapshot_path(base_seq)) as f:
+                snapshot = json.load(f)
+            conversations = snapshot['sessions']
+            self.last_active = snapshot.get('last_active', {})
+
+        for seq in segments:
+            if seq >= base_seq:
+                self._replay_segment(seq, conversations)
+                # Fold the replayed tail into a fresh snapshot once the app is serving
+                self.compact_requested = True
+
+        self.seq = max([base_seq] + segments) + 1
+        self.file = open(self._journal_path(self.seq), 'a', encoding='utf-8')
+        self.flusher.start()
+        return conversations
+
+    def _replay_segment(self, seq, conversations):
+        with open(self._journal_path(seq), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Torn final write from a crash; everything before it is intact
+                    break
+                self._apply(event, conversations)
+
+    def _apply(self, event, conversations):
+        session_id = event['s']
+        self.last_active[session_id] = event['t']
+        op = event['op']
+        if op == 'setup':
+            conversations[session_id] = {'kit_type': event['kit'], 'messages': []}
+        elif op == 'clear':
+            if session_id in conversations:
+                conversations[session_id]['messages'] = []
+        elif op == 'msg':
+            conversation = conversations.setdefault(session_id, {'kit_type': event.get('kit'), 'messages': []})
+            # `n` is the message's index; skipping known indexes makes replay idempotent
+            # when compaction captured a message whose event landed in the next segment.
+            if event['n'] == len(conversation['messages']):
+                conversation['messages'].append(event['m'])
+
+    # --- hot path ---
+
+    def record_setup(self, session_id, kit_type):
+        self._append({'op': 'setup', 's': session_id, 'kit': kit_type})
+
+    def record_clear(self, session_id):
+        self._append({'op': 'clear', 's': session_id})
+
+    def record_message(self, session_id, conversation):
+        """Journal the message just appended to `conversation['messages']`."""
+        messages = conversation['messages']
+        self._append({'op': 'msg', 's': session_id, 'kit': conversation.get('kit_type'),
+                      'n': len(messages) - 1, 'm': messages[-1]})
+
+    def _append(self, event):
+        event['t'] = int(self.clock())
+        line = json.dumps(event, separators=(',', ':'))
+        with self.lock:
+            self.pending.append(line)
+            self.last_active[event['s']] = event['t']
+            self.events_in_segment += 1
+            if self.compact_every and self.events_in_segment >= self.compact_every:
+                self.wakeup.set()
+
+    # --- background work ---
+
+    def _flush_loop(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+            if self.closed:
+                break
+            if self.compact_requested or (self.compact_every and self.events_in_segment >= self.compact_every):
+                self.compact()
+
+    def flush(self):
+        """Write and fsync all buffered events (one fsync per batch)."""
+        with self.lock:
+            if not self.pending or self.file is None:
+                return
+            batch, self.pending = self.pending, []
+            self.file.write('\n'.join(batch) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def compact(self):
+        """Snapshot active sessions, start a new segment and delete older files."""
+        if self.state_provider is None:
+            return
+        with self.compact_lock:
+            self._compact()
+
+    def _compact(self):
+        self.flush()
+        with self.lock:
+            self.file.close()
+            old_seq, self.seq = self.seq, self.seq + 1
+            self.file = open(self._journal_path(self.seq), 'a', encoding='utf-8')
+            self.events_in_segment = 0
+            self.compact_requested = False
+            last_active = dict(self.last_active)
+
+        cutoff = self.clock() - self.session_ttl
+        sessions = {}
+        for session_id, conversation in list(self.state_provider().items()):
+            if last_active.get(session_id, 0) < cutoff:
+                continue
+            sessions[session_id] = {
+                'kit_type': conversation['kit_type'],
+                'messages': list(conversation['messages']),
+            }
+        snapshot = {
+            'sessions': sessions,
+            'last_active': {key: value for key, value in last_active.items() if key in sessions},
+        }
+
+        snapshot_path = self._snapshot_path(self.seq)
+        temp_path = snapshot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, snapshot_path)
+        self._fsync_directory()
+
+        with self.lock:
+            self.last_active = {key: value for key, value in self.last_active.items()
+                                if key in sessions or value >= cutoff}
+        for filename in os.listdir(self.directory):
+            if filename.startswith(SNAPSHOT_PREFIX) and filename.endswith('.json'):
+                if _seq_of(filename, SNAPSHOT_PREFIX) < self.seq:
+                    os.remove(os.path.join(self.directory, filename))
+            elif filename.startswith(JOURNAL_PREFIX) and _seq_of(filename, JOURNAL_PREFIX) <= old_seq:
+                os.remove(os.path.join(self.directory, filename))
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+        if self.flusher.is_alive():
+            self.flusher.join()
+        self.flush()
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+        self.lock_file.close()
+
+    # --- helpers ---
+
+    def _snapshot_path(self, seq):
+        return os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{seq:08d}.json")
+
+    def _journal_path(self, seq):
+        return os.path.join(self.directory, f"{JOURNAL_PREFIX}{seq:08d}.log")
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,177 @@
+"""Fast detection of TRUE EMERGENCY phrases in user messages, ahead of the LLM.
+
+The phrases and their variants for each emergency in the system prompt's
+assessment framework (unconsciousness, severe chest pain, bleeding that won't
+stop, difficulty breathing, severe allergic reactions, severed body parts) are
+compiled into one Aho-Corasick automaton over words. A message is scanned once,
+whatever the number of phrases, in a few microseconds. A match returns the
+vetted directive for that emergency, so chat() can send it before the model
+replies.
+
+A phrase directly after a negation ("no chest pain", "he's not unconscious",
+"I don't have difficulty breathing") does not count, unless the phrase is
+itself negative ("not breathing"). A negation further back does not reach the
+phrase: "no, he stopped breathing" is still an emergency. Phrases never span
+punctuation.
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Words that negate a phrase starting right after them, or after one of NEGATION_LINKS
+NEGATIONS = frozenset("no not never without isnt wasnt arent dont doesnt didnt denies".split())
+NEGATION_LINKS = frozenset("have has had any".split())
+
+PEOPLE = ["my", "his", "her", "their", "your", "the", "a", "our"]
+SEVERABLE_PARTS = ["finger", "fingers", "thumb", "toe", "toes", "hand", "foot", "ear", "arm", "leg", "fingertip",
+                   "nose"]
+SEVERING_VERBS = ["cut", "chopped", "sliced", "ripped", "torn", "tore", "blew", "blown", "sawed", "bit", "bitten"]
+SEVERED_AUXILIARIES = ["", "got", "was", "is", "has been", "just got"]
+
+
+def _severed_variants() -> List[str]:
+    """"cut off my finger", "cut my finger off", "finger got cut off", "thumb came off", ..."""
+    phrases = ["severed", "amputated", "amputation", "tip of my finger off", "fingertip is gone"]
+    for part in SEVERABLE_PARTS:
+        phrases += [f"{part} came off", f"{part} fell off", f"{part} is hanging off", f"{part} is completely off"]
+        for verb in SEVERING_VERBS:
+            for person in PEOPLE:
+                phrases += [f"{verb} off {person} {part}", f"{verb} {person} {part} off"]
+            phrases += [f"{part} {auxiliary} {verb} off".replace("  ", " ") for auxiliary in SEVERED_AUXILIARIES]
+    return phrases
+
+
+# Emergency -> (phrases, directive). Earlier emergencies win when a message matches several.
+EMERGENCIES: Dict[str, Tuple[List[str], str]] = {
+    "not_breathing": ([
+        "not breathing", "isnt breathing", "stopped breathing", "no longer breathing", "not breathing anymore",
+        "no pulse", "has no pulse", "turning blue", "lips are blue", "blue lips", "gone blue",
+    ], "This is life-threatening. Call 9-1-1 now and put the phone on speaker. The dispatcher will talk you "
+       "through CPR until help arrives."),
+    "unconscious": ([
+        "unconscious", "unresponsive", "not responding", "isnt responding", "wont wake up", "will not wake up",
+        "cant wake", "cannot wake", "can not wake", "not waking up", "wont respond", "out cold", "knocked out",
+        "lost consciousness", "losing consciousness",
+    ], "This is life-threatening. Call 9-1-1 now. If they are breathing, roll them onto their side and "
+       "stay with them until help arrives."),
+    "difficulty_breathing": ([
+        "cant breathe", "cannot breathe", "can not breathe", "cant breath", "difficulty breathing",
+        "trouble breathing", "hard to breathe", "struggling to breathe", "struggling to breath", "gasping for air",
+        "gasping for breath", "short of breath", "is choking", "hes choking", "shes choking",
+        "started choking", "choking on food", "choking on something", "cant get air", "throat is closing", "throat closing",
+    ], "This is life-threatening. Call 9-1-1 now. Help them sit upright and stay with them until help arrives."),
+    "severe_allergic_reaction": ([
+        "anaphylaxis", "anaphylactic", "severe allergic reaction", "bad allergic reaction", "throat is swelling",
+        "throat swelling", "throat swelled", "tongue is swelling", "tongue swelling", "swollen tongue",
+        "face is swelling", "lips swelling", "lips are swelling", "needs an epipen", "need an epipen",
+    ], "This is life-threatening. Call 9-1-1 now. If they have an epinephrine auto-injector, use it now."),
+    "severed_body_part": (
+        _severed_variants(),
+        "This is life-threatening. Call 9-1-1 now. Press firmly on the wound to control the bleeding. Wrap the "
+        "severed part in a clean, damp cloth, put it in a plastic bag and set the bag in ice water. Do not put it "
+        "directly on ice."),
+    "uncontrolled_bleeding": ([
+        "wont stop bleeding", "will not stop bleeding", "bleeding wont stop", "bleeding will not stop",
+        "bleeding doesnt stop", "cant stop the bleeding", "cannot stop the bleeding", "cant stop bleeding",
+        "spurting blood", "blood is spurting", "blood spurting", "gushing blood", "blood is gushing",
+        "blood gushing", "pulsing blood", "blood everywhere", "bleeding out", "severe bleeding",
+        "uncontrollable bleeding", "uncontrolled bleeding",
+    ], "This is life-threatening. Call 9-1-1 now. Press firmly on the wound with gauze or a clean cloth and "
+       "keep pressing until help arrives."),
+    "chest_pain": ([
+        "chest pain", "chest pains", "pain in my chest", "pain in his chest", "pain in her chest",
+        "chest hurts", "chest is hurting", "chest feels tight", "chest tightness", "tight chest",
+        "crushing chest", "pressure in my chest", "chest pressure", "heart attack",
+    ], "This could be a heart emergency. Call 9-1-1 now. Have them stop, sit down and rest while you wait."),
+}
+
+CLAUSE_BREAK = "|"
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+|[.,;:!?]")
+
+
+def words(text: str) -> List[str]:
+    """Lowercase words with apostrophes dropped ("Can't" -> "cant"); punctuation becomes CLAUSE_BREAK."""
+    return [token if token[0].isalnum() else CLAUSE_BREAK
+            for token in _WORD_PATTERN.findall(text.lower().replace("'", "").replace("’", ""))]
+
+
+class EmergencyMatch(NamedTuple):
+    emergency: str
+    phrase: str
+    directive: str
+
+
+class EmergencyMatcher:
+    """Word-level Aho-Corasick automaton over every emergency phrase."""
+
+    def __init__(self, emergencies: Dict[str, Tuple[List[str], str]] = EMERGENCIES):
+        self.directives = {name: directive for name, (_, directive) in emergencies.items()}
+        self.priority = {name: rank for rank, name in enumerate(emergencies)}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, str, str]]] = [[]]  # (phrase length, emergency, phrase)
+        self.phrases = 0
+        for name, (phrases, _) in emergencies.items():
+            for phrase in phrases:
+                self._add(name, phrase)
+        self._link()
+
+    def __len__(self) -> int:
+        return self.phrases
+
+    def _add(self, name: str, phrase: str):
+        state = 0
+        phrase_words = words(phrase)
+        for word in phrase_words:
+            following = self._goto[state].get(word)
+            if following is None:
+                following = self._goto[state][word] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = following
+        if not any(output[2] == " ".join(phrase_words) for output in self._outputs[state]):
+            self._outputs[state].append((len(phrase_words), name, " ".join(phrase_words)))
+            self.phrases += 1
+
+    def _link(self):
+        """Breadth-first failure links; each state also reports the phrases ending at its failure state."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for word, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(word, 0)
+                self._outputs[following] = self._outputs[following] + self._outputs[self._fail[following]]
+
+    def scan(self, text: str) -> Iterable[Tuple[str, str]]:
+        """Every (emergency, phrase) found in `text`, skipping negated phrases."""
+        tokens = words(text)
+        goto, fail = self._goto, self._fail
+        state = 0
+        for position, word in enumerate(tokens):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for length, name, phrase in self._outputs[state]:
+                if phrase.split(" ", 1)[0] not in NEGATIONS and self._negated(tokens, position - length + 1):
+                    continue
+                yield name, phrase
+
+    @staticmethod
+    def _negated(tokens: List[str], start: int) -> bool:
+        if start and tokens[start - 1] in NEGATION_LINKS:
+            start -= 1
+        return start > 0 and tokens[start - 1] in NEGATIONS
+
+    def match(self, text: str) -> Optional[EmergencyMatch]:
+        """The highest-priority emergency `text` describes, with its directive, or None."""
+        best = None
+        for name, phrase in self.scan(text):
+            if best is None or self.priority[name] < self.priority[best[0]]:
+                best = (name, phrase)
+        if best is None:
+            return None
+        return EmergencyMatch(best[0], best[1], self.directives[best[0]])
@@ -0,0 +1,52 @@
+"""Gunicorn settings, read from this directory by `gunicorn app:app`.
+
+Warm start: the app is imported once in the master, which composes the kit
+prompts and synthesizes the greeting audio, then freezes the heap with
+gc.freeze() so the garbage collector never writes to those pages and forked
+workers keep sharing them copy-on-write. Each worker opens its upstream
+connections before it accepts requests.
+
+WARM_START=0 imports the app in each worker instead, as before. The
+conversation journal is owned by a single process, so with
+CONVERSATION_JOURNAL_DIR set the app is not preloaded either, and gunicorn
+refuses to start with more than one worker (a second worker could not
+journal its conversations); scale with GUNICORN_THREADS instead.
+
+Workers run GUNICORN_THREADS threads (gunicorn's gthread worker), so the
+WebSocket speech-to-text streams do not block other requests.
+"""
+import gc
+import os
+
+WARM_START = os.getenv('WARM_START', '1') == '1'
+
+preload_app = WARM_START and not os.getenv('CONVERSATION_JOURNAL_DIR')
+
+# /api/stt/stream holds a thread for as long as the user is speaking; with one thread per worker an open
+# stream would hold up every other request to that worker
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    if os.getenv('CONVERSATION_JOURNAL_DIR') and server.cfg.workers > 1:
+        raise RuntimeError(f"CONVERSATION_JOURNAL_DIR is set but {server.cfg.workers} workers were requested; "
+                           "the conversation journal is owned by one process, so run -w 1 and raise "
+                           "GUNICORN_THREADS instead")
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before any worker forks
+    if preload_app:
+        import app
+        app.warm_up_master()
+        gc.collect()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # Runs in each worker before it accepts requests
+    if WARM_START:
+        import app
+        if not preload_app:
+            app.warm_up_master()
+        app.warm_up_worker()
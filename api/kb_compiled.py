@@ -0,0 +1,401 @@
+"""Compiled, memory-mapped form of a FirstAidKnowledgeBase.
+
+`compile_knowledge_base()` writes a knowledge base (its snapshot plus any
+journaled adds) to one read-only binary file:
+
+    header     magic, version, counts, average document length, table offsets
+    meta       JSON: section names and the doc id range each one occupies
+    postings   per term, BM25 impacts and doc ids in descending impact order,
+               and the same postings again in doc id order (float64 and
+               uint32 arrays, one of each shared by all terms)
+    docs       per entry: offsets of its name and its JSON data in the pool
+    names      per section, doc ids sorted by name (for binary search)
+    terms      sorted term table: pool offset of the term, postings start and count
+    pool       UTF-8 names, entry JSON and terms
+
+`CompiledKnowledgeBase` maps the file read-only instead of parsing it, so
+forked workers share the same page-cache pages. Posting arrays are read in
+place through memoryviews: the impact-ordered copy drives the threshold
+algorithm, and the doc-id-ordered copy answers its random accesses by binary
+search, so queries allocate nothing per posting. Entries are decoded from JSON
+only when read. The term and entry caches are shared by the worker's threads
+and guarded by a lock; decoding happens outside it. The arrays are
+little-endian. It serves the read side of FirstAidKnowledgeBase: the
+`knowledge_base` sections, get_*_info() and search_knowledge_base(). Adds still
+go through the JSON knowledge base and a recompile.
+
+    python kb_compiled.py prompt_knowledge.json    # writes prompt_knowledge.kbc
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from typing import Dict, List, Optional, Tuple
+
+from kb_facets import FACETED_SECTIONS, FacetIndex
+from kb_search import bm25_idf, threshold_top_k, tokenize
+from knowledge_base import SEARCHABLE_SECTIONS, FirstAidKnowledgeBase
+
+MAGIC = b"SKBC"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHIIId10Q")
+DOC = struct.Struct("<IIII")
+DOC_ID = struct.Struct("<I")
+TERM = struct.Struct("<IIII")
+
+# Term lookups and decoded entries kept per process for repeated access
+TERM_CACHE_SIZE = 4096
+ENTRY_CACHE_SIZE = 1024
+
+
+def compiled_path(data_file: str) -> str:
+    return os.path.splitext(data_file)[0] + ".kbc"
+
+
+def compile_knowledge_base(data_file: str, output_file: Optional[str] = None) -> str:
+    """Write the compiled form of `data_file` atomically and return its path."""
+    output_file = output_file or compiled_path(data_file)
+    kb = FirstAidKnowledgeBase(data_file, sync=False).current
+    sections = list(SEARCHABLE_SECTIONS) + [s for s in kb.knowledge_base if s not in SEARCHABLE_SECTIONS]
+
+    pool = bytearray()
+
+    def intern(value: bytes) -> Tuple[int, int]:
+        offset = len(pool)
+        pool.extend(value)
+        return offset, len(value)
+
+    docs, names, meta = bytearray(), bytearray(), {"sections": [], "indexed": 0}
+    doc_ids: Dict[Tuple[str, str], int] = {}
+    for section in sections:
+        start = len(doc_ids)
+        encoded_names = []
+        for name, data in kb.knowledge_base[section].items():
+            doc_ids[(section, name)] = len(doc_ids)
+            encoded = name.encode("utf-8")
+            encoded_names.append(encoded)
+            docs += DOC.pack(*intern(encoded), *intern(json.dumps(data, separators=(",", ":")).encode("utf-8")))
+        for position in sorted(range(len(encoded_names)), key=encoded_names.__getitem__):
+            names += DOC_ID.pack(start + position)
+        meta["sections"].append([section, start, len(doc_ids)])
+        if section in SEARCHABLE_SECTIONS:
+            meta["indexed"] += len(doc_ids) - start
+
+    index = kb.index
+    index.prepare()
+    remap = {kb_id: doc_ids[key] for kb_id, key in enumerate(kb.doc_keys) if key in doc_ids}
+    terms = bytearray()
+    ranked_impacts, ranked_docs = array("d"), array("I")
+    sorted_impacts, sorted_docs = array("d"), array("I")
+    for encoded_term, term in sorted((term.encode("utf-8"), term) for term in index.postings):
+        ranked = sorted(((impact, remap[doc_id]) for impact, doc_id in index._ranked_postings(term)), reverse=True)
+        terms += TERM.pack(*intern(encoded_term), len(ranked_docs), len(ranked))
+        ranked_impacts.extend(impact for impact, _ in ranked)
+        ranked_docs.extend(doc_id for _, doc_id in ranked)
+        by_doc = sorted(ranked, key=lambda posting: posting[1])
+        sorted_impacts.extend(impact for impact, _ in by_doc)
+        sorted_docs.extend(doc_id for _, doc_id in by_doc)
+    if len(pool) >= 2 ** 32:
+        raise ValueError("Knowledge base too large to compile (string pool over 4 GiB)")
+    if sys.byteorder != "little":
+        for values in (ranked_impacts, ranked_docs, sorted_impacts, sorted_docs):
+            values.byteswap()
+
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    # Pad so the float64 arrays start 8-byte aligned
+    meta_bytes += b" " * (-(HEADER.size + len(meta_bytes)) % 8)
+    tables = [meta_bytes, ranked_impacts.tobytes(), sorted_impacts.tobytes(), ranked_docs.tobytes(),
+              sorted_docs.tobytes(), docs, names, terms, pool]
+    offsets, offset = [], HEADER.size
+    for table in tables:
+        offsets.append(offset)
+        offset += len(table)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(doc_ids), len(index.postings), len(ranked_docs), index.avgdl,
+                         offsets[0], len(meta_bytes), *offsets[1:])
+
+    temp_file = output_file + ".tmp"
+    with open(temp_file, "wb") as f:
+        f.write(header)
+        for table in tables:
+            f.write(table)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, output_file)
+    return output_file
+
+
+def is_current(compiled_file: str, data_file: str) -> bool:
+    """True if `compiled_file` exists and is newer than the snapshot and journals it was built from."""
+    if not os.path.exists(compiled_file):
+        return False
+    journals = (data_file + ".journal", data_file + ".journal.compacting")
+    sources = [path for path in (data_file,) + journals if os.path.exists(path)]
+    return all(os.path.getmtime(compiled_file) >= os.path.getmtime(path) for path in sources)
+
+
+def load_knowledge_base(data_file: str):
+    """The compiled knowledge base for `data_file` when it is up to date, otherwise the JSON one."""
+    compiled_file = compiled_path(data_file)
+    if is_current(compiled_file, data_file):
+        return CompiledKnowledgeBase(compiled_file)
+    return FirstAidKnowledgeBase(data_file)
+
+
+class _PostingList(Sequence):
+    """One term's postings as (impact, doc_id) pairs in impact order, read in place from the map."""
+
+    def __init__(self, impacts, doc_ids, sorted_impacts, sorted_doc_ids):
+        self._impacts = impacts
+        self._doc_ids = doc_ids
+        self._sorted_impacts = sorted_impacts
+        self._sorted_doc_ids = sorted_doc_ids
+        self._count = len(doc_ids)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(zip(self._impacts[position].tolist(), self._doc_ids[position].tolist()))
+        return self._impacts[position], self._doc_ids[position]
+
+    def get(self, doc_id: int, default: float = 0.0) -> float:
+        """Impact of `doc_id` for this term (binary search of the doc-id-ordered copy)."""
+        doc_ids = self._sorted_doc_ids
+        position = bisect_left(doc_ids, doc_id)
+        if position < self._count and doc_ids[position] == doc_id:
+            return self._sorted_impacts[position]
+        return default
+
+
+class _CompiledSection(Mapping):
+    """Read-only name -> entry mapping for one section, decoding entries on access."""
+
+    def __init__(self, kb: "CompiledKnowledgeBase", start: int, end: int):
+        self._kb = kb
+        self._start = start
+        self._end = end
+
+    def __getitem__(self, name: str) -> Dict:
+        doc_id = self._kb._find(self._start, self._end, name)
+        if doc_id is None:
+            raise KeyError(name)
+        return self._kb._data(doc_id)
+
+    def __iter__(self):
+        for doc_id in range(self._start, self._end):
+            yield self._kb._name(doc_id)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def items(self):
+        # By position rather than by name lookup; still decodes lazily
+        for doc_id in range(self._start, self._end):
+            yield self._kb._entry(doc_id)
+
+
+class CompiledKnowledgeBase:
+    """Read-only FirstAidKnowledgeBase backed by a memory-mapped compiled file."""
+
+    def __init__(self, compiled_file: str):
+        self.data_file = compiled_file
+        with open(compiled_file, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.doc_count, self.term_count, posting_count, self.avgdl, meta_offset, meta_length,
+         ranked_impacts, sorted_impacts, ranked_docs, sorted_docs,
+         self._docs, self._names, self._terms, self._pool) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{compiled_file} is not a version {VERSION} compiled knowledge base")
+        if sys.byteorder != "little":
+            self._map.close()
+            raise ValueError("Compiled knowledge bases are read on little-endian hosts only")
+        self._view = memoryview(self._map)
+        self._arrays = tuple(
+            self._view[offset:offset + posting_count * size].cast(code)
+            for offset, size, code in ((ranked_impacts, 8, "d"), (ranked_docs, 4, "I"),
+                                       (sorted_impacts, 8, "d"), (sorted_docs, 4, "I")))
+        meta = json.loads(self._map[meta_offset:meta_offset + meta_length])
+        self._indexed = meta["indexed"]
+        self._doc_sections = [(end, section) for section, _, end in meta["sections"]]
+        self.knowledge_base = {section: _CompiledSection(self, start, end) for section, start, end in meta["sections"]}
+        self._lists: "OrderedDict[str, Optional[_PostingList]]" = OrderedDict()
+        self._entries: "OrderedDict[int, Tuple[str, Dict]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._facets: Optional[FacetIndex] = None
+
+    def close(self):
+        with self._cache_lock:
+            self._lists.clear()
+            self._entries.clear()
+        for view in self._arrays + (self._view,):
+            view.release()
+        self._map.close()
+
+    def _pool_bytes(self, offset: int, length: int) -> bytes:
+        start = self._pool + offset
+        return self._map[start:start + length]
+
+    def _entry(self, doc_id: int) -> Tuple[str, Dict]:
+        with self._cache_lock:
+            entry = self._entries.get(doc_id)
+            if entry is not None:
+                self._entries.move_to_end(doc_id)
+                return entry
+        name_offset, name_length, data_offset, data_length = DOC.unpack_from(self._map, self._docs + doc_id * DOC.size)
+        entry = (self._pool_bytes(name_offset, name_length).decode("utf-8"),
+                 json.loads(self._pool_bytes(data_offset, data_length)))
+        with self._cache_lock:
+            self._entries[doc_id] = entry
+            if len(self._entries) > ENTRY_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _name(self, doc_id: int) -> str:
+        return self._entry(doc_id)[0]
+
+    def _data(self, doc_id: int) -> Dict:
+        return self._entry(doc_id)[1]
+
+    def _section(self, doc_id: int) -> str:
+        for end, section in self._doc_sections:
+            if doc_id < end:
+                return section
+        raise IndexError(doc_id)
+
+    def _find(self, start: int, end: int, name: str) -> Optional[int]:
+        """Binary search the section's sorted name table for `name`."""
+        target = name.encode("utf-8")
+        low, high = start, end
+        while low < high:
+            middle = (low + high) // 2
+            doc_id = DOC_ID.unpack_from(self._map, self._names + middle * DOC_ID.size)[0]
+            name_offset, name_length, _, _ = DOC.unpack_from(self._map, self._docs + doc_id * DOC.size)
+            candidate = self._pool_bytes(name_offset, name_length)
+            if candidate == target:
+                return doc_id
+            if candidate < target:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _posting_list(self, term: str) -> Optional[_PostingList]:
+        with self._cache_lock:
+            if term in self._lists:
+                self._lists.move_to_end(term)
+                return self._lists[term]
+        target = term.encode("utf-8")
+        found = None
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            term_offset, term_length, start, count = TERM.unpack_from(self._map, self._terms + middle * TERM.size)
+            candidate = self._pool_bytes(term_offset, term_length)
+            if candidate == target:
+                found = _PostingList(*(values[start:start + count] for values in self._arrays))
+                break
+            if candidate < target:
+                low = middle + 1
+            else:
+                high = middle
+        with self._cache_lock:
+            self._lists[term] = found
+            if len(self._lists) > TERM_CACHE_SIZE:
+                self._lists.popitem(last=False)
+        return found
+
+    def search(self, query: str, top_k: int = 10, max_candidates: Optional[int] = None) -> List[Tuple[float, int]]:
+        """(score, doc_id) pairs ranked exactly as BM25Index.search ranks them."""
+        lists = []
+        for term in dict.fromkeys(tokenize(query)):
+            postings = self._posting_list(term)
+            if postings is not None:
+                lists.append((bm25_idf(self._indexed, len(postings)), postings, postings))
+        if not lists or top_k <= 0:
+            return []
+        return threshold_top_k(lists, top_k, max_candidates)
+
+    @property
+    def facets(self) -> FacetIndex:
+        """Symptom/equipment bitsets, built on first use (this decodes every faceted entry once)."""
+        if self._facets is None:
+            # Built aside and published whole, so another thread never sees a partial index
+            facets = FacetIndex()
+            for section in FACETED_SECTIONS:
+                entries = self.knowledge_base.get(section)
+                if entries is not None:
+                    for doc_id in range(entries._start, entries._end):
+                        # Straight from the pool, so the scan doesn't flush the entry cache
+                        _, _, data_offset, data_length = DOC.unpack_from(self._map, self._docs + doc_id * DOC.size)
+                        facets.add(doc_id, json.loads(self._pool_bytes(data_offset, data_length)))
+            self._facets = facets
+        return self._facets
+
+    def get_emergency_info(self, name: str) -> Optional[Dict]:
+        """Get information about a specific emergency."""
+        return self.knowledge_base["emergencies"].get(name)
+
+    def get_procedure_info(self, name: str) -> Optional[Dict]:
+        """Get information about a specific procedure."""
+        return self.knowledge_base["procedures"].get(name)
+
+    def search_knowledge_base(self, query: str, top_k: int = 10, max_candidates: Optional[int] = None,
+                              types: Optional[List[str]] = None) -> List[Dict]:
+        """Same results as FirstAidKnowledgeBase.search_knowledge_base()."""
+        results = []
+        hits = self.search(query, self._indexed if types else top_k, max_candidates)
+        for score, doc_id in hits:
+            section = self._section(doc_id)
+            if types and SEARCHABLE_SECTIONS[section] not in types:
+                continue
+            if len(results) == top_k:
+                break
+            results.append({
+                "type": SEARCHABLE_SECTIONS[section],
+                "name": self._name(doc_id),
+                "score": round(score, 4),
+                "data": self._data(doc_id)
+            })
+        return results
+
+    def match_symptoms(self, symptoms: List[str], kit: Optional[Dict] = None, top_k: int = 10,
+                       min_coverage: float = 0.0) -> List[Dict]:
+        """Same results as FirstAidKnowledgeBase.match_symptoms()."""
+        results = []
+        for doc_id, matched, coverage, missing in self.facets.match(symptoms, kit, top_k, min_coverage):
+            results.append({
+                "type": SEARCHABLE_SECTIONS[self._section(doc_id)],
+                "name": self._name(doc_id),
+                "matched_symptoms": matched,
+                "equipment_coverage": round(coverage, 3),
+                "missing_equipment": missing,
+                "data": self._data(doc_id)
+            })
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a knowledge base JSON file for memory-mapped loading")
+    parser.add_argument("data_file", help="Knowledge base JSON snapshot (its journal is replayed)")
+    parser.add_argument("-o", "--output", help="Compiled file (default: data file with a .kbc extension)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    output_file = compile_knowledge_base(args.data_file, args.output)
+    print(f"Compiled {args.data_file} -> {output_file} ({os.path.getsize(output_file)} bytes) "
+          f"in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Symptom and equipment facets for FirstAidKnowledgeBase, as integer bitsets.
+
+Every distinct symptom and equipment string gets a bit. Each entry stores the
+bits of its symptoms and its required equipment, and each symptom stores the
+bitset of entries listing it. A kit is reduced once to the bitset of
+equipment it covers (its items via match_kit_items, plus common home
+supplies) and to the bitset of entries it can fully perform. After that,
+"how many reported symptoms does this entry match" and "how much of its
+equipment is in the kit" are AND plus popcount instead of string scans.
+
+Bit numbers only ever grow, so copies share their vocabularies, the way
+knowledge base versions share document ids.
+"""
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from kb_search import tokenize
+from kb_shared import shared_copy
+from kit_items import match_kit_items
+
+# Sections whose entries carry symptoms and equipment
+FACETED_SECTIONS = ("emergencies", "procedures", "protocols")
+
+# Equipment the prompt lets Solstis assume at home
+HOME_SUPPLIES = frozenset(tokenize("water soap towel cloth ice blanket pillow phone bag sink"))
+
+
+def popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    # Scanning the binary string is linear; clearing bits one by one copies the int each time
+    digits = bin(bits)[:1:-1]
+    position = digits.find("1")
+    while position >= 0:
+        yield position
+        position = digits.find("1", position + 1)
+
+
+def facet_key(text: str) -> str:
+    """Stemmed form used to compare symptoms ("Heavy bleeding" == "heavy bleed")."""
+    return " ".join(tokenize(text))
+
+
+class _Vocabulary:
+    def __init__(self):
+        self.bits: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def bit(self, text: str) -> Optional[int]:
+        key = facet_key(text)
+        if not key:
+            return None
+        bit = self.bits.get(key)
+        if bit is None:
+            # Named before it can be found, for readers of versions that share the vocabulary
+            self.names.append(text)
+            bit = self.bits[key] = len(self.names) - 1
+        return bit
+
+    def mask(self, texts: Iterable[str], add: bool = False) -> int:
+        bits = 0
+        for text in texts:
+            bit = self.bit(text) if add else self.bits.get(facet_key(text))
+            if bit is not None:
+                bits |= 1 << bit
+        return bits
+
+    def decode(self, bits: int) -> List[str]:
+        return [self.names[bit] for bit in iter_bits(bits)]
+
+
+class _KitFacet:
+    """A kit's equipment bitset and the entries it can fully perform, kept current as entries are added."""
+
+    def __init__(self, kit: Dict):
+        self.kit = kit
+        self.equipment = 0
+        self.checked = 0  # equipment bits evaluated so far
+        self.ready = 0
+
+    def copy(self) -> "_KitFacet":
+        clone = _KitFacet(self.kit)
+        clone.equipment, clone.checked, clone.ready = self.equipment, self.checked, self.ready
+        return clone
+
+    def has(self, equipment: str) -> bool:
+        return bool(set(tokenize(equipment)) & HOME_SUPPLIES or match_kit_items(equipment, self.kit))
+
+
+class FacetIndex:
+    """Per-entry symptom/equipment bitsets with per-kit availability."""
+
+    def __init__(self):
+        self.symptoms = _Vocabulary()
+        self.equipment = _Vocabulary()
+        self.entry_symptoms: Dict[int, int] = {}
+        self.entry_equipment: Dict[int, int] = {}
+        self.symptom_entries: Dict[int, int] = {}
+        self._kits: Dict[str, _KitFacet] = {}
+
+    def copy(self) -> "FacetIndex":
+        """A new version to modify; bitsets are ints, so shallow copies suffice."""
+        clone = FacetIndex()
+        clone.symptoms = self.symptoms
+        clone.equipment = self.equipment
+        clone.entry_symptoms = shared_copy(self.entry_symptoms)
+        clone.entry_equipment = shared_copy(self.entry_equipment)
+        clone.symptom_entries = shared_copy(self.symptom_entries)
+        # Readers may be caching a kit in the original; list() takes the items in one step
+        clone._kits = {kit_id: facet.copy() for kit_id, facet in list(self._kits.items())}
+        return clone
+
+    def add(self, doc_id: int, data: Dict):
+        """Index (or re-index) an entry's symptoms and equipment."""
+        self.remove(doc_id)
+        symptoms = self.symptoms.mask(data.get("symptoms", []), add=True)
+        equipment = self.equipment.mask(data.get("equipment", []), add=True)
+        self.entry_symptoms[doc_id] = symptoms
+        self.entry_equipment[doc_id] = equipment
+        for bit in iter_bits(symptoms):
+            self.symptom_entries[bit] = self.symptom_entries.get(bit, 0) | 1 << doc_id
+        for facet in self._kits.values():
+            self._refresh(facet)
+            if not equipment & ~facet.equipment:
+                facet.ready |= 1 << doc_id
+
+    def remove(self, doc_id: int):
+        symptoms = self.entry_symptoms.pop(doc_id, None)
+        if symptoms is None:
+            return
+        del self.entry_equipment[doc_id]
+        clear = ~(1 << doc_id)
+        for bit in iter_bits(symptoms):
+            self.symptom_entries[bit] &= clear
+        for facet in self._kits.values():
+            facet.ready &= clear
+
+    def _refresh(self, facet: _KitFacet):
+        """Evaluate equipment strings first seen since the kit was last checked."""
+        for bit in range(facet.checked, len(self.equipment.names)):
+            if facet.has(self.equipment.names[bit]):
+                facet.equipment |= 1 << bit
+        facet.checked = len(self.equipment.names)
+
+    def kit(self, kit: Dict) -> _KitFacet:
+        facet = self._kits.get(kit["id"])
+        if facet is None or facet.kit is not kit:
+            facet = self._kits[kit["id"]] = _KitFacet(kit)
+            self._refresh(facet)
+            for doc_id, equipment in self.entry_equipment.items():
+                if not equipment & ~facet.equipment:
+                    facet.ready |= 1 << doc_id
+        return facet
+
+    def symptoms_in_text(self, text: str, longest: int = 4) -> List[str]:
+        """Known symptoms mentioned in free text, e.g. a user's chat message."""
+        tokens = tokenize(text)
+        found = []
+        for size in range(min(longest, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                bit = self.symptoms.bits.get(" ".join(tokens[start:start + size]))
+                if bit is not None and self.symptoms.names[bit] not in found:
+                    found.append(self.symptoms.names[bit])
+        return found
+
+    def match(self, symptoms: Iterable[str], kit: Optional[Dict] = None, top_k: int = 10,
+              min_coverage: float = 0.0) -> List[Tuple[int, List[str], float, List[str]]]:
+        """(doc_id, matched symptoms, equipment coverage, missing equipment) for the best entries.
+
+        Entries are ranked by the number of `symptoms` they list, then by the
+        share of their equipment available in `kit` (1.0 without a kit or when
+        nothing is required). Entries below `min_coverage` are dropped.
+        """
+        query = self.symptoms.mask(symptoms)
+        candidates = 0
+        for bit in iter_bits(query):
+            candidates |= self.symptom_entries.get(bit, 0)
+        available = None
+        if kit is not None:
+            facet = self.kit(kit)
+            available = facet.equipment
+            if min_coverage >= 1.0:
+                candidates &= facet.ready
+
+        ranked = []
+        for doc_id in iter_bits(candidates):
+            required = self.entry_equipment[doc_id]
+            coverage = 1.0
+            if available is not None and required:
+                coverage = popcount(required & available) / popcount(required)
+                if coverage < min_coverage:
+                    continue
+            ranked.append((-popcount(self.entry_symptoms[doc_id] & query), -coverage, doc_id))
+
+        results = []
+        for negative_matched, negative_coverage, doc_id in heapq.nsmallest(top_k, ranked):
+            missing = self.entry_equipment[doc_id] & ~available if available is not None else 0
+            results.append((doc_id, self.symptoms.decode(self.entry_symptoms[doc_id] & query),
+                            -negative_coverage, self.equipment.decode(missing)))
+        return results
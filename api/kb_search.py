@@ -0,0 +1,279 @@
+"""Inverted index with light stemming and BM25 ranking for FirstAidKnowledgeBase.
+
+Documents are knowledge-base entries with weighted fields (name, symptoms,
+equipment, steps). Each term keeps a posting map {doc_id: weighted term
+frequency}, plus a list of the same postings ordered by their BM25
+contribution. Queries walk those ordered lists with the threshold algorithm
+and stop as soon as no unread posting can change the top k, instead of
+scoring every document that shares a term with the query.
+
+Scores use a reference average document length that is only refreshed when
+the real average drifts by more than AVGDL_DRIFT, so an add re-orders just the
+lists of its own terms instead of every list.
+
+copy() returns a new version that shares every posting map and ranked list
+with the original and copies one only when it is first changed, so a writer
+can update a copy while readers keep searching the original. Copied maps and
+ranked lists are kb_shared containers, so later copies share their unchanged
+buckets and a change copies one bucket rather than a whole list. Changes are
+applied to cached ranked lists in place (a binary search per posting) until a
+list has had INCREMENTAL_EDITS of them in one version; after that it is
+re-ranked once by settle().
+"""
+import heapq
+import math
+import re
+from itertools import islice
+from typing import Collection, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from kb_shared import SharedRanking, shared_copy
+
+# Field weights: a match in the entry name counts three times a match in a step
+FIELD_WEIGHTS = {"name": 3.0, "symptoms": 2.0, "equipment": 1.5, "steps": 1.0}
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i if in into is it its my of on or so that the then "
+    "this to was were will with you your".split())
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+AVGDL_DRIFT = 0.1
+
+INCREMENTAL_EDITS = 32
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ational", "ization", "fulness", "ousness", "iveness", "ation", "ness", "ment",
+             "ings", "ing", "edly", "ed", "ly", "ies", "es", "s")
+_STEM_CACHE: Dict[str, str] = {}
+
+
+def stem(word: str) -> str:
+    """Strip common English suffixes ("bleeding" -> "bleed", "burns" -> "burn")."""
+    cached = _STEM_CACHE.get(word)
+    if cached is not None:
+        return cached
+    result = word
+    if len(word) > 3 and not word.endswith(("ss", "us", "is")):
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                result = word[:-len(suffix)]
+                if suffix == "ies":
+                    result += "y"
+                elif suffix in ("ing", "ings", "ed") and len(result) > 3 and result[-1] == result[-2] \
+                        and result[-1] not in "lsz":
+                    result = result[:-1]  # "stopping" -> "stop"
+                break
+    if len(_STEM_CACHE) < 100_000:
+        _STEM_CACHE[word] = result
+    return result
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem."""
+    return [stem(token) for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def entry_fields(name: str, data: Dict) -> Dict[str, str]:
+    return {
+        "name": name,
+        "symptoms": " ".join(data.get("symptoms", [])),
+        "equipment": " ".join(data.get("equipment", [])),
+        "steps": " ".join(data.get("steps", [])),
+    }
+
+
+class BM25Index:
+    """Incrementally maintained inverted index over weighted text fields."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.doc_terms: Dict[int, Dict[str, float]] = {}
+        self.doc_lengths: Dict[int, float] = {}
+        self.total_length = 0.0
+        self._ranked: Dict[str, SharedRanking] = {}
+        self._impacts: Dict[str, Dict[int, float]] = {}
+        self.avgdl = 0.0  # reference average length used for scoring
+        self._owned = set()  # terms whose posting map this version created or copied
+        self._edits: Dict[str, int] = {}  # in-place changes to each term's ranked list in this version
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def copy(self) -> "BM25Index":
+        """A new version to modify; posting maps are copied on their first change."""
+        clone = BM25Index.__new__(BM25Index)
+        clone.postings = shared_copy(self.postings)
+        clone.doc_terms = shared_copy(self.doc_terms)
+        clone.doc_lengths = shared_copy(self.doc_lengths)
+        clone.total_length = self.total_length
+        clone._ranked = shared_copy(self._ranked)
+        clone._impacts = shared_copy(self._impacts)
+        clone.avgdl = self.avgdl
+        clone._owned = set()
+        clone._edits = {}
+        return clone
+
+    def _posting(self, term: str) -> Dict[int, float]:
+        posting = self.postings.get(term)
+        if term not in self._owned:
+            posting = self.postings[term] = shared_copy(posting) if posting else {}
+            self._owned.add(term)
+        elif posting is None:
+            posting = self.postings[term] = {}
+        return posting
+
+    def add(self, doc_id: int, fields: Dict[str, str]):
+        """Index (or re-index) a document."""
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        terms: Dict[str, float] = {}
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for token in tokenize(text):
+                terms[token] = terms.get(token, 0.0) + weight
+        length = sum(terms.values())
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            self._posting(term)[doc_id] = frequency
+            self._edit_ranking(term, doc_id, frequency)
+
+    def remove(self, doc_id: int):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in terms:
+            posting = self._posting(term)
+            del posting[doc_id]
+            if posting:
+                self._edit_ranking(term, doc_id, None)
+            else:
+                del self.postings[term]
+                self._ranked.pop(term, None)
+                self._impacts.pop(term, None)
+
+    def _edit_ranking(self, term: str, doc_id: int, frequency: Optional[float]):
+        """Move doc_id within the term's cached ranked list (drop it with a None frequency)."""
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            return
+        edits = self._edits.get(term, 0)
+        if edits == INCREMENTAL_EDITS:
+            # Cheaper to re-rank the list once than to keep shifting it
+            del self._ranked[term]
+            del self._impacts[term]
+            return
+        impacts = self._impacts[term]
+        if not edits:
+            ranked = self._ranked[term] = ranked.copy()
+            impacts = self._impacts[term] = shared_copy(impacts)
+        self._edits[term] = edits + 1
+        old = impacts.pop(doc_id, None)
+        if old is not None:
+            ranked.remove((old, doc_id))
+        if frequency is not None:
+            impact = impacts[doc_id] = self._impact(frequency, doc_id)
+            ranked.insert((impact, doc_id))
+
+    def _reference_avgdl(self) -> float:
+        current = self.total_length / len(self.doc_terms) if self.doc_terms else 1.0
+        if abs(current - self.avgdl) > AVGDL_DRIFT * self.avgdl:
+            self.avgdl = current
+            self._ranked.clear()
+            self._impacts.clear()
+        return self.avgdl
+
+    def _impact(self, frequency: float, doc_id: int) -> float:
+        """BM25 term-frequency component (without idf) of one posting."""
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avgdl)
+        return frequency * (BM25_K1 + 1) / (frequency + norm)
+
+    def _ranked_postings(self, term: str) -> SharedRanking:
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            impacts = {doc_id: self._impact(frequency, doc_id) for doc_id, frequency in self.postings[term].items()}
+            ranked = SharedRanking(sorted(((impact, doc_id) for doc_id, impact in impacts.items()), reverse=True))
+            # Impacts first: a concurrent search that finds the ranked list also finds its impacts
+            self._impacts[term] = impacts
+            self._ranked[term] = ranked
+        return ranked
+
+    def settle(self):
+        """Rank the posting lists this version changed, so searches on it only read (safe across threads)."""
+        avgdl = self.avgdl
+        self._reference_avgdl()
+        for term in (self.postings if self.avgdl != avgdl else [t for t in self._owned if t in self.postings]):
+            self._ranked_postings(term)
+
+    def prepare(self):
+        """Order every posting list now rather than on each term's first query."""
+        self._reference_avgdl()
+        for term in self.postings:
+            self._ranked_postings(term)
+
+    def search(self, query: str, top_k: int = 10, max_candidates: Optional[int] = None) -> List[Tuple[float, int]]:
+        """Return up to `top_k` (score, doc_id) pairs, best first.
+
+        Results are exact. `max_candidates` caps the documents scored to bound
+        latency, at the cost of occasionally missing a lower-ranked result.
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.postings]
+        if not terms or top_k <= 0:
+            return []
+        count = len(self.doc_terms)
+        self._reference_avgdl()
+        return threshold_top_k([(bm25_idf(count, len(self.postings[term])), self._ranked_postings(term),
+                                 self._impacts[term]) for term in terms], top_k, max_candidates)
+
+    def build(self, documents: Iterable[Tuple[int, Dict[str, str]]]):
+        for doc_id, fields in documents:
+            self.add(doc_id, fields)
+        self.prepare()
+
+
+def bm25_idf(document_count: int, document_frequency: int) -> float:
+    return math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def threshold_top_k(lists: List[Tuple[float, Collection[Tuple[float, int]], Mapping[int, float]]], top_k: int,
+                    max_candidates: Optional[int] = None) -> List[Tuple[float, int]]:
+    """Top-k (score, doc_id) pairs for a query, given each term's (idf, ranked postings, impacts).
+
+    Ranked postings are (impact, doc_id) in descending impact order; impacts
+    map doc_id to the same values for random access.
+    """
+    if len(lists) == 1:
+        term_idf, ranked, _ = lists[0]
+        return [(term_idf * impact, doc_id) for impact, doc_id in islice(ranked, top_k)]
+
+    # Threshold algorithm: read the lists in impact order, fully score each new
+    # document, and stop once no unseen document can beat the current top k.
+    heap: List[Tuple[float, int]] = []
+    seen = set()
+    cursors = [iter(ranked) for _, ranked, _ in lists]
+    for _ in range(max(len(ranked) for _, ranked, _ in lists)):
+        threshold = 0.0
+        for (term_idf, _, _), cursor in zip(lists, cursors):
+            posting = next(cursor, None)
+            if posting is None:
+                continue
+            impact, doc_id = posting
+            threshold += term_idf * impact
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            score = 0.0
+            for weight, _, impacts in lists:
+                score += weight * impacts.get(doc_id, 0.0)
+            if len(heap) < top_k:
+                heapq.heappush(heap, (score, -doc_id))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, -doc_id))
+        if len(heap) == top_k and heap[0][0] >= threshold:
+            break
+        if max_candidates and len(seen) >= max_candidates:
+            break
+    return [(doc_score, -negative_id) for doc_score, negative_id in sorted(heap, reverse=True)]
@@ -0,0 +1,274 @@
+"""Copy-on-write containers for knowledge base versions.
+
+Every add publishes a new KnowledgeBaseVersion, so copying a version's maps
+must cost much less than their size. These containers keep their items in
+buckets: copy() copies only the list of buckets, and a copy duplicates a
+bucket the first time it changes it, sharing every other bucket with the
+version it came from. Buckets hold about BUCKET_SIZE items, or about sqrt(n)
+once there are more than BUCKET_SIZE ** 2, so both steps cost O(sqrt(n)) per
+container instead of O(n).
+
+    SharedMap       unordered map (posting maps and per-document tables)
+    SharedSection   map in insertion order (knowledge base sections)
+    SharedRanking   postings sorted best first (BM25 ranked lists)
+
+Maps built in one go (at load time, or a term's first postings) stay plain
+dicts; shared_copy() turns them into SharedMaps the first time a writer copies
+them. A container that has been published is never changed again, so readers
+use it without locking.
+"""
+import math
+from collections.abc import MutableMapping
+from itertools import chain
+from typing import Iterable, Iterator, List, Tuple
+
+BUCKET_SIZE = 64
+
+
+def bucket_size(count: int) -> int:
+    """Items per bucket for a container of `count` items."""
+    return max(BUCKET_SIZE, math.isqrt(count))
+
+
+def _capacity(buckets: int) -> int:
+    """Items a SharedMap holds in `buckets` buckets before it doubles them."""
+    return buckets * max(BUCKET_SIZE, buckets)
+
+
+def descending_position(ranked: List[Tuple[float, int]], posting: Tuple[float, int]) -> int:
+    """Index of `posting` in (or where it belongs in) a list sorted in descending order."""
+    low, high = 0, len(ranked)
+    while low < high:
+        middle = (low + high) // 2
+        if ranked[middle] > posting:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def shared_copy(mapping):
+    """A copy of `mapping` to change: a bucket list copy for a SharedMap, one full copy for a dict."""
+    return mapping.copy() if isinstance(mapping, SharedMap) else SharedMap(mapping)
+
+
+class SharedMap(MutableMapping):
+    """Dict-like map split into a power-of-two number of hash buckets."""
+
+    __slots__ = ("_buckets", "_owned", "_mask", "_size")
+
+    def __init__(self, items=()):
+        items = dict(items)
+        count = 1
+        while _capacity(count) < len(items):
+            count *= 2
+        self._fill(items.items(), count)
+        self._size = len(items)
+
+    def copy(self) -> "SharedMap":
+        clone = SharedMap.__new__(SharedMap)
+        clone._buckets = list(self._buckets)
+        clone._owned = bytearray(len(self._buckets))
+        clone._mask = self._mask
+        clone._size = self._size
+        return clone
+
+    def __getitem__(self, key):
+        return self._buckets[hash(key) & self._mask][key]
+
+    def get(self, key, default=None):
+        return self._buckets[hash(key) & self._mask].get(key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in self._buckets[hash(key) & self._mask]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._buckets)
+
+    def items(self):
+        return chain.from_iterable(bucket.items() for bucket in self._buckets)
+
+    def values(self):
+        return chain.from_iterable(bucket.values() for bucket in self._buckets)
+
+    def _writable(self, key) -> dict:
+        index = hash(key) & self._mask
+        if not self._owned[index]:
+            self._buckets[index] = dict(self._buckets[index])
+            self._owned[index] = 1
+        return self._buckets[index]
+
+    def __setitem__(self, key, value):
+        bucket = self._writable(key)
+        if key not in bucket:
+            self._size += 1
+        bucket[key] = value
+        if self._size > _capacity(len(self._buckets)):
+            self._fill(list(self.items()), len(self._buckets) * 2)
+
+    def __delitem__(self, key):
+        del self._writable(key)[key]
+        self._size -= 1
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self._size -= 1
+        return self._writable(key).pop(key)
+
+    def clear(self):
+        self._fill((), 1)
+        self._size = 0
+
+    def _fill(self, items: Iterable, count: int):
+        if count == 1:
+            buckets, mask = [dict(items)], 0
+        else:
+            buckets = [{} for _ in range(count)]
+            mask = count - 1
+            for key, value in items:
+                buckets[hash(key) & mask][key] = value
+        self._buckets, self._owned, self._mask = buckets, bytearray(b"\x01") * count, mask
+
+
+class SharedSection(MutableMapping):
+    """Dict-like map that iterates in insertion order, like the section dicts it replaces.
+
+    Entries live in numbered slots, BUCKET_SIZE to a chunk; a SharedMap gives
+    each name its slot. Replacing an entry keeps its position.
+    """
+
+    __slots__ = ("_slots", "_chunks", "_owned", "_used")
+
+    def __init__(self, items=()):
+        self._slots = SharedMap()
+        self._chunks: List[list] = []
+        self._owned = bytearray()
+        self._used = 0  # slots handed out, including those of removed entries
+        self.update(items)
+
+    def copy(self) -> "SharedSection":
+        clone = SharedSection.__new__(SharedSection)
+        clone._slots = self._slots.copy()
+        clone._chunks = list(self._chunks)
+        clone._owned = bytearray(len(self._chunks))
+        clone._used = self._used
+        return clone
+
+    def __getitem__(self, name):
+        slot = self._slots[name]
+        return self._chunks[slot // BUCKET_SIZE][slot % BUCKET_SIZE][1]
+
+    def get(self, name, default=None):
+        slot = self._slots.get(name)
+        if slot is None:
+            return default
+        return self._chunks[slot // BUCKET_SIZE][slot % BUCKET_SIZE][1]
+
+    def __contains__(self, name) -> bool:
+        return name in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self) -> Iterator:
+        return (entry[0] for entry in self.items())
+
+    def items(self):
+        return (entry for entry in chain.from_iterable(self._chunks) if entry is not None)
+
+    def values(self):
+        return (entry[1] for entry in self.items())
+
+    def _writable(self, chunk: int) -> list:
+        if not self._owned[chunk]:
+            self._chunks[chunk] = list(self._chunks[chunk])
+            self._owned[chunk] = 1
+        return self._chunks[chunk]
+
+    def __setitem__(self, name, data):
+        slot = self._slots.get(name)
+        if slot is None:
+            slot = self._slots[name] = self._used
+            self._used += 1
+            if slot % BUCKET_SIZE == 0:
+                self._chunks.append([])
+                self._owned.append(1)
+            self._writable(slot // BUCKET_SIZE).append((name, data))
+        else:
+            self._writable(slot // BUCKET_SIZE)[slot % BUCKET_SIZE] = (name, data)
+
+    def __delitem__(self, name):
+        slot = self._slots.pop(name)
+        self._writable(slot // BUCKET_SIZE)[slot % BUCKET_SIZE] = None
+
+
+class SharedRanking:
+    """(impact, doc_id) postings in descending order, in sorted chunks of up to twice the bucket size."""
+
+    __slots__ = ("_chunks", "_lasts", "_owned", "_size")
+
+    def __init__(self, ranked: Iterable[Tuple[float, int]] = ()):
+        """`ranked` must already be in descending order."""
+        ranked = list(ranked)
+        size = bucket_size(len(ranked))
+        self._chunks = [ranked[start:start + size] for start in range(0, len(ranked), size)] or [[]]
+        self._lasts = [chunk[-1] if chunk else None for chunk in self._chunks]  # smallest posting of each chunk
+        self._owned = bytearray(b"\x01") * len(self._chunks)
+        self._size = len(ranked)
+
+    def copy(self) -> "SharedRanking":
+        clone = SharedRanking.__new__(SharedRanking)
+        clone._chunks = list(self._chunks)
+        clone._lasts = list(self._lasts)
+        clone._owned = bytearray(len(self._chunks))
+        clone._size = self._size
+        return clone
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Tuple[float, int]]:
+        return chain.from_iterable(self._chunks)
+
+    def _chunk(self, posting: Tuple[float, int]) -> int:
+        if self._lasts[-1] is None:
+            return 0
+        return min(descending_position(self._lasts, posting), len(self._chunks) - 1)
+
+    def _writable(self, index: int) -> list:
+        if not self._owned[index]:
+            self._chunks[index] = list(self._chunks[index])
+            self._owned[index] = 1
+        return self._chunks[index]
+
+    def insert(self, posting: Tuple[float, int]):
+        index = self._chunk(posting)
+        chunk = self._writable(index)
+        chunk.insert(descending_position(chunk, posting), posting)
+        self._size += 1
+        if len(chunk) > 2 * bucket_size(self._size):
+            half = len(chunk) // 2
+            self._chunks[index + 1:index + 1] = [chunk[half:]]
+            self._owned[index + 1:index + 1] = b"\x01"
+            del chunk[half:]
+            self._lasts[index:index + 1] = [chunk[-1], self._chunks[index + 1][-1]]
+        else:
+            self._lasts[index] = chunk[-1]
+
+    def remove(self, posting: Tuple[float, int]):
+        index = self._chunk(posting)
+        chunk = self._writable(index)
+        del chunk[descending_position(chunk, posting)]
+        self._size -= 1
+        if chunk:
+            self._lasts[index] = chunk[-1]
+        elif len(self._chunks) > 1:
+            del self._chunks[index], self._lasts[index], self._owned[index]
+        else:
+            self._lasts[index] = None
@@ -0,0 +1,35 @@
+"""Matching kit items by name, shared by treatment tracking and the knowledge base facets."""
+import re
+
+# Words too generic to identify a kit item on their own
+GENERIC_ITEM_WORDS = {'small', 'large', 'mini', 'pack', 'bottle', 'roll', 'cloth', 'medical', 'instant',
+                      'triple', 'package', 'relief', 'skin'}
+
+_ITEM_KEYWORD_CACHE = {}
+
+
+def _item_keywords(item_name):
+    keywords = _ITEM_KEYWORD_CACHE.get(item_name)
+    if keywords is None:
+        words = re.findall(r'[a-z]{3,}', item_name.lower())
+        keywords = frozenset(word.rstrip('s') for word in words if word not in GENERIC_ITEM_WORDS)
+        _ITEM_KEYWORD_CACHE[item_name] = keywords
+    return keywords
+
+
+def match_kit_items(text, kit):
+    """Kit items mentioned in `text`: those with the best share (at least half) of their keywords present."""
+    if not kit:
+        return []
+    words = {word.rstrip('s') for word in re.findall(r'[a-z]{3,}', text.lower())}
+    scored = []
+    for entry in kit['contents']:
+        keywords = _item_keywords(entry['item'])
+        if keywords:
+            score = len(keywords & words) / len(keywords)
+            if score >= 0.5:
+                scored.append((score, entry['item']))
+    if not scored:
+        return []
+    best = max(score for score, _ in scored)
+    return [item for score, item in scored if score == best]
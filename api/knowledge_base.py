@@ -0,0 +1,390 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from kb_facets import FACETED_SECTIONS, FacetIndex
+from kb_search import BM25Index, entry_fields
+from kb_shared import SharedSection
+
+# Sections that are searchable, with the result type they are reported as
+SEARCHABLE_SECTIONS = {
+    "emergencies": "emergency",
+    "procedures": "procedure",
+    "protocols": "protocol",
+    "examples": "example"
+}
+
+class KnowledgeBaseVersion:
+    """One version of the knowledge base together with its BM25 and facet indexes.
+
+    A version is never changed once published. Writers change a `derive()`d
+    copy, which shares the unchanged buckets of its sections and indexes with
+    its parent (see kb_shared.py), and publish it by swapping
+    `FirstAidKnowledgeBase.current`. Readers take that reference once per
+    query without locking, and a version is freed as soon as the last reader
+    holding it drops it.
+
+    Document ids are allocated in `doc_ids`/`doc_keys`, which only ever grow
+    and are shared by all versions.
+    """
+    
+    def __init__(self, knowledge_base: Dict, index: BM25Index, facets: FacetIndex,
+                 doc_ids: Dict, doc_keys: List):
+        self.knowledge_base = knowledge_base  # section -> SharedSection
+        self.index = index
+        self.facets = facets
+        self.doc_ids = doc_ids
+        self.doc_keys = doc_keys
+        self._owned = set(knowledge_base)  # sections this version may change in place
+    
+    def derive(self) -> "KnowledgeBaseVersion":
+        """An unpublished copy to apply changes to."""
+        version = KnowledgeBaseVersion(dict(self.knowledge_base), self.index.copy(), self.facets.copy(),
+                                       self.doc_ids, self.doc_keys)
+        version._owned = set()
+        return version
+    
+    def put(self, section: str, name: str, data: Dict):
+        """Set an entry; only call on a version that is not yet published."""
+        if section not in self._owned:
+            self.knowledge_base[section] = self.knowledge_base.get(section, SharedSection()).copy()
+            self._owned.add(section)
+        self.knowledge_base[section][name] = data
+        if section in SEARCHABLE_SECTIONS:
+            self.index_entry(section, name)
+    
+    def index_entry(self, section: str, name: str):
+        key = (section, name)
+        doc_id = self.doc_ids.get(key)
+        if doc_id is None:
+            doc_id = self.doc_ids[key] = len(self.doc_keys)
+            self.doc_keys.append(key)
+        data = self.knowledge_base[section].get(name)
+        if data is None:
+            self.index.remove(doc_id)
+            self.facets.remove(doc_id)
+        else:
+            self.index.add(doc_id, entry_fields(name, data))
+            if section in FACETED_SECTIONS:
+                self.facets.add(doc_id, data)
+    
+    def size(self) -> int:
+        return sum(len(self.knowledge_base[section]) for section in SEARCHABLE_SECTIONS)
+
+
+class FirstAidKnowledgeBase:
+    """First aid knowledge base stored as a JSON snapshot plus an append-only journal.
+
+    Each add is appended to `<data_file>.journal` as one JSON line instead of
+    rewriting the whole file. The snapshot is rewritten atomically (temp file +
+    rename) once the journal grows as large as the knowledge base, so total
+    write cost stays linear in the number of inserts. Wrap bulk loads in
+    `transaction()` to write them as a single batch.
+
+    Searchable entries are kept in a BM25 inverted index, built at load time
+    and updated on every add. Symptoms and equipment are also kept as bitsets
+    (see kb_facets.py) for kit-aware `match_symptoms` queries.
+
+    The data and indexes live in an immutable KnowledgeBaseVersion, so one
+    instance can be shared by threads: searches never see a half-applied add,
+    and writers are serialized among themselves. Each add or transaction is
+    published by a single assignment to `current`, which readers take without
+    locking. Compaction writes the snapshot of a published version after the
+    write lock is released, while later adds go to a fresh journal.
+    """
+
+    def __init__(self, data_file: str = "first_aid_data.json", compact_min: int = 1000, sync: bool = True):
+        self.data_file = data_file
+        self.journal_file = data_file + ".journal"
+        self.compacting_file = data_file + ".journal.compacting"
+        self.compact_min = compact_min
+        self.sync = sync
+        self.journal_entries = 0
+        self._pending = None
+        self._draft = None
+        self._compacting = False
+        self._write_lock = threading.RLock()
+        sections = {section: SharedSection(entries) for section, entries in self._load_data().items()}
+        version = KnowledgeBaseVersion(sections, BM25Index(), FacetIndex(), {}, [])
+        for section in SEARCHABLE_SECTIONS:
+            for name in version.knowledge_base[section]:
+                version.index_entry(section, name)
+        self._publish(version)
+        if os.path.exists(self.compacting_file):
+            # Finish the interrupted compaction before a new one could set aside over that journal
+            self._compacting = True
+            self._save_data(version)
+    
+    @property
+    def knowledge_base(self) -> Dict:
+        return self.current.knowledge_base
+    
+    @property
+    def index(self) -> BM25Index:
+        return self.current.index
+    
+    @property
+    def facets(self) -> FacetIndex:
+        return self.current.facets
+    
+    def _publish(self, version: KnowledgeBaseVersion):
+        version.index.settle()
+        self.current = version
+    
+    def _load_data(self) -> Dict:
+        """Load the snapshot and replay any journaled mutations on top of it."""
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+        else:
+            data = {}
+        for section in ("emergencies", "procedures", "symptoms", "equipment", "protocols", "examples"):
+            data.setdefault(section, {})
+        # A journal set aside by an interrupted compaction holds the older mutations
+        for journal in (self.compacting_file, self.journal_file):
+            if os.path.exists(journal):
+                self._replay(journal, data)
+        return data
+    
+    def _replay(self, journal: str, data: Dict):
+        with open(journal, 'rb+') as f:
+            intact = 0
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    mutation = json.loads(line)
+                except ValueError:
+                    break  # torn final write from a crash; everything before it is intact
+                data[mutation["section"]][mutation["name"]] = mutation["data"]
+                self.journal_entries += 1
+                intact += len(line)
+            # Drop the torn tail so later appends start on a clean line
+            f.truncate(intact)
+    
+    def _set_aside_journal(self) -> bool:
+        """Start a compaction of `current`: later adds go to a fresh journal. False if one is running."""
+        if self._compacting:
+            return False
+        self._compacting = True
+        # After a failed compaction its journal is still set aside; this snapshot covers both, so keep appending
+        if os.path.exists(self.journal_file) and not os.path.exists(self.compacting_file):
+            os.replace(self.journal_file, self.compacting_file)
+        self.journal_entries = 0
+        return True
+    
+    def _save_data(self, version: KnowledgeBaseVersion):
+        """Atomically replace the snapshot with `version` and drop the journal set aside for it.
+
+        Runs without the write lock: `version` is published, so it no longer changes.
+        """
+        try:
+            temp_file = self.data_file + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump({section: dict(entries.items()) for section, entries in version.knowledge_base.items()},
+                          f, indent=2)
+                f.flush()
+                if self.sync:
+                    os.fsync(f.fileno())
+            os.replace(temp_file, self.data_file)
+            # The snapshot now holds every mutation in the set-aside journal
+            if os.path.exists(self.compacting_file):
+                os.remove(self.compacting_file)
+        finally:
+            self._compacting = False
+    
+    def _put(self, section: str, name: str, data: Dict):
+        with self._write_lock:
+            mutation = json.dumps({"section": section, "name": name, "data": data}, separators=(',', ':'))
+            if self._pending is not None:
+                self._draft.put(section, name, data)
+                self._pending.append(mutation)
+                return
+            version = self.current.derive()
+            version.put(section, name, data)
+            self._append_journal([mutation])
+            self._publish(version)
+            compact = self._compaction_due(version)
+        if compact:
+            self._save_data(version)
+    
+    def _append_journal(self, mutations: List[str]):
+        with open(self.journal_file, 'a') as f:
+            f.write('\n'.join(mutations) + '\n')
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        self.journal_entries += len(mutations)
+    
+    def _compaction_due(self, version: KnowledgeBaseVersion) -> bool:
+        # Compact once replaying the journal would cost as much as loading the snapshot
+        return self.journal_entries >= max(self.compact_min, version.size()) and self._set_aside_journal()
+    
+    @contextmanager
+    def transaction(self):
+        """Batch the adds inside the block into one journal write and one published version; drop them on error."""
+        compact = None
+        with self._write_lock:
+            outermost = self._draft is None
+            if outermost:
+                self._draft, self._pending = self.current.derive(), []
+            try:
+                yield self
+                if outermost and self._pending:
+                    self._append_journal(self._pending)
+                    self._publish(self._draft)
+                    if self._compaction_due(self._draft):
+                        compact = self._draft
+            finally:
+                if outermost:
+                    self._draft, self._pending = None, None
+        if compact is not None:
+            self._save_data(compact)
+    
+    def compact(self):
+        """Fold the journal into a fresh snapshot now (unless a compaction is already running)."""
+        with self._write_lock:
+            version = self.current
+            if not self._set_aside_journal():
+                return
+        self._save_data(version)
+    
+    def add_emergency(self, name: str, steps: List[str], symptoms: List[str], equipment: List[str]):
+        """Add a new emergency procedure to the knowledge base."""
+        self._put("emergencies", name, {
+            "steps": steps,
+            "symptoms": symptoms,
+            "equipment": equipment
+        })
+    
+    def add_procedure(self, name: str, steps: List[str], equipment: List[str]):
+        """Add a new general procedure to the knowledge base."""
+        self._put("procedures", name, {
+            "steps": steps,
+            "equipment": equipment
+        })
+    
+    def add_protocol(self, name: str, steps: List[str], symptoms: List[str]):
+        """Add a prompt protocol section; `symptoms` are the situations that call for it."""
+        self._put("protocols", name, {
+            "steps": steps,
+            "symptoms": symptoms
+        })
+    
+    def add_example(self, name: str, steps: List[str], symptoms: List[str]):
+        """Add a few-shot example dialog; each step is one "USER: ...\nSOLSTIS: ..." exchange."""
+        self._put("examples", name, {
+            "steps": steps,
+            "symptoms": symptoms
+        })
+    
+    def get_emergency_info(self, name: str) -> Optional[Dict]:
+        """Get information about a specific emergency."""
+        return self.current.knowledge_base["emergencies"].get(name)
+    
+    def get_procedure_info(self, name: str) -> Optional[Dict]:
+        """Get information about a specific procedure."""
+        return self.current.knowledge_base["procedures"].get(name)
+    
+    def search_knowledge_base(self, query: str, top_k: int = 10, max_candidates: Optional[int] = None,
+                              types: Optional[List[str]] = None) -> List[Dict]:
+        """Return the `top_k` entries best matching `query`, ranked by BM25 over names, steps, symptoms and equipment.
+
+        `types` keeps only those result types (e.g. ["protocol"]). It ranks every
+        match before filtering, so use it on small knowledge bases.
+        """
+        version = self.current
+        results = []
+        hits = version.index.search(query, len(version.index) if types else top_k, max_candidates)
+        for score, doc_id in hits:
+            section, name = version.doc_keys[doc_id]
+            if types and SEARCHABLE_SECTIONS[section] not in types:
+                continue
+            if len(results) == top_k:
+                break
+            results.append({
+                "type": SEARCHABLE_SECTIONS[section],
+                "name": name,
+                "score": round(score, 4),
+                "data": version.knowledge_base[section][name]
+            })
+        return results
+    
+    def match_symptoms(self, symptoms: List[str], kit: Optional[Dict] = None, top_k: int = 10,
+                       min_coverage: float = 0.0) -> List[Dict]:
+        """Return entries listing the most of `symptoms`, then those `kit` is best equipped for.
+
+        `equipment_coverage` is the share of an entry's equipment found in the
+        kit or among home supplies; entries below `min_coverage` are dropped
+        (1.0 keeps only what the kit can fully perform).
+        """
+        version = self.current
+        results = []
+        for doc_id, matched, coverage, missing in version.facets.match(symptoms, kit, top_k, min_coverage):
+            section, name = version.doc_keys[doc_id]
+            results.append({
+                "type": SEARCHABLE_SECTIONS[section],
+                "name": name,
+                "matched_symptoms": matched,
+                "equipment_coverage": round(coverage, 3),
+                "missing_equipment": missing,
+                "data": version.knowledge_base[section][name]
+            })
+        return results
+
+
+def main():
+    # Example usage
+    kb = FirstAidKnowledgeBase()
+    
+    # Add a new emergency procedure
+    kb.add_emergency(
+        name="severe bleeding",
+        steps=[
+            "Call emergency services immediately",
+            "Apply direct pressure to the wound",
+            "Elevate the injured area if possible",
+            "Apply a tourniquet only as a last resort"
+        ],
+        symptoms=[
+            "Heavy bleeding",
+            "Blood soaking through bandages",
+            "Loss of consciousness",
+            "Rapid breathing"
+        ],
+        equipment=[
+            "Clean cloth or bandages",
+            "Tourniquet",
+            "Gloves",
+            "First aid kit"
+        ]
+    )
+    
+    # Add a general procedure
+    kb.add_procedure(
+        name="wound cleaning",
+        steps=[
+            "Wash hands thoroughly",
+            "Clean the wound with soap and water",
+            "Apply antibiotic ointment",
+            "Cover with sterile bandage"
+        ],
+        equipment=[
+            "Soap",
+            "Clean water",
+            "Antibiotic ointment",
+            "Sterile bandage"
+        ]
+    )
+    
+    # Search the knowledge base
+    results = kb.search_knowledge_base("bleeding")
+    print("\nSearch Results:")
+    for result in results:
+        print(f"\n{result['type'].title()}: {result['name']}")
+        print("Steps:", result['data']['steps'])
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Compact, array-backed storage for conversation messages.
+
+A conversation's turns used to be a list of dicts, each holding a role string,
+the content and an ISO timestamp string. MessageLog keeps the same data in
+three parallel columns instead: a bytearray of role codes, an array of integer
+epoch timestamps and a list of contents. Turns that fall out of the prompt
+window can optionally be zlib-compressed.
+
+Indexing returns plain dicts ({'role', 'content', 'timestamp'}), so code that
+reads `msg['role']` and `msg['content']` and the journal's JSON serialisation
+work unchanged.
+"""
+import time
+import zlib
+from array import array
+from datetime import datetime
+
+ROLES = ('system', 'user', 'assistant')
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Shorter contents rarely shrink under zlib
+MIN_COMPRESS_LENGTH = 64
+
+
+def _epoch(timestamp):
+    """Accept epoch seconds or the ISO strings older conversations were stored with."""
+    if timestamp is None:
+        return int(time.time())
+    if isinstance(timestamp, str):
+        return int(datetime.fromisoformat(timestamp).timestamp())
+    return int(timestamp)
+
+
+class MessageLog:
+    """Column-oriented list of conversation turns."""
+
+    __slots__ = ('_roles', '_timestamps', '_contents')
+
+    # Turns kept uncompressed at the end of the log (chat() sends the last 10)
+    hot_window = 10
+    compress_cold = False
+
+    def __init__(self):
+        self._roles = bytearray()
+        self._timestamps = array('q')
+        self._contents = []
+
+    @classmethod
+    def from_dicts(cls, messages):
+        log = cls()
+        for message in messages:
+            log.append(message['role'], message['content'], message.get('timestamp'))
+        return log
+
+    def append(self, role, content, timestamp=None):
+        self._roles.append(_ROLE_CODES[role])
+        self._timestamps.append(_epoch(timestamp))
+        self._contents.append(content)
+        if self.compress_cold:
+            self._compress(len(self._contents) - self.hot_window - 1)
+
+    def _compress(self, index):
+        if index < 0:
+            return
+        content = self._contents[index]
+        if isinstance(content, str) and len(content) >= MIN_COMPRESS_LENGTH:
+            packed = zlib.compress(content.encode('utf-8'))
+            if len(packed) < len(content):
+                self._contents[index] = packed
+
+    def _content(self, index):
+        content = self._contents[index]
+        if isinstance(content, bytes):
+            return zlib.decompress(content).decode('utf-8')
+        return content
+
+    def _message(self, index):
+        return {
+            'role': ROLES[self._roles[index]],
+            'content': self._content(index),
+            'timestamp': self._timestamps[index],
+        }
+
+    def __len__(self):
+        return len(self._contents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._message(i) for i in range(*index.indices(len(self._contents)))]
+        if index < 0:
+            index += len(self._contents)
+        if not 0 <= index < len(self._contents):
+            raise IndexError('message index out of range')
+        return self._message(index)
+
+    def __iter__(self):
+        for index in range(len(self._contents)):
+            yield self._message(index)
+
+    def __repr__(self):
+        return f"MessageLog({len(self)} messages)"
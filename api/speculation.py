@@ -0,0 +1,250 @@
+"""Speculative replies to the short follow-ups users usually send next.
+
+After an instruction most user turns are acknowledgements ("Done.", "Found
+it.", "I can't find it.", "It's still bleeding."), as the system prompt's own
+examples show. Once a reply is sent, Speculator predicts the few follow-ups
+that reply most likely gets and generates the model's answer to each in the
+background. When the next user message is one of them, the answer (already
+finished, or at least already started) is served instead of a new model call.
+
+Speculation is capped: at most `fanout` follow-ups per turn, never more
+generations in flight than worker threads, and no more than `session_budget`
+speculative tokens per session. Tokens spent on replies that were never served
+are reported as wasted, including those of sessions that went idle for
+`session_ttl` without sending another message.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Follow-up -> (message sent to the model, normalized user messages that count as it)
+FOLLOW_UPS = {
+    "done": ("Done.", ["done", "ok done", "okay done", "all done", "im done", "did it", "i did it", "finished",
+                       "ok", "okay"]),
+    "yes": ("Yes.", ["yes", "yeah", "yep", "yes i do", "yes i am", "i do"]),
+    "no": ("No.", ["no", "nope", "no i dont", "no im not", "i dont"]),
+    "found it": ("Found it.", ["found it", "i found it", "got it", "i got it", "i have it", "ok found it"]),
+    "cant find it": ("I can't find it.", ["cant find it", "i cant find it", "i dont see it", "i dont have it",
+                                          "its not there", "where is it"]),
+    "still bleeding": ("It's still bleeding.", ["still bleeding", "its still bleeding", "it is still bleeding",
+                                                "its still bleeding a lot", "it hasnt stopped",
+                                                "it hasnt stopped bleeding", "it still hasnt stopped",
+                                                "it still hasnt stopped bleeding"]),
+    "it stopped": ("It stopped bleeding.", ["it stopped", "its stopped", "it stopped bleeding",
+                                            "its stopped bleeding", "the bleeding stopped", "bleeding stopped",
+                                            "its better"]),
+}
+
+# (pattern in the last reply, follow-ups it makes likely), most likely first
+PREDICTIONS = [
+    (re.compile(r"\bhighlighted\b|\b(take|grab|find|get) (the|a|an|some)\b"), ("found it", "cant find it")),
+    (re.compile(r"\b(let me know when|tell me when|once you'?re done)\b"), ("done",)),
+    (re.compile(r"\b(do|are|is|can|have|did) (you|it|there)\b[^.?!]*\?"), ("yes", "no")),
+    (re.compile(r"\b(bleed\w*|pressure|press)\b"), ("still bleeding", "it stopped")),
+]
+
+AUDIO_CACHE_SIZE = 64
+
+_NORMALIZE_PATTERN = re.compile(r"[^a-z0-9]+")
+_VARIANTS = {variant: name for name, (_, variants) in FOLLOW_UPS.items() for variant in variants}
+
+
+def follow_up_for(text: str) -> Optional[str]:
+    """The follow-up `text` says, if it is one of the short ones ("It's still bleeding!" -> "still bleeding")."""
+    return _VARIANTS.get(_NORMALIZE_PATTERN.sub(" ", text.lower().replace("'", "").replace("’", "")).strip())
+
+
+def predict_follow_ups(reply: str, fanout: int) -> List[str]:
+    """Up to `fanout` follow-ups a reply is most likely to get."""
+    lowered = reply.lower()
+    likely = []
+    for pattern, follow_ups in PREDICTIONS:
+        if pattern.search(lowered):
+            likely += [name for name in follow_ups if name not in likely]
+    if "done" not in likely:
+        likely.append("done")
+    return likely[:fanout]
+
+
+class SpeculatedReply(NamedTuple):
+    text: str
+    usage: Dict[str, int]
+    latency_ms: float
+    audio: Optional[bytes]
+
+
+class _Speculation:
+    __slots__ = ("future", "state", "tokens")
+
+    def __init__(self):
+        self.future = None
+        self.state = "pending"  # 'pending' | 'served' | 'discarded'
+        self.tokens = None  # set when the generation finishes
+
+
+class Speculator:
+    """Background generation of replies to a session's likely next message.
+
+    `generate(messages, max_tokens)` returns (text, usage, latency_ms) like a
+    chat call; the optional `synthesize(text)` returns its audio or None.
+    """
+
+    def __init__(self, generate: Callable, synthesize: Optional[Callable] = None, fanout: int = 2,
+                 session_budget: int = 20000, workers: int = 4, session_ttl: float = 24 * 3600,
+                 clock: Callable[[], float] = time.time):
+        self.generate = generate
+        self.synthesize = synthesize
+        self.fanout = fanout
+        self.session_budget = session_budget
+        self.workers = workers
+        self.session_ttl = session_ttl
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculation")
+        self.lock = threading.Lock()
+        self.pending = {}  # session -> (message log, its length, {follow-up: _Speculation})
+        self.spent = {}  # session -> speculative tokens
+        self.last_active = {}  # session -> time of its last speculation
+        self.last_sweep = clock()
+        self.in_flight = 0
+        self.audio_cache = OrderedDict()  # reply text -> audio of served replies, until /api/tts asks for it
+        self.stats = {"launched": 0, "hits": 0, "misses": 0, "skipped": 0, "used_tokens": 0, "wasted_tokens": 0,
+                      "expired": 0, "audio_hits": 0}
+
+    def _expire(self, now):
+        """Drop sessions idle for longer than `session_ttl`, at most once a minute (as UsageTracker does).
+
+        Their waiting speculations count as a missed turn and their tokens as wasted.
+        """
+        if not self.session_ttl or now - self.last_sweep < min(60, self.session_ttl):
+            return
+        self.last_sweep = now
+        cutoff = now - self.session_ttl
+        for session_id in [key for key, at in self.last_active.items() if at < cutoff]:
+            pending = self.pending.pop(session_id, None)
+            if pending:
+                self.stats["misses"] += 1
+                self.stats["expired"] += 1
+                for speculation in pending[2].values():
+                    self._discard(speculation)
+            self.spent.pop(session_id, None)
+            del self.last_active[session_id]
+
+    def speculate(self, session_id: str, log, reply: str, build_messages: Callable, max_tokens: int):
+        """Start replies to the follow-ups `reply` most likely gets; `log` is the session's message log after it."""
+        self.discard(session_id)
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+            self.last_active[session_id] = now
+        speculations = {}
+        for name in predict_follow_ups(reply, self.fanout):
+            with self.lock:
+                if self.spent.get(session_id, 0) >= self.session_budget or self.in_flight >= self.workers:
+                    # Never queue: a speculation that waits for a worker is unlikely to finish first
+                    self.stats["skipped"] += 1
+                    continue
+                self.in_flight += 1
+                self.stats["launched"] += 1
+            speculation = _Speculation()
+            # Prompts are built now; the conversation may change before a worker picks them up
+            messages = build_messages(FOLLOW_UPS[name][0])
+            speculation.future = self.executor.submit(self._run, session_id, speculation, messages, max_tokens)
+            speculations[name] = speculation
+        if speculations:
+            with self.lock:
+                self.pending[session_id] = (log, len(log), speculations)
+
+    def _run(self, session_id, speculation, messages, max_tokens) -> Optional[SpeculatedReply]:
+        result, tokens = None, 0
+        try:
+            text, usage, latency_ms = self.generate(messages, max_tokens)
+            tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+            audio = self.synthesize(text) if self.synthesize else None
+            result = SpeculatedReply(text, usage, latency_ms, audio)
+        except Exception as e:
+            print(f"Speculation error: {e}")
+        with self.lock:
+            self.in_flight -= 1
+            speculation.tokens = tokens
+            self.spent[session_id] = self.spent.get(session_id, 0) + tokens
+            if speculation.state == "discarded":
+                self.stats["wasted_tokens"] += tokens
+        return result
+
+    def take(self, session_id: str, user_input: str, log) -> Optional[SpeculatedReply]:
+        """The speculated reply to `user_input`, just appended to `log`, if there is one; waits for it to finish."""
+        with self.lock:
+            pending = self.pending.pop(session_id, None)
+            if pending is None:
+                return None
+            speculated_log, length, speculations = pending
+            name = follow_up_for(user_input)
+            # Only valid for the very turn it was made for
+            chosen = speculations.get(name) if speculated_log is log and len(log) == length + 1 else None
+            self.stats["hits" if chosen else "misses"] += 1
+            for speculation in speculations.values():
+                if speculation is not chosen:
+                    self._discard(speculation)
+            if chosen:
+                chosen.state = "served"
+        if chosen is None:
+            return None
+        result = chosen.future.result()
+        with self.lock:
+            if result is None:
+                # The generation failed; count the turn as a miss
+                self.stats["hits"] -= 1
+                self.stats["misses"] += 1
+                return None
+            self.stats["used_tokens"] += result.usage["prompt_tokens"] + result.usage["completion_tokens"]
+            if result.audio:
+                self.audio_cache[result.text] = result.audio
+                while len(self.audio_cache) > AUDIO_CACHE_SIZE:
+                    self.audio_cache.popitem(last=False)
+        return result
+
+    def take_audio(self, text: str) -> Optional[bytes]:
+        """Audio synthesized ahead of time for a served reply."""
+        with self.lock:
+            audio = self.audio_cache.pop(text, None)
+            if audio:
+                self.stats["audio_hits"] += 1
+        return audio
+
+    def _discard(self, speculation):
+        if speculation.state != "pending":
+            return
+        speculation.state = "discarded"
+        if speculation.future.cancel():
+            self.in_flight -= 1
+        elif speculation.tokens is not None:
+            self.stats["wasted_tokens"] += speculation.tokens
+
+    def discard(self, session_id: str):
+        """Drop the session's speculations (on a new reply, a cleared session or a new setup)."""
+        with self.lock:
+            pending = self.pending.pop(session_id, None)
+            if pending:
+                for speculation in pending[2].values():
+                    self._discard(speculation)
+
+    def reset_session(self, session_id: str):
+        self.discard(session_id)
+        with self.lock:
+            self.spent.pop(session_id, None)
+            self.last_active.pop(session_id, None)
+
+    def snapshot(self):
+        """Totals and hit rate, for the admin endpoint."""
+        with self.lock:
+            self._expire(self.clock())
+            result = dict(self.stats)
+            turns = result["hits"] + result["misses"]
+            result["hit_rate"] = result["hits"] / turns if turns else 0.0
+            result["in_flight"] = self.in_flight
+            result["fanout"] = self.fanout
+            result["session_budget"] = self.session_budget
+            return result
@@ -0,0 +1,213 @@
+"""Streaming speech-to-text: audio frames in while the user speaks, partial transcripts out, a final one at end of speech.
+
+The browser used to record until two seconds of silence (or a click), then
+upload the whole recording to /api/stt and wait for the transcript. Over the
+/api/stt/stream WebSocket it sends 16-bit mono PCM frames as it records
+instead, and StreamingTranscription:
+
+- detects speech and end of speech from frame energy (Endpointer), so the
+  utterance ends `end_ms` after the user stops talking rather than when the
+  client gives up waiting;
+- transcribes the audio so far every `partial_interval_ms` of speech and
+  pushes the text back as a partial transcript;
+- starts transcribing the utterance as soon as the speaker pauses, so by the
+  time the pause has lasted `end_ms` the final transcript is usually already
+  back. If they carry on talking, that transcription is dropped.
+
+An utterance is capped at `max_ms` of audio whether or not speech started,
+and a stream that stays quiet for `no_speech_ms` ends with an empty final
+transcript without calling the backend, so a silent client cannot make the
+server buffer without limit.
+
+`transcribe(pcm, sample_rate)` is the backend. ElevenLabsTranscriber posts
+WAV audio to ElevenLabs' speech-to-text, which benchmarks/mock_upstreams.py
+stands in for offline.
+
+Protocol, one utterance per connection:
+    client -> {"type": "start", "sample_rate": 16000}   (optional, text; a rate in SAMPLE_RATES)
+    client -> PCM frames                                (binary)
+    client -> {"type": "stop"}                          (optional: finalize now)
+    server -> {"type": "partial", "text": ...}
+    server -> {"type": "final", "text": ..., "reason": "silence" | "stop" | "max_length" | "no_speech"}
+    server -> {"type": "error", "error": ...}
+"""
+import io
+import math
+import wave
+from array import array
+from concurrent.futures import Future
+
+SAMPLE_RATE = 16000
+
+# Rates a client may stream at; the audio buffer limits are sized from the rate
+SAMPLE_RATES = frozenset({8000, 16000, 22050, 24000, 44100, 48000})
+
+
+def frame_rms(pcm: bytes) -> float:
+    """Root mean square of 16-bit little-endian PCM samples."""
+    samples = array('h')
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _resolved(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class Endpointer:
+    """Energy-based speech detection over 16-bit PCM frames.
+
+    feed() returns 'start' when speech begins, 'pause' on the first quiet
+    frame after speech, 'resume' when speech follows a pause and 'end' once
+    the quiet has lasted `end_ms`; otherwise None.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, threshold=500.0, start_ms=60, pause_ms=100, end_ms=500):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.start_ms = start_ms
+        self.pause_ms = pause_ms
+        self.end_ms = end_ms
+        self.speaking = False
+        self.paused = False
+        self.voiced_ms = 0.0
+        self.quiet_ms = 0.0
+
+    def feed(self, pcm: bytes):
+        duration_ms = len(pcm) / 2 / self.sample_rate * 1000
+        if frame_rms(pcm) >= self.threshold:
+            self.quiet_ms = 0.0
+            self.voiced_ms += duration_ms
+            if not self.speaking and self.voiced_ms >= self.start_ms:
+                self.speaking = True
+                return 'start'
+            if self.paused:
+                self.paused = False
+                return 'resume'
+            return None
+        if not self.speaking:
+            self.voiced_ms = 0.0
+            return None
+        self.quiet_ms += duration_ms
+        if self.quiet_ms >= self.end_ms:
+            return 'end'
+        if not self.paused and self.quiet_ms >= self.pause_ms:
+            self.paused = True
+            return 'pause'
+        return None
+
+
+class ElevenLabsTranscriber:
+    """Transcribes PCM with ElevenLabs speech-to-text through `session` (a requests.Session)."""
+
+    def __init__(self, session, api_base, api_key, model_id='scribe_v1', timeout=30):
+        self.session = session
+        self.url = f"{api_base}/v1/speech-to-text"
+        self.api_key = api_key
+        self.model_id = model_id
+        self.timeout = timeout
+
+    def __call__(self, pcm: bytes, sample_rate: int) -> str:
+        response = self.session.post(self.url, headers={'xi-api-key': self.api_key},
+                                     files={'file': ('speech.wav', pcm_to_wav(pcm, sample_rate), 'audio/wav')},
+                                     data={'model_id': self.model_id}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('text', '').strip()
+
+
+class StreamingTranscription:
+    """One utterance: feed() audio frames as they arrive, poll() for messages to send back."""
+
+    def __init__(self, transcribe, executor, sample_rate=SAMPLE_RATE, end_ms=500,
+                 partial_interval_ms=700, max_ms=30000, no_speech_ms=8000, speech_threshold=500.0):
+        if sample_rate not in SAMPLE_RATES:
+            raise ValueError(f"Unsupported sample rate: {sample_rate}")
+        self.transcribe = transcribe
+        self.executor = executor
+        self.sample_rate = sample_rate
+        self.partial_interval_ms = partial_interval_ms
+        self.max_bytes = int(max_ms / 1000 * sample_rate) * 2
+        self.no_speech_bytes = int(no_speech_ms / 1000 * sample_rate) * 2
+        self.endpointer = Endpointer(sample_rate, threshold=speech_threshold, end_ms=end_ms)
+        self.audio = bytearray()
+        self.speech_start = None  # byte offset where speech began
+        self.partial = None  # (future, audio bytes it covers)
+        self.partial_bytes = 0  # audio covered by the last partial sent
+        self.tentative = None  # (future, audio bytes it covers), started at a pause
+        self.final = None  # (future, reason)
+        self.final_sent = False
+
+    def _submit(self, length):
+        # A little audio before speech began, so the first word is not clipped
+        start = max(0, self.speech_start - int(0.2 * self.sample_rate) * 2)
+        return self.executor.submit(self.transcribe, bytes(self.audio[start:length]), self.sample_rate)
+
+    def feed(self, pcm: bytes):
+        if self.final is not None:
+            return
+        self.audio += pcm
+        event = self.endpointer.feed(pcm)
+        if event == 'start':
+            self.speech_start = max(0, len(self.audio) - int(self.endpointer.voiced_ms / 1000 * self.sample_rate) * 2)
+        elif event == 'pause':
+            self.tentative = (self._submit(len(self.audio)), len(self.audio))
+        elif event == 'resume':
+            self.tentative = None
+        elif event == 'end':
+            tentative = self.tentative
+            self.final = (tentative[0] if tentative else self._submit(len(self.audio)), 'silence')
+            return
+        if len(self.audio) >= self.max_bytes:
+            self.finish('max_length')
+            return
+        if self.speech_start is None:
+            if len(self.audio) >= self.no_speech_bytes:
+                self.final = (_resolved(''), 'no_speech')
+            return
+        interval = int(self.partial_interval_ms / 1000 * self.sample_rate) * 2
+        if self.partial is None and len(self.audio) - max(self.partial_bytes, self.speech_start) >= interval:
+            self.partial = (self._submit(len(self.audio)), len(self.audio))
+
+    def finish(self, reason='stop'):
+        """Finalize now, with whatever audio has arrived."""
+        if self.final is None:
+            if self.speech_start is None:
+                self.speech_start = 0
+            self.final = (self._submit(len(self.audio)), reason)
+
+    @property
+    def done(self):
+        return self.final_sent
+
+    def poll(self, wait=False):
+        """Messages ready to send; with `wait`, blocks until the final transcript is ready."""
+        messages = []
+        if self.partial is not None and self.partial[0].done():
+            future, covered = self.partial
+            self.partial = None
+            self.partial_bytes = covered
+            if self.final is None and not future.exception() and future.result():
+                messages.append({'type': 'partial', 'text': future.result()})
+        if self.final is not None and not self.final_sent and (wait or self.final[0].done()):
+            future, reason = self.final
+            self.final_sent = True
+            error = future.exception()
+            if error:
+                messages.append({'type': 'error', 'error': f"Transcription failed: {error}"})
+            else:
+                messages.append({'type': 'final', 'text': future.result(), 'reason': reason})
+        return messages
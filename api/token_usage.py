@@ -0,0 +1,108 @@
+"""Per-session and per-kit token accounting with graceful budget degradation."""
+import threading
+import time
+
+# (fraction of budget used, history messages kept, max completion tokens)
+# The chat never refuses service; it only sends less context as spend grows.
+BUDGET_LADDER = [
+    (0.5, 10, 500),
+    (0.8, 6, 500),
+    (1.0, 2, 250),
+]
+OVER_BUDGET_LIMITS = (1, 150)
+
+
+def _empty_totals():
+    return {
+        'calls': 0,
+        'prompt_tokens': 0,
+        'cached_tokens': 0,
+        'completion_tokens': 0,
+        'total_tokens': 0,
+        'latency_ms': 0.0,
+    }
+
+
+def extract_usage(response):
+    """Read prompt, cached and completion token counts from an OpenAI response."""
+    usage = response.get('usage') or {}
+    details = usage.get('prompt_tokens_details') or {}
+    return {
+        'prompt_tokens': usage.get('prompt_tokens', 0),
+        'cached_tokens': details.get('cached_tokens', 0),
+        'completion_tokens': usage.get('completion_tokens', 0),
+    }
+
+
+class UsageTracker:
+    """Thread-safe token and latency totals keyed by session and by kit."""
+
+    def __init__(self, session_budget=0, session_ttl=24 * 3600, clock=time.time):
+        self.session_budget = session_budget
+        self.session_ttl = session_ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.kits = {}
+        self.last_active = {}  # session -> time of its last call
+        self.last_sweep = clock()
+
+    def _expire(self, now):
+        """Drop sessions idle for longer than `session_ttl`, at most once a minute (as journal compaction does)."""
+        if not self.session_ttl or now - self.last_sweep < min(60, self.session_ttl):
+            return
+        self.last_sweep = now
+        cutoff = now - self.session_ttl
+        for session_id in [key for key, at in self.last_active.items() if at < cutoff]:
+            self.sessions.pop(session_id, None)
+            del self.last_active[session_id]
+
+    def record(self, session_id, kit_type, usage, latency_ms):
+        """Add one model call to the session and kit totals."""
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+            self.last_active[session_id] = now
+            for bucket in (self.sessions.setdefault(session_id, _empty_totals()),
+                           self.kits.setdefault(kit_type or 'unknown', _empty_totals())):
+                bucket['calls'] += 1
+                bucket['prompt_tokens'] += usage['prompt_tokens']
+                bucket['cached_tokens'] += usage['cached_tokens']
+                bucket['completion_tokens'] += usage['completion_tokens']
+                bucket['total_tokens'] += usage['prompt_tokens'] + usage['completion_tokens']
+                bucket['latency_ms'] += latency_ms
+
+    def reset_session(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            self.last_active.pop(session_id, None)
+
+    def limits_for(self, session_id):
+        """Return (history messages to send, max completion tokens) for the session's next call."""
+        if not self.session_budget:
+            return BUDGET_LADDER[0][1], BUDGET_LADDER[0][2]
+        with self.lock:
+            spent = self.sessions.get(session_id, {}).get('total_tokens', 0)
+        used = spent / self.session_budget
+        for threshold, history, max_tokens in BUDGET_LADDER:
+            if used < threshold:
+                return history, max_tokens
+        return OVER_BUDGET_LIMITS
+
+    def snapshot(self):
+        """Copy of all totals with per-call averages, for the admin endpoint."""
+        with self.lock:
+            def with_averages(totals, budget=0):
+                result = dict(totals)
+                calls = totals['calls'] or 1
+                result['avg_prompt_tokens'] = totals['prompt_tokens'] / calls
+                result['avg_latency_ms'] = totals['latency_ms'] / calls
+                if budget:
+                    result['budget_used'] = totals['total_tokens'] / budget
+                return result
+
+            return {
+                'session_budget': self.session_budget,
+                'sessions': {key: with_averages(value, self.session_budget) for key, value in self.sessions.items()},
+                'kits': {key: with_averages(value) for key, value in self.kits.items()},
+            }
@@ -0,0 +1,209 @@
+"""Structured treatment state tracked incrementally from each conversation turn.
+
+The system prompt asks the model to track treatment attempts, never repeat a
+failed method and track items used. Instead of relying on raw history (which
+chat() truncates), TreatmentState extracts those facts from every turn with
+cheap keyword rules and renders them as a short block for the prompt, so older
+turns can be dropped without losing safety-critical context.
+
+An improvement phrase right after a negation in the same clause ("not getting
+better", "hasn't slowed", "has not stopped") reports a failure, with the same
+word window as the emergency phrase scanner.
+"""
+import re
+
+from emergency_phrases import CLAUSE_BREAK, NEGATIONS, words
+from kit_items import match_kit_items
+
+# Ordered so that more specific injuries win when several match
+INJURY_PATTERNS = [
+    ('severed body part', r'\b(severed|cut off|amputat\w*)\b'),
+    ('allergic reaction', r'\b(allergic|anaphyla\w*|hives|throat (?:is )?swelling)\b'),
+    ('burn', r'\bburn(?:ed|t|s)?\b|\bscald\w*'),
+    ('nosebleed', r'\bnose ?bleed\w*'),
+    ('cut', r'\b(cut|slice[d]?|laceration|gash|knife|scrape[d]?)\b'),
+    ('sting or bite', r'\b(sting|stung|bee|wasp|bite|bitten)\b'),
+    ('sprain', r'\b(sprain\w*|twist\w*|rolled (?:my )?ankle)\b'),
+    ('cramp', r'\bcramp\w*'),
+    ('splinter', r'\bsplinter\w*'),
+    ('eye irritation', r'\b(in my eye|eye (?:hurts|burns|is red))\b'),
+    ('fainting or dizziness', r'\b(faint\w*|dizz\w*|light-?headed|passed out)\b'),
+    ('nausea', r'\b(nause\w*|vomit\w*|throw(?:ing)? up)\b'),
+    ('cold or flu', r'\b(cough\w*|fever|flu|sore throat|congest\w*)\b'),
+    ('pain', r'\b(pain|ache|aching|hurts?)\b'),
+]
+
+BODY_PARTS = (
+    'finger', 'thumb', 'hand', 'wrist', 'arm', 'elbow', 'shoulder', 'leg', 'knee',
+    'ankle', 'foot', 'toe', 'head', 'face', 'eye', 'nose', 'lip', 'back', 'chest', 'neck', 'stomach',
+)
+
+RED_FLAG_PATTERN = re.compile(
+    r"\b(unconscious|not breathing|can'?t breathe|trouble breathing|chest pain|severed|cut off|"
+    r"won'?t stop bleeding|spurting|passed out)\b")
+SEVERE_PATTERN = re.compile(r"\b(a lot|heavy|heavily|deep|gushing|large|severe|really bad|soak\w*)\b")
+MILD_PATTERN = re.compile(r"\b(a little|small|minor|slight\w*|tiny|shallow)\b")
+
+FAILED_PATTERN = re.compile(
+    r"\b(still|hasn'?t stopped|didn'?t (?:work|help|stop)|not working|won'?t stop|worse|keeps? bleeding|no better)\b")
+WORKED_PATTERN = re.compile(r"\b(stopped|better|it worked|feels? fine|much better|slowed)\b")
+# Words that turn an improvement within NEGATION_WINDOW words after them into a failure
+NEGATION_WINDOW = 3
+OUTCOME_NEGATIONS = NEGATIONS | frozenset("hasnt havent hadnt wont cant cannot couldnt werent aint".split())
+
+# (treatment, instruction pattern, symptoms it addresses). When the user reports
+# that a symptom persists, the active treatments for that symptom are marked failed.
+TREATMENT_PATTERNS = [
+    ('rinse with water', r'\b(rinse|running water|wash (?:the|it|your))\b', r'dirt|debris'),
+    ('direct pressure', r'\b(direct pressure|press (?:gently|firmly|down)|apply pressure|hold pressure)\b', r'bleed|blood'),
+    ('hemostatic gauze', r'\b(quickclot|hemostatic)\b', r'bleed|blood'),
+    ('antibiotic ointment', r'\bointment\b', r'infect|red|pus'),
+    ('bandage', r'\b(bandage|band-aid)\b', r'bleed|blood|open'),
+    ('cold pack', r'\b(cold pack|ice pack)\b', r'swell|pain|hurt|bruis'),
+    ('lie down and elevate legs', r'\b(lie down|elevate your legs|raise your legs)\b', r'dizz|faint|light-?headed'),
+    ('electrolytes', r'\belectrolyte', r'cramp|dizz|weak'),
+    ('cool the burn', r'\b(burn gel|burn spray|cool (?:the burn|it))\b', r'burn|sting|pain|hurt'),
+    ('eye wash', r'\b(eye ?wash|flush (?:your|the) eye)\b', r'eye|sting|burn'),
+    ('sting relief wipe', r'\b(sting (?:&|and) bite|sting kill|sting relief)\b', r'itch|sting|swell|pain'),
+    ('wrap or sling', r'\b(ace bandage|elastic bandage|sling|wrap it)\b', r'pain|hurt|swell'),
+    ('glucose gel', r'\bglucose\b', r'dizz|shak|weak'),
+    ('tweezers', r'\btweezers\b', r'splinter|stuck'),
+]
+
+# Ordered from least to most urgent
+ESCALATION_LEVELS = ('none', 'follow-up care', 'emergency')
+FOLLOW_UP_PATTERN = re.compile(r"\b(stitches|see a (?:doctor|healthcare provider)|medical (?:help|attention)|urgent care)\b")
+EMERGENCY_PATTERN = re.compile(r"\b(9-1-1|911|emergency room|call emergency)\b")
+
+_INJURY_REGEXES = [(name, re.compile(pattern)) for name, pattern in INJURY_PATTERNS]
+_TREATMENT_REGEXES = [(name, re.compile(pattern)) for name, pattern, _ in TREATMENT_PATTERNS]
+_SYMPTOM_REGEXES = {name: re.compile(symptoms) for name, _, symptoms in TREATMENT_PATTERNS}
+_BODY_PART_REGEX = re.compile(r'\b(' + '|'.join(BODY_PARTS) + r')s?\b')
+
+
+def _negated(text, position):
+    """Whether a negation precedes `position` in `text` within NEGATION_WINDOW words, in the same clause."""
+    for token in reversed(words(text[:position])[-NEGATION_WINDOW:]):
+        if token == CLAUSE_BREAK:
+            return False
+        if token in OUTCOME_NEGATIONS:
+            return True
+    return False
+
+
+def instructed_treatments(text):
+    """Treatments that an assistant reply tells the user to carry out."""
+    lowered = text.lower()
+    return [name for name, regex in _TREATMENT_REGEXES if regex.search(lowered)]
+
+
+class TreatmentState:
+    """What happened so far in one session, updated turn by turn."""
+
+    def __init__(self):
+        self.injuries = []
+        self.body_parts = []
+        self.severity = 'unknown'
+        self.treatments = {}  # name -> 'in progress' | 'done' | 'worked' | 'failed'
+        self.items_used = []
+        self.escalation = 'none'
+        self.last_instructed = []
+
+    @classmethod
+    def from_messages(cls, messages, kit=None):
+        """Rebuild the state by replaying stored turns (e.g. after a restart)."""
+        state = cls()
+        for message in messages:
+            state.observe(message['role'], message['content'], kit)
+        return state
+
+    def is_empty(self):
+        return not (self.injuries or self.treatments or self.escalation != 'none')
+
+    def observe(self, role, content, kit=None):
+        if role == 'user':
+            self.observe_user(content)
+        elif role == 'assistant':
+            self.observe_assistant(content, kit)
+
+    def observe_user(self, text):
+        text = text.lower()
+        for name, regex in _INJURY_REGEXES:
+            if regex.search(text) and name not in self.injuries:
+                self.injuries.append(name)
+        for part in _BODY_PART_REGEX.findall(text):
+            if part not in self.body_parts:
+                self.body_parts.append(part)
+
+        if RED_FLAG_PATTERN.search(text):
+            self.severity = 'critical'
+        elif SEVERE_PATTERN.search(text) and self.severity != 'critical':
+            self.severity = 'severe'
+        elif MILD_PATTERN.search(text) and self.severity == 'unknown':
+            self.severity = 'mild'
+
+        # Outcomes refer to the treatments aimed at the symptom the user mentions,
+        # otherwise to whatever the last reply asked them to do
+        active = [name for name, status in self.treatments.items() if status in ('in progress', 'done')]
+        targeted = [name for name in active if _SYMPTOM_REGEXES[name].search(text)]
+        affected = targeted or [name for name in self.last_instructed if name in active]
+        worked = [match.start() for match in WORKED_PATTERN.finditer(text)]
+        if FAILED_PATTERN.search(text) or any(_negated(text, position) for position in worked):
+            outcome = 'failed'
+        elif worked:
+            outcome = 'worked'
+        elif text.strip(' .!') in ('done', 'ok', 'okay', 'finished', 'did it', 'i did it'):
+            outcome = 'done'
+        else:
+            return
+        for name in affected:
+            if outcome != 'done' or self.treatments[name] == 'in progress':
+                self.treatments[name] = outcome
+
+    def observe_assistant(self, text, kit=None):
+        lowered = text.lower()
+        self.last_instructed = []
+        for name in instructed_treatments(lowered):
+            if self.treatments.get(name) != 'failed':
+                self.treatments[name] = 'in progress'
+                self.last_instructed.append(name)
+        for item in match_kit_items(lowered, kit):
+            if item not in self.items_used:
+                self.items_used.append(item)
+
+        if EMERGENCY_PATTERN.search(lowered):
+            level = 'emergency'
+        elif FOLLOW_UP_PATTERN.search(lowered):
+            level = 'follow-up care'
+        else:
+            level = 'none'
+        if ESCALATION_LEVELS.index(level) > ESCALATION_LEVELS.index(self.escalation):
+            self.escalation = level
+
+    def to_prompt_block(self):
+        """Compact summary injected into the prompt in place of older turns."""
+        injury = ', '.join(self.injuries) or 'not yet described'
+        if self.body_parts:
+            injury += f" ({', '.join(self.body_parts)})"
+        tried = ', '.join(f"{name} ({status})" for name, status in self.treatments.items()) or 'nothing yet'
+        lines = [
+            'TREATMENT STATE (tracked from earlier turns, which may be omitted):',
+            f'- Injury: {injury}; severity: {self.severity}',
+            f'- Treatments tried: {tried}',
+            f"- Kit items used: {', '.join(self.items_used) or 'none yet'}",
+            f'- Escalation so far: {self.escalation}',
+        ]
+        failed = [name for name, status in self.treatments.items() if status == 'failed']
+        if failed:
+            lines.append(f"- Do NOT repeat: {', '.join(failed)}. Move to the next option or escalate.")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {
+            'injuries': list(self.injuries),
+            'body_parts': list(self.body_parts),
+            'severity': self.severity,
+            'treatments': dict(self.treatments),
+            'items_used': list(self.items_used),
+            'escalation': self.escalation,
+        }
@@ -0,0 +1,130 @@
+"""Text-to-speech output formats for /api/tts, and the cache its audio is served from.
+
+/api/tts always asked ElevenLabs for its default MP3 and returned the whole
+file. Clients now choose what they get:
+
+- `format` (mp3, opus or pcm), with `bitrate` in kbps for mp3 and opus or
+  `sample_rate` in Hz for pcm, as JSON fields or query parameters; without
+  them, the Accept header (audio/mpeg, audio/ogg or audio/opus, audio/pcm).
+  A phone on a weak connection can ask for 32 kbps Opus, a quarter of the
+  MP3's bytes. The kit device can ask for raw 16-bit mono PCM and play it
+  without decoding. Anything else still gets MP3. ElevenLabs' PCM is
+  little-endian, so it is labelled audio/pcm with endianness=little rather
+  than audio/L16, which is big-endian by definition (RFC 2586).
+- negotiate() maps the request onto one of ElevenLabs' output formats, the
+  nearest one that ElevenLabs offers.
+- AudioCache keeps recent audio by (voice, text, output format), up to a
+  byte budget, so the same request made again as a GET is answered from
+  memory. An <audio> element seeking, or a download resuming, sends a Range
+  request, and gets just those bytes instead of a fresh synthesis.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+MP3_BITRATES = (32, 64, 96, 128, 192)
+OPUS_BITRATES = (32, 64, 96, 128, 192)
+PCM_SAMPLE_RATES = (8000, 16000, 22050, 24000, 44100)
+DEFAULTS = {'mp3': 128, 'opus': 32, 'pcm': 16000}
+
+# Accept header types, in order of preference when the client accepts several equally
+ACCEPT_TYPES = {'audio/mpeg': 'mp3', 'audio/mp3': 'mp3', 'audio/ogg': 'opus', 'audio/opus': 'opus',
+                'audio/pcm': 'pcm'}
+
+
+class UnsupportedFormat(ValueError):
+    """The client named a format or rate that /api/tts does not offer."""
+
+
+class TtsFormat(NamedTuple):
+    name: str  # mp3, opus or pcm
+    output_format: str  # ElevenLabs' output_format, e.g. mp3_44100_128
+    mimetype: str
+    bytes_per_second: int  # nominal, for constant-bitrate audio
+
+
+def tts_format(name: str, rate: Optional[int] = None) -> TtsFormat:
+    """The format `name` at `rate` (kbps, or Hz for pcm), rounded to the nearest ElevenLabs offers."""
+    if name not in DEFAULTS:
+        raise UnsupportedFormat(f"Unsupported format {name!r}; use mp3, opus or pcm")
+    rate = rate or DEFAULTS[name]
+    if name == 'pcm':
+        sample_rate = min(PCM_SAMPLE_RATES, key=lambda option: abs(option - rate))
+        mimetype = f"audio/pcm;rate={sample_rate};channels=1;bits=16;encoding=signed-int;endianness=little"
+        return TtsFormat('pcm', f"pcm_{sample_rate}", mimetype, sample_rate * 2)
+    bitrate = min(MP3_BITRATES if name == 'mp3' else OPUS_BITRATES, key=lambda option: abs(option - rate))
+    if name == 'mp3':
+        # ElevenLabs only offers 32 kbps MP3 at 22.05 kHz
+        output_format = f"mp3_{22050 if bitrate == 32 else 44100}_{bitrate}"
+        return TtsFormat('mp3', output_format, 'audio/mpeg', bitrate * 1000 // 8)
+    return TtsFormat('opus', f"opus_48000_{bitrate}", 'audio/ogg', bitrate * 1000 // 8)
+
+
+DEFAULT_FORMAT = tts_format('mp3')
+
+
+def negotiate(params: Dict, accept=None) -> TtsFormat:
+    """The format for a request, from its `format`/`bitrate`/`sample_rate` parameters or else its Accept header.
+
+    `accept` is a werkzeug MIMEAccept (request.accept_mimetypes).
+    """
+    name = (params.get('format') or '').lower()
+    if not name and accept is not None:
+        best = accept.best_match(list(ACCEPT_TYPES))
+        name = ACCEPT_TYPES.get((best or '').lower(), '')
+    name = name or DEFAULT_FORMAT.name
+    rate = params.get('sample_rate' if name == 'pcm' else 'bitrate')
+    try:
+        rate = int(rate) if rate else None
+    except (TypeError, ValueError):
+        raise UnsupportedFormat(f"Invalid {'sample_rate' if name == 'pcm' else 'bitrate'}: {rate!r}") from None
+    return tts_format(name, rate)
+
+
+class AudioCache:
+    """Least recently used audio by (voice_id, text, output_format), up to `max_bytes`.
+
+    Pinned entries (the greeting and 9-1-1 audio synthesized at startup) are
+    never evicted and do not count against the budget.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pinned: Dict[Tuple[str, str, str], bytes] = {}
+        self.recent: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self.size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pinned) + len(self.recent)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        with self.lock:
+            audio = self.pinned.get(key)
+            if audio is None and key in self.recent:
+                self.recent.move_to_end(key)
+                audio = self.recent[key]
+            self.stats['hits' if audio is not None else 'misses'] += 1
+            return audio
+
+    def put(self, key: Tuple[str, str, str], audio: bytes, pinned: bool = False):
+        with self.lock:
+            if pinned:
+                self.pinned[key] = audio
+                return
+            if key in self.pinned or len(audio) > self.max_bytes:
+                return
+            if key in self.recent:
+                self.size -= len(self.recent.pop(key))
+            self.recent[key] = audio
+            self.size += len(audio)
+            while self.size > self.max_bytes:
+                _, evicted = self.recent.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats['evicted'] += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return dict(self.stats, pinned=len(self.pinned), recent=len(self.recent), bytes=self.size)
@@ -0,0 +1,227 @@
+"""Typeahead completions over kit items and knowledge-base entries.
+
+Each kit gets its own prefix trie. Every completion is inserted once per word
+it contains, so "sp" and "burn sp" both reach "2 oz Burn Spray". Each trie node
+keeps its best completions already ranked, so an exact prefix lookup is one
+walk down the trie plus a slice.
+
+Typos are handled by a trigram index over each kit's vocabulary. Query words
+that share enough trigrams with a vocabulary word, and are within one or two
+edits of it, are replaced by that word. The prefix lookup is then repeated,
+and results found that way rank below exact prefix matches.
+"""
+import itertools
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAX_COMPLETIONS = 20
+
+# Spellings tried per mistyped word, and corrected queries looked up in total
+MAX_CORRECTIONS = 8
+MAX_COMBINATIONS = 16
+
+# Completions of the same match quality are ordered items first, then symptoms, then entries
+KIND_ORDER = {"item": 0, "symptom": 1}
+OTHER_KIND = 2
+
+# Knowledge-base sections offered as completions (the prompt's example exchanges are not)
+TYPEAHEAD_SECTIONS = {"emergencies": "emergency", "procedures": "procedure", "protocols": "protocol"}
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_PAD = "  "
+
+
+def normalize(text: str) -> List[str]:
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def trigrams(word: str) -> List[str]:
+    """Start-padded trigrams: "gauze" -> ["  g", " ga", "gau", "auz", "uze"]."""
+    padded = _PAD + word
+    return [padded[i:i + 3] for i in range(len(word))]
+
+
+def allowed_typos(word: str) -> int:
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def edit_distance(a: str, b: str, limit: int, prefix: bool = False) -> int:
+    """Optimal string alignment distance (a transposition counts once), capped at limit + 1.
+
+    With `prefix`, the distance from `a` to the closest prefix of `b`.
+    """
+    if prefix:
+        b = b[:len(a) + limit]
+    elif abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous) if prefix else previous[-1]
+
+
+class _Node:
+    __slots__ = ("children", "ranked")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.ranked: List[Tuple[tuple, int]] = []
+
+
+class _KitIndex:
+    """Trie and vocabulary trigrams for the completions visible in one kit."""
+
+    def __init__(self, completions: Iterable[Tuple[int, List[Tuple[List[str], int]], int]]):
+        self.root = _Node()
+        self.vocabulary = set()
+        self.grams: Dict[str, set] = {}
+        self._corrections: Dict[Tuple[str, bool], List[Tuple[int, str]]] = {}
+        for completion_id, keys, kind in completions:
+            for words, field in keys:
+                for position in range(len(words)):
+                    rank = (field, position > 0, kind, len(words))
+                    self._insert(" ".join(words[position:]), rank, completion_id)
+                self.vocabulary.update(words)
+        for node in self._nodes():
+            best = {}
+            for rank, completion_id in node.ranked:
+                if completion_id not in best or rank < best[completion_id]:
+                    best[completion_id] = rank
+            node.ranked = sorted((rank, completion_id) for completion_id, rank in best.items())[:MAX_COMPLETIONS]
+        for word in self.vocabulary:
+            for gram in trigrams(word):
+                self.grams.setdefault(gram, set()).add(word)
+
+    def _insert(self, key: str, rank: tuple, completion_id: int):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            node.ranked.append((rank, completion_id))
+
+    def _nodes(self):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values())
+
+    def lookup(self, key: str) -> List[Tuple[tuple, int]]:
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.ranked
+
+    def corrections(self, word: str, is_prefix: bool) -> List[Tuple[int, str]]:
+        """Vocabulary words within the allowed edits of `word` (or of their prefix, for the last word)."""
+        cached = self._corrections.get((word, is_prefix))
+        if cached is not None:
+            return cached
+        limit = allowed_typos(word)
+        found = []
+        if limit:
+            counts: Dict[str, int] = {}
+            for gram in trigrams(word):
+                for candidate in self.grams.get(gram, ()):
+                    counts[candidate] = counts.get(candidate, 0) + 1
+            # An edit changes at most three trigrams, a transposition four
+            needed = max(1, len(word) - 4 * limit)
+            for candidate, shared in counts.items():
+                if shared >= needed:
+                    distance = edit_distance(word, candidate, limit, is_prefix)
+                    if 0 < distance <= limit:
+                        found.append((distance, candidate))
+            found = sorted(found)[:MAX_CORRECTIONS]
+        if len(self._corrections) < 10_000:
+            self._corrections[(word, is_prefix)] = found
+        return found
+
+
+class TypeaheadIndex:
+    """Kit-scoped, typo-tolerant completions for kit items, symptoms and knowledge-base entries."""
+
+    def __init__(self, kits: List[Dict], knowledge_base=None):
+        self.completions: List[Dict] = []
+        shared = []
+        if knowledge_base is not None:
+            symptoms: Dict[str, Dict] = {}
+            for section, entry_type in TYPEAHEAD_SECTIONS.items():
+                for name, data in knowledge_base.knowledge_base.get(section, {}).items():
+                    shared.append(self._add({"text": name, "type": entry_type}, [name], OTHER_KIND))
+                    for symptom in data.get("symptoms", []):
+                        key = " ".join(normalize(symptom))
+                        if key not in symptoms:
+                            symptoms[key] = {"text": symptom, "type": "symptom", "related": []}
+                            shared.append(self._add(symptoms[key], [symptom], KIND_ORDER["symptom"]))
+                        symptoms[key]["related"].append(name)
+
+        self.kits: Dict[Optional[str], _KitIndex] = {}
+        everything = list(shared)
+        for kit in kits:
+            items = []
+            for item in kit["contents"]:
+                completion = {"text": item["item"], "type": "item"}
+                completion.update({key: item[key] for key in ("quantity", "description") if key in item})
+                items.append(self._add(completion, [item["item"], item.get("description", "")], KIND_ORDER["item"]))
+            self.kits[kit["id"]] = _KitIndex(items + shared)
+            everything.extend(items)
+        # Unknown or missing kit: every kit's items
+        self.kits[None] = _KitIndex(everything)
+
+    def _add(self, completion: Dict, fields: List[str], kind: int) -> Tuple[int, List[Tuple[List[str], int]], int]:
+        self.completions.append(completion)
+        keys = [(normalize(text), field) for field, text in enumerate(fields) if normalize(text)]
+        return len(self.completions) - 1, keys, kind
+
+    def complete(self, query: str, kit_type: Optional[str] = None, limit: int = 8) -> List[Dict]:
+        """Up to `limit` completions for a partial query, exact prefix matches first."""
+        words = normalize(query)
+        if not words or limit <= 0:
+            return []
+        index = self.kits.get(kit_type) or self.kits[None]
+        limit = min(limit, MAX_COMPLETIONS)
+
+        ranked = [(0,) + rank + (completion_id,) for rank, completion_id in index.lookup(" ".join(words))[:limit]]
+        if not ranked:
+            ranked = self._fuzzy(index, words, limit)
+
+        results, seen = [], set()
+        for entry in sorted(ranked):
+            completion_id = entry[-1]
+            if completion_id not in seen:
+                seen.add(completion_id)
+                results.append(self.completions[completion_id])
+                if len(results) == limit:
+                    break
+        return results
+
+    def _fuzzy(self, index: _KitIndex, words: List[str], limit: int) -> List[tuple]:
+        options = []
+        for position, word in enumerate(words):
+            is_last = position == len(words) - 1
+            known = word in index.vocabulary or (is_last and index.lookup(word))
+            choices = [(0, word)] if known else []
+            choices += index.corrections(word, is_last)
+            if not choices:
+                return []
+            options.append(choices)
+        ranked = []
+        for combination in itertools.islice(itertools.product(*options), MAX_COMBINATIONS):
+            typos = sum(distance for distance, _ in combination)
+            if not typos:
+                continue
+            key = " ".join(word for _, word in combination)
+            ranked.extend((typos,) + rank + (completion_id,) for rank, completion_id in index.lookup(key)[:limit])
+        return ranked
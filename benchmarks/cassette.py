@@ -0,0 +1,334 @@
+"""Record/replay cassettes for the OpenAI and ElevenLabs calls made by api/app.py.
+
+The cassette server sits where the upstreams normally are (via OPENAI_API_BASE
+and ELEVENLABS_API_BASE):
+
+    /openai/...      -> https://api.openai.com/...
+    /elevenlabs/...  -> https://api.elevenlabs.io/...
+
+In record mode it forwards each request upstream and captures the response
+status, headers, time to first byte and every body chunk with its arrival
+offset (streamed completions and audio included). In replay mode it serves the
+recorded responses back with the recorded timing, scaled by --speed
+(0 = as fast as possible).
+
+Cassette format: a gzip stream starting with MAGIC, followed by one record per
+interaction: a 4-byte big-endian header length, the JSON header, then the raw
+body bytes (the concatenation of all recorded chunks).
+
+    python benchmarks/cassette.py record chat.cassette --port 8090
+    python benchmarks/cassette.py replay chat.cassette --port 8090 --speed 4
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+MAGIC = b'SOLSTIS-CASSETTE/1\n'
+
+UPSTREAMS = {
+    'openai': 'https://api.openai.com',
+    'elevenlabs': 'https://api.elevenlabs.io',
+}
+
+# Request headers forwarded upstream; credentials are never written to a cassette
+FORWARD_HEADERS = ('Authorization', 'xi-api-key', 'Content-Type', 'Accept', 'OpenAI-Organization', 'User-Agent')
+RECORDED_HEADERS = ('Content-Type', 'Retry-After')
+
+
+def request_key(method, path, content_type, body):
+    """Stable identity for a request, independent of multipart boundaries and JSON key order."""
+    if content_type and 'application/json' in content_type and body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode('utf-8')
+        except ValueError:
+            pass
+    elif content_type and 'boundary=' in content_type:
+        boundary = content_type.split('boundary=', 1)[1].split(';')[0].strip('"')
+        body = body.replace(boundary.encode('latin-1'), b'BOUNDARY')
+    digest = hashlib.sha256(body or b'').hexdigest()[:32]
+    return f"{method} {path} {digest}"
+
+
+class Interaction:
+    """One recorded request/response pair."""
+
+    def __init__(self, method, path, key, status, headers, ttfb_ms, chunks, body, streamed):
+        self.method = method
+        self.path = path
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.ttfb_ms = ttfb_ms
+        self.chunks = chunks  # [[offset_ms, size], ...]
+        self.body = body
+        self.streamed = streamed
+
+    def header_dict(self):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'key': self.key,
+            'status': self.status,
+            'headers': self.headers,
+            'ttfb_ms': self.ttfb_ms,
+            'chunks': self.chunks,
+            'streamed': self.streamed,
+        }
+
+    def iter_chunks(self):
+        """Yield (offset_ms, bytes) for each recorded chunk."""
+        position = 0
+        for offset_ms, size in self.chunks:
+            yield offset_ms, self.body[position:position + size]
+            position += size
+
+
+class Cassette:
+    """An ordered collection of interactions with key and sequence lookup."""
+
+    def __init__(self, interactions=None):
+        self.interactions = list(interactions or [])
+        self.lock = threading.Lock()
+        self._build_indexes()
+
+    def _build_indexes(self):
+        self.by_key = {}
+        self.by_route = {}
+        for interaction in self.interactions:
+            self.by_key.setdefault(interaction.key, []).append(interaction)
+            self.by_route.setdefault((interaction.method, interaction.path), []).append(interaction)
+        self.key_cursor = {}
+        self.route_cursor = {}
+
+    def rewind(self):
+        with self.lock:
+            self.key_cursor = {}
+            self.route_cursor = {}
+
+    def add(self, interaction):
+        with self.lock:
+            self.interactions.append(interaction)
+            self.by_key.setdefault(interaction.key, []).append(interaction)
+            self.by_route.setdefault((interaction.method, interaction.path), []).append(interaction)
+
+    def find(self, method, path, key):
+        """Exact body match first, then the next recording for the same route.
+
+        Repeated identical requests cycle through their recordings in order,
+        so a replay of the same script is deterministic.
+        """
+        with self.lock:
+            candidates = self.by_key.get(key)
+            cursors, cursor_key = self.key_cursor, key
+            if not candidates:
+                candidates = self.by_route.get((method, path))
+                cursors, cursor_key = self.route_cursor, (method, path)
+            if not candidates:
+                return None
+            index = cursors.get(cursor_key, 0)
+            cursors[cursor_key] = index + 1
+            return candidates[index % len(candidates)]
+
+    def save(self, path):
+        with self.lock:
+            with gzip.open(path, 'wb') as f:
+                f.write(MAGIC)
+                for interaction in self.interactions:
+                    header = json.dumps(interaction.header_dict(), separators=(',', ':')).encode('utf-8')
+                    f.write(struct.pack('>I', len(header)))
+                    f.write(header)
+                    f.write(interaction.body)
+
+    @classmethod
+    def load(cls, path):
+        interactions = []
+        with gzip.open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a Solstis cassette")
+            while True:
+                prefix = f.read(4)
+                if not prefix:
+                    break
+                header = json.loads(f.read(struct.unpack('>I', prefix)[0]))
+                body = f.read(sum(size for _, size in header['chunks']))
+                interactions.append(Interaction(body=body, **header))
+        return cls(interactions)
+
+    def __len__(self):
+        return len(self.interactions)
+
+
+class CassetteHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    cassette = None
+    mode = 'replay'
+    speed = 1.0
+    upstreams = UPSTREAMS
+    http = None
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this, Nagle plus
+        # delayed ACKs add ~40 ms to every keep-alive response.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        key = request_key(method, self.path, self.headers.get('Content-Type'), body)
+        if self.mode == 'record':
+            self._record(method, body, key)
+        else:
+            self._replay(method, key)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _record(self, method, body, key):
+        upstream_name, _, upstream_path = self.path.lstrip('/').partition('/')
+        if upstream_name not in self.upstreams:
+            self.send_error(404, f"Unknown upstream prefix: {upstream_name}")
+            return
+        headers = {name: self.headers[name] for name in FORWARD_HEADERS if self.headers.get(name)}
+
+        start = time.perf_counter()
+        response = self.http.request(method, f"{self.upstreams[upstream_name]}/{upstream_path}",
+                                     headers=headers, data=body, stream=True, timeout=120)
+        ttfb_ms = (time.perf_counter() - start) * 1000
+        streamed = 'content-length' not in response.headers
+        recorded_headers = {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers}
+
+        self.send_response(response.status_code)
+        for name, value in recorded_headers.items():
+            self.send_header(name, value)
+        chunks, parts = [], []
+        if streamed:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for data in response.iter_content(chunk_size=None):
+                chunks.append([round((time.perf_counter() - start) * 1000, 2), len(data)])
+                parts.append(data)
+                self._send_chunk(data)
+            self._send_chunk(b'')
+        else:
+            data = response.content
+            chunks.append([round((time.perf_counter() - start) * 1000, 2), len(data)])
+            parts.append(data)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        self.cassette.add(Interaction(method, self.path, key, response.status_code, recorded_headers,
+                                      round(ttfb_ms, 2), chunks, b''.join(parts), streamed))
+
+    def _replay(self, method, key):
+        interaction = self.cassette.find(method, self.path, key)
+        if interaction is None:
+            body = json.dumps({'error': f'No recording for {method} {self.path}'}).encode('utf-8')
+            self.send_response(404)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        start = time.perf_counter()
+
+        def wait_until(offset_ms):
+            if self.speed > 0:
+                delay = offset_ms / 1000.0 / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+        wait_until(interaction.ttfb_ms)
+        self.send_response(interaction.status)
+        for name, value in interaction.headers.items():
+            self.send_header(name, value)
+        if interaction.streamed:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for offset_ms, data in interaction.iter_chunks():
+                wait_until(offset_ms)
+                self._send_chunk(data)
+            self._send_chunk(b'')
+        else:
+            wait_until(interaction.chunks[-1][0] if interaction.chunks else interaction.ttfb_ms)
+            self.send_header('Content-Length', str(len(interaction.body)))
+            self.end_headers()
+            self.wfile.write(interaction.body)
+
+
+def start_cassette_server(cassette, mode='replay', speed=1.0, host='127.0.0.1', port=0, upstreams=None):
+    """Start a record or replay server on a background thread.
+
+    ``upstreams`` overrides the real service URLs when recording (for example
+    to record against a staging proxy). Returns the server with ``openai_base`` and ``elevenlabs_base`` attributes
+    suitable for OPENAI_API_BASE and ELEVENLABS_API_BASE.
+    """
+    if mode not in ('record', 'replay'):
+        raise ValueError(f"Unknown cassette mode: {mode}")
+    handler = type('ConfiguredCassetteHandler', (CassetteHandler,), {
+        'cassette': cassette,
+        'mode': mode,
+        'speed': speed,
+        'upstreams': dict(UPSTREAMS, **(upstreams or {})),
+        'http': requests.Session() if mode == 'record' else None,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.cassette = cassette
+    base_url = f"http://{host}:{server.server_address[1]}"
+    server.openai_base = f"{base_url}/openai/v1"
+    server.elevenlabs_base = f"{base_url}/elevenlabs"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record or replay upstream API cassettes')
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('path', help='Cassette file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed multiplier (0 = no delays)')
+    parser.add_argument('--upstream', action='append', default=[], metavar='NAME=URL',
+                        help='Override an upstream URL when recording, e.g. openai=http://127.0.0.1:8089')
+    args = parser.parse_args()
+    upstreams = dict(item.split('=', 1) for item in args.upstream)
+
+    cassette = Cassette.load(args.path) if args.mode == 'replay' else Cassette()
+    server = start_cassette_server(cassette, args.mode, args.speed, args.host, args.port, upstreams)
+    print(f"📼 Cassette {args.mode} server on port {args.port}")
+    print(f"   OPENAI_API_BASE={server.openai_base}")
+    print(f"   ELEVENLABS_API_BASE={server.elevenlabs_base}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        if args.mode == 'record':
+            cassette.save(args.path)
+            print(f"\n💾 Saved {len(cassette)} interactions to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Development web app speech: handler latency with voice enabled, spoken in the request vs queued for the browser.
+
+    python benchmarks/dev_web_audio_bench.py
+    python benchmarks/dev_web_audio_bench.py --requests 10 --first-chunk-ms 300 --words-per-second 2.5
+
+Runs /setup, /chat (as the page's auto mode sends it), /clear and /speak_text
+of "development files/solstis_web.py" with Flask's test client, a stand-in
+model and a stand-in ElevenLabs stream that delivers the first chunk after
+--first-chunk-ms and the rest as fast as the reply would be spoken
+(--words-per-second). Two modes:
+
+    in request   the handler synthesizes and plays the reply before returning,
+                 as speak_text() did (first chunk plus the spoken duration)
+    queued       the handler queues the reply on AudioJobQueue and returns;
+                 the browser fetches /audio/<job id>
+
+For each handler it reports p50 and p99 latency. For queued /chat it also
+reports the time from the request to the first and last audio byte served
+by /audio, and the queue's counters after a burst of --burst requests.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+from dev_web_session_bench import load_web_app
+from load_test import percentile
+
+DEV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'development files')
+sys.path.insert(0, DEV_DIR)
+
+from audio_jobs import AudioJobQueue  # noqa: E402
+
+CHUNK_BYTES = 4096
+
+
+def stand_in_synthesis(first_chunk, words_per_second):
+    """Yields ~1 s of audio per chunk, at the pace ElevenLabs would stream it."""
+    def synthesize(text):
+        time.sleep(first_chunk)
+        seconds = max(1, round(len(text.split()) / words_per_second))
+        for index in range(seconds):
+            if index:
+                time.sleep(1 / 4)  # streams well ahead of playback
+            yield b'\xff' * CHUNK_BYTES
+    return synthesize
+
+
+def spoken_in_request(synthesize, words_per_second):
+    """The old speak_text(): synthesize and play the whole reply before the handler returns."""
+    def queue_speech(text, session_id=None):
+        start = time.perf_counter()
+        for _ in synthesize(text):
+            pass
+        remaining = len(text.split()) / words_per_second - (time.perf_counter() - start)
+        time.sleep(max(0.0, remaining))
+        return None
+    return queue_speech
+
+
+def fetch_audio(client, url, start):
+    """(first byte, last byte) seconds after `start`, fetching /audio as the browser does."""
+    first = None
+    response = client.get(url, buffered=False)
+    for _ in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+    last = time.perf_counter() - start
+    response.close()
+    return first, last
+
+
+def run_handlers(web, count):
+    """Handler latencies, and (first byte, last byte) of each queued /chat reply's audio."""
+    client = web.app.test_client()
+    latencies = {name: [] for name in ('/setup', '/chat', '/clear', '/speak_text')}
+    delivery = []
+
+    def timed(name, call):
+        start = time.perf_counter()
+        response = call()
+        latencies[name].append(time.perf_counter() - start)
+        return response, start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in range(count):
+            timed('/setup', lambda: client.post('/setup', data={'user_name': f"bench-{index}", 'kit_type': 'standard'}))
+            response, start = timed('/chat', lambda: client.post(
+                '/chat', data={'user_input': 'I cut my finger.'}, headers={'X-Requested-With': 'XMLHttpRequest'}))
+            if response.get_json().get('audio_url'):
+                delivery.append(fetch_audio(client, response.get_json()['audio_url'], start))
+            timed('/speak_text', lambda: client.post('/speak_text', json={'text': response.get_json()['response']}))
+            timed('/clear', lambda: client.post('/clear'))
+    return latencies, delivery
+
+
+def wait_for_queue(audio_jobs):
+    while True:
+        stats = audio_jobs.snapshot()
+        if stats['completed'] + stats['failed'] + stats['cancelled'] == stats['submitted']:
+            return
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Development web app speech queue benchmark')
+    parser.add_argument('--requests', type=int, default=3, help='Rounds of setup, chat, speak and clear')
+    parser.add_argument('--first-chunk-ms', type=float, default=300, help='Time to the first audio chunk')
+    parser.add_argument('--words-per-second', type=float, default=2.5, help='Speaking rate')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--depth', type=int, default=8, help='Queue depth')
+    parser.add_argument('--burst', type=int, default=30, help='Replies queued at once at the end')
+    args = parser.parse_args()
+
+    web = load_web_app(None)
+    web.VOICE_ENABLED = True
+    synthesize = stand_in_synthesis(args.first_chunk_ms / 1000, args.words_per_second)
+    queue_speech = web.queue_speech
+    print(f"🔊 {args.requests} rounds, first chunk {args.first_chunk_ms:.0f} ms, "
+          f"{args.words_per_second} words/s spoken, {args.workers} workers, depth {args.depth}")
+
+    web.queue_speech = spoken_in_request(synthesize, args.words_per_second)
+    blocking, _ = run_handlers(web, args.requests)
+    web.queue_speech = queue_speech
+    web.audio_jobs = AudioJobQueue(synthesize, workers=args.workers, max_depth=args.depth)
+    queued, delivery = run_handlers(web, args.requests)
+
+    print(f"{'':>12} {'in request p50':>15} {'p99':>8} {'queued p50':>11} {'p99':>8}")
+    for name in blocking:
+        before, after = sorted(blocking[name]), sorted(queued[name])
+        print(f"{name:>12} {percentile(before, 50) * 1000:>15.1f} {percentile(before, 99) * 1000:>8.1f} "
+              f"{percentile(after, 50) * 1000:>11.1f} {percentile(after, 99) * 1000:>8.1f}")
+
+    first, last = sorted(first for first, _ in delivery), sorted(last for _, last in delivery)
+    print(f"Queued /chat audio, from the request: first byte p50 {percentile(first, 50) * 1000:.0f} ms, "
+          f"last byte p50 {percentile(last, 50) * 1000:.0f} ms")
+
+    wait_for_queue(web.audio_jobs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        with web.app.test_request_context():
+            for _ in range(args.burst):
+                web.queue_speech("Press firmly on the cut with gauze from the box lit up in blue.")
+    print(f"After a burst of {args.burst}: {web.audio_jobs.snapshot()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Development web app sessions: cookie and request/response bytes per turn, cookie-held history vs server-side.
+
+    python benchmarks/dev_web_session_bench.py
+    python benchmarks/dev_web_session_bench.py --turns 30 --store-dir /tmp/solstis-sessions
+
+Drives "development files/solstis_web.py" through setup and --turns chat
+turns with Flask's test client, with a stand-in model that answers each turn
+with a canned reply. With server-side sessions the cookie only holds the
+session ID. The cookie-held figures are the signed cookie Flask would have
+sent for the same state with the history (system prompt included) in it, as
+solstis_web.py stored it before. For every few turns it reports:
+
+    cookie B      bytes of the session cookie the browser sends with each request
+    request B     cookie plus the form body of the /chat request
+    response B    Set-Cookie plus the body of the /chat response
+    server us     time to load and save the state (server-side) or sign and serialize the cookie
+
+and flags cookies over 4093 bytes, which browsers drop.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+from mock_upstreams import CANNED_REPLIES
+
+DEV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'development files')
+COOKIE_LIMIT = 4093
+
+USER_TURNS = [
+    "I cut my finger with a kitchen knife. It's bleeding a lot.",
+    "No, just a little shaky.",
+    "Yes.",
+    "Done.",
+    "Found it.",
+    "It's still bleeding.",
+    "Okay, I'm pressing on it now.",
+    "It stopped.",
+]
+
+
+class CannedModel:
+    """Stands in for the OpenAI client's chat.completions.create with canned replies."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+        self.calls = 0
+
+    def create(self, model, messages):
+        self.calls += 1
+        reply = CANNED_REPLIES[self.calls % len(CANNED_REPLIES)]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+
+def load_web_app(store_dir):
+    os.environ.pop('ELEVENLABS_API_KEY', None)
+    if store_dir:
+        os.environ['SESSION_STORE_DIR'] = store_dir
+    sys.path.insert(0, DEV_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import solstis_web
+    solstis_web.client = CannedModel()
+    return solstis_web
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Development web app session size benchmark')
+    parser.add_argument('--turns', type=int, default=24, help='Chat turns after setup')
+    parser.add_argument('--every', type=int, default=4, help='Report every N turns')
+    parser.add_argument('--store-dir', help='Use FileSessionStore in this directory instead of memory')
+    args = parser.parse_args()
+
+    web = load_web_app(args.store_dir)
+    app = web.app
+    serializer = app.session_interface.get_signing_serializer(app)
+    client = app.test_client()
+    kit = web.KITS[0]
+    print(f"🍪 {args.turns} turns with the {kit['name']}, {type(web.session_store).__name__}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        setup = client.post('/setup', data={'user_name': 'Bench', 'kit_type': kit['id']})
+    cookie_header = setup.headers['Set-Cookie'].split(';', 1)[0]
+    cookie = len(cookie_header.encode())
+
+    print(f"{'turn':>5} {'cookie B':>16} {'request B':>16} {'response B':>16} {'server us':>16}")
+    print(f"{'':>5}" + f" {'cookie':>7} {'server':>8}" * 4)
+    over_limit = None
+    for turn in range(1, args.turns + 1):
+        form = {'user_input': USER_TURNS[(turn - 1) % len(USER_TURNS)]}
+        body = len('&'.join(f"{key}={value}" for key, value in form.items()).encode())
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.post('/chat', data=form, headers={'X-Requested-With': 'XMLHttpRequest'})
+        set_cookie = response.headers.get('Set-Cookie')
+        if set_cookie:
+            cookie_header = set_cookie.split(';', 1)[0]
+            cookie = len(cookie_header.encode())
+        server_response = (len(set_cookie.encode()) if set_cookie else 0) + len(response.get_data())
+
+        with app.test_request_context('/chat', method='POST', headers={'Cookie': cookie_header}):
+            start = time.perf_counter()
+            session_id, state = web.load_state()
+            web.save_state(session_id, state)
+            server_us = (time.perf_counter() - start) * 1e6
+
+        # The same state as solstis_web.py kept it in the cookie, system prompt first
+        old_state = {key: value for key, value in state.items() if key != 'history'}
+        old_state['history'] = [{"role": "system", "content": web.get_system_prompt(state['kit_type'])}]
+        old_state['history'] += state['history']
+        start = time.perf_counter()
+        old_value = serializer.dumps(old_state)
+        old_us = (time.perf_counter() - start) * 1e6
+        old_cookie = len(f"{app.config['SESSION_COOKIE_NAME']}={old_value}".encode())
+        old_set_cookie = old_cookie + len('; HttpOnly; Path=/')
+        if over_limit is None and old_cookie > COOKIE_LIMIT:
+            over_limit = turn
+
+        if turn % args.every == 0 or turn == args.turns:
+            print(f"{turn:>5} {old_cookie:>7} {cookie:>8} {old_cookie + body:>7} {cookie + body:>8} "
+                  f"{old_set_cookie + len(response.get_data()):>7} {server_response:>8} "
+                  f"{old_us:>7.0f} {server_us:>8.0f}")
+
+    if over_limit:
+        print(f"Cookie-held history passes the {COOKIE_LIMIT}-byte cookie limit at turn {over_limit}")
+    print(f"Server-side cookie: {cookie} bytes, {len(web.session_store)} session(s) stored")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Cold start of the development web app: import time and time to the first response, lazy vs eager clients.
+
+    python benchmarks/dev_web_startup_bench.py
+    python benchmarks/dev_web_startup_bench.py --runs 10 --top 15
+
+Starts a fresh interpreter for each run, imports "development files/solstis_web.py"
+and renders the chat page with Flask's test client, as a text-only deployment
+(no ELEVENLABS_API_KEY) serves its first request. The eager runs first import
+openai, elevenlabs and speech_recognition and build both clients, as the module
+did at import before they were loaded on first use. For each it reports:
+
+    import ms     interpreter start to `import solstis_web` returning
+    first ms      interpreter start to the first GET / response
+    loaded        which of the heavy modules were imported by then
+
+then the slowest imports of one lazy run under `python -X importtime`.
+Heavy modules that are not installed are skipped by the eager runs and listed.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from load_test import percentile
+
+DEV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'development files')
+HEAVY_MODULES = ('openai', 'elevenlabs', 'speech_recognition')
+
+CHILD = r"""
+import json, os, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'eager':
+    for name in %(heavy)r:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    from lazy_clients import create_elevenlabs_client, create_openai_client
+    for create in (create_openai_client, create_elevenlabs_client):
+        try:
+            create()
+        except Exception:
+            pass
+import solstis_web
+imported = time.perf_counter()
+response = solstis_web.app.test_client().get('/')
+first = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first': first - start, 'status': response.status_code,
+                  'loaded': [name for name in %(heavy)r if name in sys.modules]}))
+""" % {'heavy': HEAVY_MODULES}
+
+
+def child_env():
+    env = dict(os.environ)
+    env.pop('ELEVENLABS_API_KEY', None)
+    env.setdefault('OPENAI_API_KEY', 'bench-key')
+    return env
+
+
+def run(mode):
+    output = subprocess.run([sys.executable, '-c', CHILD, mode], cwd=DEV_DIR, env=child_env(),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    """(cumulative us, module) of the slowest top-level imports under -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import solstis_web'],
+                            cwd=DEV_DIR, env=child_env(), capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only modules imported directly by the script or its own modules, not their submodules
+        if len(name) - len(name.lstrip()) <= 3:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Development web app cold start benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per mode')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports listed')
+    args = parser.parse_args()
+
+    missing = []
+    for name in HEAVY_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            missing.append(name)
+    print(f"🧊 {args.runs} fresh interpreters per mode, text-only (no ELEVENLABS_API_KEY)")
+    if missing:
+        print(f"   not installed, skipped by eager runs: {', '.join(missing)}")
+    print(f"{'':>6} {'import ms':>10} {'first ms':>9}  loaded")
+    for mode in ('eager', 'lazy'):
+        runs = [run(mode) for _ in range(args.runs)]
+        if any(result['status'] != 200 for result in runs):
+            raise RuntimeError(f"GET / failed in {mode} mode: {[result['status'] for result in runs]}")
+        imported = sorted(result['import'] for result in runs)
+        first = sorted(result['first'] for result in runs)
+        print(f"{mode:>6} {percentile(imported, 50) * 1000:>10.1f} {percentile(first, 50) * 1000:>9.1f}  "
+              f"{', '.join(runs[-1]['loaded']) or '-'}")
+
+    print("Slowest imports of solstis_web (lazy, -X importtime):")
+    print(f"{'ms':>8}  module")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"{cumulative / 1000:>8.1f}  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Emergency phrase fast path: matcher speed, recall, false positives and time to the 9-1-1 directive.
+
+    python benchmarks/emergency_phrase_bench.py
+    python benchmarks/emergency_phrase_bench.py --iterations 20000 --chat-latency-ms 800
+
+Scans hand-written emergency messages (one or more per emergency, including
+ones that start with "no") and non-emergency ones (common symptoms, negated emergencies, clarifications and
+every user turn of the built-in eval scenarios) with EmergencyMatcher, a
+substring check of every phrase and one combined regex. Reports microseconds
+per message, recall on the emergencies and the false-positive rate on the rest.
+
+Then posts emergency messages to /api/chat with stream=true against a mock
+upstream and times the first NDJSON line (the directive) and the full reply.
+Exits 1 if an emergency is missed, a non-emergency matches or the directive
+takes more than 10 ms at the median.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from eval_runner import builtin_scenarios
+from load_test import percentile
+from mock_upstreams import MockConfig, start_mock_server
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from emergency_phrases import EMERGENCIES, EmergencyMatcher, words  # noqa: E402
+
+EMERGENCY_MESSAGES = [
+    ("not_breathing", "My dad collapsed and he's not breathing"),
+    ("not_breathing", "her lips are blue and I can't feel anything"),
+    ("not_breathing", "no he stopped breathing"),
+    ("not_breathing", "no she's not breathing"),
+    ("unconscious", "He fell off the ladder and he's unconscious"),
+    ("unconscious", "she won't wake up, what do I do"),
+    ("unconscious", "My friend got knocked out playing football"),
+    ("difficulty_breathing", "I can't breathe properly after the bee sting"),
+    ("difficulty_breathing", "my son is choking on food"),
+    ("severe_allergic_reaction", "I think she's having a severe allergic reaction to peanuts"),
+    ("severe_allergic_reaction", "his tongue is swelling up after eating shrimp"),
+    ("severed_body_part", "I cut off my finger with a saw"),
+    ("severed_body_part", "My thumb got sliced off in the door"),
+    ("severed_body_part", "he chopped his toe off with an axe"),
+    ("uncontrolled_bleeding", "I cut my arm and it won't stop bleeding"),
+    ("uncontrolled_bleeding", "There is blood spurting from his leg"),
+    ("uncontrolled_bleeding", "I've pressed for 10 minutes and the bleeding won't stop"),
+    ("chest_pain", "My mom has crushing chest pain"),
+    ("chest_pain", "I think he's having a heart attack"),
+]
+
+SAFE_MESSAGES = [
+    "I cut my finger while cooking",
+    "I have a small burn on my hand",
+    "My ankle is swollen after I twisted it",
+    "I feel a bit dizzy and lightheaded",
+    "I got stung by a bee, no swelling in my throat",
+    "He's not unconscious, just a little groggy",
+    "he isn't unconscious, he's talking to me",
+    "No chest pain, just a headache",
+    "I cut off the tag on the bandage package",
+    "The bandage came off in the shower",
+    "I'm choking on my words, sorry, I'm nervous",
+    "It stopped bleeding after I pressed on it",
+    "Is the bleeding supposed to stop by itself?",
+    "I don't have difficulty breathing, it just itches",
+    "My finger is bleeding a little",
+    "I have a splinter in my thumb",
+    "I have period cramps",
+    "I fainted earlier but feel fine now",
+]
+
+
+def naive_scan(phrases, text):
+    """Every phrase checked as a substring of the normalized message."""
+    normalized = f" {' '.join(words(text))} "
+    return [name for name, phrase in phrases if f" {phrase} " in normalized]
+
+
+def time_per_message(function, messages, iterations):
+    start = time.perf_counter()
+    for index in range(iterations):
+        function(messages[index % len(messages)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def load_app(upstream):
+    os.environ['OPENAI_API_BASE'] = f"{upstream.base_url}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench-key'
+    os.environ.pop('CONVERSATION_JOURNAL_DIR', None)
+    import openai
+    openai.api_base = f"{upstream.base_url}/v1"
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    return app
+
+
+def time_directive(app_module, messages):
+    """(first line seconds, full reply seconds) per streamed /api/chat request."""
+    client = app_module.app.test_client()
+    first, full = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index, (expected, text) in enumerate(messages):
+            start = time.perf_counter()
+            response = client.post('/api/chat', json={'user_input': text, 'user_name': f"bench-{index}",
+                                                      'kit_type': 'standard', 'stream': True}, buffered=False)
+            lines = response.response
+            event = json.loads(next(lines))
+            first.append(time.perf_counter() - start)
+            for _ in lines:
+                pass
+            full.append(time.perf_counter() - start)
+            response.close()
+            if event.get('emergency') != expected:
+                raise AssertionError(f"{text!r}: first event {event}")
+    return sorted(first), sorted(full)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emergency phrase fast path benchmark')
+    parser.add_argument('--iterations', type=int, default=20000, help='Messages scanned per method')
+    parser.add_argument('--chat-latency-ms', type=int, default=800, help='Mock model latency')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    matcher = EmergencyMatcher()
+    build_ms = (time.perf_counter() - start) * 1000
+    phrases = [(name, ' '.join(words(phrase))) for name, (variants, _) in EMERGENCIES.items() for phrase in variants]
+    combined = re.compile(r"\b(?:%s)\b" % '|'.join(re.escape(phrase) for _, phrase in
+                                                   sorted(phrases, key=lambda p: -len(p[1]))))
+
+    upstream = start_mock_server(MockConfig(latency={'chat': f"fixed:{args.chat_latency_ms}"}))
+    app_module = load_app(upstream)
+    scenario_turns = [turn for scenario in builtin_scenarios(app_module) for turn in scenario['turns']]
+    # Scenario turns that describe a true emergency are not false positives
+    safe = SAFE_MESSAGES + [turn for turn in scenario_turns if not matcher.match(turn)]
+    flagged_turns = [turn for turn in scenario_turns if matcher.match(turn)]
+    print(f"🚨 {len(matcher)} phrases for {len(EMERGENCIES)} emergencies, "
+          f"{len(matcher._goto)} automaton states, built in {build_ms:.1f} ms")
+
+    sample = [text for _, text in EMERGENCY_MESSAGES] + safe
+    print(f"{'':>16} {'us/message':>11}")
+    print(f"{'Aho-Corasick':>16} {time_per_message(matcher.match, sample, args.iterations):>11.1f}")
+    naive = time_per_message(lambda text: naive_scan(phrases, text), sample, args.iterations // 10)
+    print(f"{'substring scan':>16} {naive:>11.1f}")
+    print(f"{'combined regex':>16} "
+          f"{time_per_message(lambda text: combined.search(' '.join(words(text))), sample, args.iterations):>11.1f}")
+
+    missed = [(expected, text) for expected, text in EMERGENCY_MESSAGES
+              if (matcher.match(text) or (None,))[0] != expected]
+    false_positives = [text for text in SAFE_MESSAGES if matcher.match(text)]
+    print(f"Recall: {len(EMERGENCY_MESSAGES) - len(missed)}/{len(EMERGENCY_MESSAGES)} emergencies; "
+          f"false positives: {len(false_positives)}/{len(safe)} non-emergency messages")
+    for expected, text in missed:
+        print(f"   missed {expected}: {text!r}")
+    for text in false_positives:
+        print(f"   false positive: {text!r} -> {matcher.match(text).emergency}")
+    for text in flagged_turns:
+        print(f"   scenario turn flagged: {text!r} -> {matcher.match(text).emergency}")
+
+    time_directive(app_module, EMERGENCY_MESSAGES[:2])  # warm up
+    first, full = time_directive(app_module, EMERGENCY_MESSAGES)
+    upstream.shutdown()
+    print(f"Streamed /api/chat ({args.chat_latency_ms} ms model latency):")
+    print(f"{'':>16} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'9-1-1 directive':>16} {percentile(first, 50) * 1000:>8.1f} {percentile(first, 99) * 1000:>8.1f}")
+    print(f"{'full reply':>16} {percentile(full, 50) * 1000:>8.1f} {percentile(full, 99) * 1000:>8.1f}")
+    return 1 if missed or false_positives or percentile(first, 50) > 0.010 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""Replay scripted scenarios through the chat pipeline and report latency, tokens and rule checks.
+
+    python benchmarks/eval_runner.py --mock --concurrency 16 --repeat 5
+    python benchmarks/eval_runner.py --model gpt-4o-mini,gpt-4.1-nano --history-mode full,state --json report.json
+    python benchmarks/eval_runner.py --mock --prompt-mode full,retrieval
+    python benchmarks/eval_runner.py --scenarios training_data.jsonl --base-url http://127.0.0.1:8089/v1
+
+Each scenario is a list of user turns replayed in order. Prompts are built with
+the API's own build_chat_messages(), so prompt, prompt-mode and history-mode changes in
+api/app.py are what gets measured. Scenarios run concurrently (bounded by
+--concurrency), turns within a scenario run in sequence, and every model call
+is streamed to time the first token.
+
+Built-in scenarios are the USER/SOLSTIS examples from the system prompt (whose
+reference replies set the expected escalation) and the load-test sessions.
+--scenarios accepts JSONL with either {"name", "kit_type", "turns",
+"expect_escalation"} objects or training examples ({"messages": [...]}, as
+written by prepare_training_data.py).
+
+Requires aiohttp (pip install aiohttp).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from load_test import SCENARIOS, percentile
+from mock_upstreams import add_mock_arguments, config_from_args, start_mock_server
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from message_store import MessageLog  # noqa: E402
+from token_usage import BUDGET_LADDER  # noqa: E402
+from treatment_state import ESCALATION_LEVELS, TreatmentState, instructed_treatments  # noqa: E402
+
+# USD per million (prompt, completion) tokens; list prices, override with --price
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4': (30.00, 60.00),
+}
+
+# chat() sends the last 10 messages and at most 500 completion tokens when no budget is set
+HISTORY_LIMIT, MAX_TOKENS = BUDGET_LADDER[0][1], BUDGET_LADDER[0][2]
+
+# A new example conversation in the system prompt starts with the injury statement
+EXAMPLE_START = re.compile(r"^I (cut|have|got)\b")
+OPENING_MESSAGE = re.compile(r"if this is life-threatening", re.IGNORECASE)
+INCHES = re.compile(r'\d+\s*(?:"|inch)')
+
+
+def load_app():
+    os.environ.pop('CONVERSATION_JOURNAL_DIR', None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    return app
+
+
+def example_scenarios(app_module):
+    """Split the prompt's USER/SOLSTIS examples into conversations with reference replies."""
+    examples = app_module.get_system_prompt('standard').split('Examples:')[1]
+    scenarios = []
+    for user_text, reference in re.findall(r'USER: (.*)\nSOLSTIS: (.*)', examples):
+        if user_text.startswith('['):
+            continue  # image uploads go through /api/analyze-image, not chat
+        if EXAMPLE_START.match(user_text) or not scenarios:
+            scenarios.append({'name': f"example-{len(scenarios) + 1}", 'kit_type': 'standard',
+                              'turns': [], 'references': []})
+        scenarios[-1]['turns'].append(user_text)
+        scenarios[-1]['references'].append(reference)
+    for scenario in scenarios:
+        expected = TreatmentState()
+        for reference in scenario['references']:
+            expected.observe_assistant(reference)
+        scenario['expect_escalation'] = expected.escalation
+    return scenarios
+
+
+def builtin_scenarios(app_module):
+    scenarios = example_scenarios(app_module)
+    for index, turns in enumerate(SCENARIOS):
+        scenarios.append({'name': f"session-{index + 1}", 'kit_type': 'standard', 'turns': list(turns)})
+    return scenarios
+
+
+def load_scenarios(path):
+    """Read scenarios from JSONL, accepting scenario objects or training examples."""
+    scenarios = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'messages' in record:
+                record = {
+                    'turns': [m['content'] for m in record['messages'] if m['role'] == 'user'],
+                    'references': [m['content'] for m in record['messages'] if m['role'] == 'assistant'],
+                }
+            record.setdefault('name', f"{os.path.basename(path)}:{line_number}")
+            record.setdefault('kit_type', 'standard')
+            scenarios.append(record)
+    return scenarios
+
+
+def check_reply(reply, turn_index, failed_before):
+    """Per-reply checks of the style and safety rules in the system prompt."""
+    sentences = [s for s in re.split(r'(?<=[.!?])\s+', reply.strip()) if s]
+    return {
+        'concise': len(sentences) <= 3 and len(reply.split()) <= 70,
+        'one_question': reply.count('?') <= 1,
+        'no_repeated_opening': turn_index == 0 or not OPENING_MESSAGE.search(reply),
+        'no_inches': not INCHES.search(reply),
+        'no_failed_repeat': not (set(instructed_treatments(reply)) & failed_before),
+    }
+
+
+async def stream_completion(http, base_url, api_key, model, messages):
+    """POST a streamed chat completion; return (reply, ttft s, total s, usage or None)."""
+    payload = {
+        'model': model,
+        'messages': messages,
+        'max_tokens': MAX_TOKENS,
+        'temperature': 0.7,
+        'stream': True,
+        'stream_options': {'include_usage': True},
+    }
+    start = time.perf_counter()
+    first_token = None
+    parts = []
+    usage = None
+    async with http.post(f"{base_url}/chat/completions", json=payload,
+                         headers={'Authorization': f"Bearer {api_key}"}) as response:
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {(await response.text())[:200]}")
+        async for raw in response.content:
+            line = raw.strip()
+            if not line.startswith(b'data:'):
+                continue
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                break
+            chunk = json.loads(data)
+            if chunk.get('usage'):
+                usage = chunk['usage']
+            for choice in chunk.get('choices', []):
+                content = choice.get('delta', {}).get('content')
+                if content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    parts.append(content)
+    total = time.perf_counter() - start
+    return ''.join(parts), first_token if first_token is not None else total, total, usage
+
+
+async def run_scenario(app_module, http, options, model, scenario, repeat):
+    kit = next((k for k in app_module.KITS if k['id'] == scenario['kit_type']), None)
+    conversation = {'kit_type': scenario['kit_type'], 'messages': MessageLog(), 'treatment': TreatmentState()}
+    result = {'name': scenario['name'], 'repeat': repeat, 'turns': [], 'error': None}
+    for index, user_text in enumerate(scenario['turns']):
+        conversation['messages'].append('user', user_text)
+        conversation['treatment'].observe_user(user_text)
+        failed_before = {name for name, status in conversation['treatment'].treatments.items()
+                         if status == 'failed'}
+        messages = app_module.build_chat_messages(conversation, HISTORY_LIMIT)
+        try:
+            reply, ttft, total, usage = await stream_completion(
+                http, options.base_url, options.api_key, model, messages)
+        except Exception as e:
+            result['error'] = f"turn {index + 1}: {e}"
+            break
+        if usage is None:
+            # Backend did not report usage; estimate like the stand-in does
+            usage = {'prompt_tokens': len(json.dumps(messages)) // 4, 'completion_tokens': len(reply) // 4}
+        result['turns'].append({
+            'user': user_text,
+            'reply': reply,
+            'ttft_ms': round(ttft * 1000, 1),
+            'latency_ms': round(total * 1000, 1),
+            'prompt_tokens': usage.get('prompt_tokens', 0),
+            'completion_tokens': usage.get('completion_tokens', 0),
+            'checks': check_reply(reply, index, failed_before),
+        })
+        conversation['messages'].append('assistant', reply)
+        conversation['treatment'].observe_assistant(reply, kit)
+
+    turns = result['turns']
+    result['ttft_ms'] = round(statistics.mean(t['ttft_ms'] for t in turns), 1) if turns else None
+    result['latency_ms'] = round(sum(t['latency_ms'] for t in turns), 1)
+    result['prompt_tokens'] = sum(t['prompt_tokens'] for t in turns)
+    result['completion_tokens'] = sum(t['completion_tokens'] for t in turns)
+    checks = {name: all(t['checks'][name] for t in turns) for name in (turns[0]['checks'] if turns else {})}
+    expected = scenario.get('expect_escalation')
+    if expected and not result['error']:
+        reached = conversation['treatment'].escalation
+        # Reaching 9-1-1 must match the reference; lesser escalation levels are a judgement call
+        checks['escalation'] = (expected == 'emergency') == (reached == 'emergency')
+        result['escalation'] = {'expected': expected, 'reached': reached}
+    result['checks'] = checks
+    return result
+
+
+async def run_configuration(app_module, options, model, history_mode, prompt_mode, scenarios):
+    import aiohttp
+
+    app_module.PROMPT_HISTORY_MODE = history_mode
+    app_module.PROMPT_MODE = prompt_mode
+    semaphore = asyncio.Semaphore(options.concurrency)
+    connector = aiohttp.TCPConnector(limit=options.concurrency)
+    timeout = aiohttp.ClientTimeout(total=options.timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+        async def bounded(scenario, repeat):
+            async with semaphore:
+                return await run_scenario(app_module, http, options, model, scenario, repeat)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(bounded(scenario, repeat)
+                                         for repeat in range(options.repeat) for scenario in scenarios))
+        wall = time.perf_counter() - start
+    return summarize(model, history_mode, prompt_mode, options, results, wall)
+
+
+def summarize(model, history_mode, prompt_mode, options, results, wall):
+    turns = [turn for result in results for turn in result['turns']]
+    ttfts = sorted(t['ttft_ms'] for t in turns)
+    latencies = sorted(t['latency_ms'] for t in turns)
+    prompt_tokens = sum(t['prompt_tokens'] for t in turns)
+    completion_tokens = sum(t['completion_tokens'] for t in turns)
+    prompt_price, completion_price = options.prices.get(model, (None, None))
+    cost = None
+    if prompt_price is not None:
+        cost = round((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6, 6)
+
+    rule_totals = {}
+    for result in results:
+        for name, passed in result['checks'].items():
+            rule_totals.setdefault(name, []).append(passed)
+
+    def distribution(values):
+        if not values:
+            return None
+        return {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'p99': percentile(values, 99),
+                'mean': round(statistics.mean(values), 1)}
+
+    return {
+        'model': model,
+        'history_mode': history_mode,
+        'prompt_mode': prompt_mode,
+        'concurrency': options.concurrency,
+        'scenarios_run': len(results),
+        'turns': len(turns),
+        'errors': sum(1 for result in results if result['error']),
+        'wall_s': round(wall, 3),
+        'turns_per_s': round(len(turns) / wall, 2) if wall else None,
+        'ttft_ms': distribution(ttfts),
+        'latency_ms': distribution(latencies),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'tokens_per_turn': round((prompt_tokens + completion_tokens) / len(turns), 1) if turns else None,
+        'cost_usd': cost,
+        'rule_pass_rate': {name: round(sum(values) / len(values), 3) for name, values in rule_totals.items()},
+        'results': results,
+    }
+
+
+def print_summary(configurations):
+    print(f"{'model':>14} {'history':>8} {'prompt':>9} {'turns':>6} {'err':>4} {'turns/s':>8} {'ttft p50':>9} "
+          f"{'ttft p95':>9} {'lat p95':>8} {'tok/turn':>9} {'cost $':>9} {'rules':>6}")
+    for c in configurations:
+        rates = c['rule_pass_rate'].values()
+        rules = f"{statistics.mean(rates):.0%}" if rates else '-'
+        cost = f"{c['cost_usd']:.4f}" if c['cost_usd'] is not None else '-'
+        ttft = c['ttft_ms'] or {'p50': 0, 'p95': 0}
+        latency = c['latency_ms'] or {'p95': 0}
+        print(f"{c['model']:>14} {c['history_mode']:>8} {c['prompt_mode']:>9} {c['turns']:>6} {c['errors']:>4} "
+              f"{c['turns_per_s'] or 0:>8.1f} {ttft['p50']:>9.0f} {ttft['p95']:>9.0f} "
+              f"{latency['p95']:>8.0f} {c['tokens_per_turn'] or 0:>9.0f} {cost:>9} {rules:>6}")
+    for c in configurations:
+        failing = {name: rate for name, rate in c['rule_pass_rate'].items() if rate < 1}
+        if failing:
+            print(f"   {c['model']}/{c['history_mode']}/{c['prompt_mode']} rules below 100%: "
+                  + ', '.join(f"{name} {rate:.0%}" for name, rate in failing.items()))
+
+
+def parse_prices(values):
+    prices = dict(MODEL_PRICES)
+    for value in values or []:
+        model, _, rates = value.partition('=')
+        prompt_price, completion_price = (float(x) for x in rates.split(','))
+        prices[model] = (prompt_price, completion_price)
+    return prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent scenario evaluation of the chat pipeline')
+    parser.add_argument('--model', default='gpt-4o-mini', help='Comma-separated models to compare')
+    parser.add_argument('--history-mode', default='full', help='Comma-separated PROMPT_HISTORY_MODE values')
+    parser.add_argument('--prompt-mode', default='full', help='Comma-separated PROMPT_MODE values')
+    parser.add_argument('--scenarios', help='JSONL scenario or training-example file (default: built-in)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Scenarios in flight at once')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of each scenario')
+    parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds')
+    parser.add_argument('--base-url', default=os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1'),
+                        help='OpenAI-compatible API base')
+    parser.add_argument('--api-key', default=os.getenv('OPENAI_API_KEY', ''))
+    parser.add_argument('--price', action='append', metavar='MODEL=IN,OUT',
+                        help='USD per million prompt,completion tokens')
+    parser.add_argument('--mock', action='store_true', help='Run against a local stand-in upstream')
+    parser.add_argument('--json', dest='json_path', help='Write the full report to this file')
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    args.prices = parse_prices(args.price)
+
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        sys.exit('eval_runner.py requires aiohttp: pip install aiohttp')
+
+    mock = None
+    if args.mock:
+        mock = start_mock_server(config_from_args(args))
+        args.base_url = f"{mock.base_url}/v1"
+        args.api_key = args.api_key or 'bench-key'
+    args.base_url = args.base_url.rstrip('/')
+
+    app_module = load_app()
+    scenarios = load_scenarios(args.scenarios) if args.scenarios else builtin_scenarios(app_module)
+    print(f"🧪 {len(scenarios)} scenarios x {args.repeat} against {args.base_url} "
+          f"(concurrency {args.concurrency})")
+
+    configurations = []
+    for model in args.model.split(','):
+        for history_mode in args.history_mode.split(','):
+            for prompt_mode in args.prompt_mode.split(','):
+                configurations.append(asyncio.run(
+                    run_configuration(app_module, args, model, history_mode, prompt_mode, scenarios)))
+    if mock:
+        mock.shutdown()
+
+    print_summary(configurations)
+    if args.json_path:
+        report = {
+            'generated_at': datetime.now().isoformat(),
+            'backend': args.base_url,
+            'scenario_count': len(scenarios),
+            'repeat': args.repeat,
+            'configurations': configurations,
+        }
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark the conversation journal: /api/chat overhead and restart recovery time.
+
+    python benchmarks/journal_bench.py
+    python benchmarks/journal_bench.py --turns 2000 --active 100,1000,5000 --history 50000,200000
+
+Part 1 drives /api/chat in-process against zero-latency stand-in upstreams with
+the journal off and on, so the difference is the journaling cost per request.
+
+Part 2 writes a long history of sessions that have since expired plus a set of
+active sessions, then times recovery. Recovery should track the number of
+active sessions and stay flat as expired history grows.
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from load_test import percentile
+from mock_upstreams import MockConfig, start_mock_server
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from conversation_journal import ConversationJournal  # noqa: E402
+
+
+def load_app(upstream):
+    os.environ['OPENAI_API_BASE'] = f"{upstream.base_url}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench-key'
+    os.environ.pop('CONVERSATION_JOURNAL_DIR', None)
+    import openai
+    openai.api_base = f"{upstream.base_url}/v1"
+    import app
+    return app
+
+
+def time_chat(app_module, turns):
+    client = app_module.app.test_client()
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(turns):
+            user_name = f"bench-{i % 50}"
+            start = time.perf_counter()
+            client.post('/api/chat', json={'user_input': 'Done.', 'user_name': user_name, 'kit_type': 'standard'})
+            latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def bench_hot_path(turns):
+    upstream = start_mock_server(MockConfig())
+    app_module = load_app(upstream)
+
+    time_chat(app_module, 50)  # warm up imports and connections
+    baseline = time_chat(app_module, turns)
+
+    directory = tempfile.mkdtemp(prefix='solstis-journal-')
+    journal = ConversationJournal(directory)
+    app_module.conversations.clear()
+    app_module.conversations.update(journal.recover())
+    journal.state_provider = lambda: app_module.conversations
+    app_module.journal = journal
+    journaled = time_chat(app_module, turns)
+
+    event_start = time.perf_counter()
+    conversation = {'kit_type': 'standard', 'messages': [{'role': 'user', 'content': 'Done.', 'timestamp': ''}]}
+    for _ in range(turns):
+        journal.record_message('micro', conversation)
+    per_event_us = (time.perf_counter() - event_start) / turns * 1e6
+
+    journal.close()
+    app_module.journal = None
+    upstream.shutdown()
+    shutil.rmtree(directory)
+
+    print(f"🔥 /api/chat over {turns} turns (zero-latency upstream)")
+    print(f"{'':>12} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, values in (('no journal', baseline), ('journal', journaled)):
+        print(f"{label:>12} {statistics.mean(values) * 1000:>8.3f} {percentile(values, 50) * 1000:>8.3f} "
+              f"{percentile(values, 99) * 1000:>8.3f}")
+    overhead = statistics.mean(journaled) - statistics.mean(baseline)
+    print(f"   overhead per request: {overhead * 1e6:.0f} µs; record_message alone: {per_event_us:.1f} µs")
+
+
+def build_history(directory, active_sessions, expired_events, turns_per_session=6):
+    now = time.time()
+    clock = {'now': now - 3 * 24 * 3600}
+    journal = ConversationJournal(directory, flush_interval=0.05, clock=lambda: clock['now'])
+    conversations = journal.recover()
+    journal.state_provider = lambda: conversations
+
+    def converse(session_id, turns):
+        conversations[session_id] = {'kit_type': 'standard', 'messages': []}
+        journal.record_setup(session_id, 'standard')
+        for turn in range(turns):
+            conversations[session_id]['messages'].append(
+                {'role': 'user' if turn % 2 == 0 else 'assistant', 'content': 'Press gently for 5 minutes.',
+                 'timestamp': '2026-01-01T00:00:00'})
+            journal.record_message(session_id, conversations[session_id])
+
+    # Old traffic from sessions that have since gone idle past the TTL
+    for index in range(expired_events // (turns_per_session + 1)):
+        converse(f"expired-{index}", turns_per_session)
+    clock['now'] = now
+    for index in range(active_sessions):
+        converse(f"active-{index}", turns_per_session)
+    # The periodic compaction that would run in production drops the expired sessions
+    journal.compact()
+    journal.close()
+
+
+def bench_recovery(active_levels, history_levels):
+    print(f"\n♻️  Recovery time")
+    print(f"{'active':>8} {'expired events':>15} {'restored':>9} {'recover ms':>11}")
+    for expired_events in history_levels:
+        for active in active_levels:
+            directory = tempfile.mkdtemp(prefix='solstis-journal-')
+            build_history(directory, active, expired_events)
+            start = time.perf_counter()
+            journal = ConversationJournal(directory)
+            restored = journal.recover()
+            elapsed = time.perf_counter() - start
+            journal.close()
+            shutil.rmtree(directory)
+            print(f"{active:>8} {expired_events:>15} {len(restored):>9} {elapsed * 1000:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Conversation journal benchmark')
+    parser.add_argument('--turns', type=int, default=1000)
+    parser.add_argument('--active', default='100,1000,5000', help='Active session counts')
+    parser.add_argument('--history', default='20000,100000', help='Expired history sizes in events')
+    args = parser.parse_args()
+
+    bench_hot_path(args.turns)
+    bench_recovery([int(x) for x in args.active.split(',')], [int(x) for x in args.history.split(',')])
+
+
+if __name__ == "__main__":
+    main()
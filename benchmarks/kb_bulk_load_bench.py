@@ -0,0 +1,103 @@
+"""Bulk-load time for FirstAidKnowledgeBase: whole-file rewrite per insert vs journal.
+
+    python benchmarks/kb_bulk_load_bench.py
+    python benchmarks/kb_bulk_load_bench.py --sizes 1000,4000,16000 --legacy-max 2000
+
+Three write paths load N generated protocols into a fresh knowledge base:
+
+    rewrite       the previous behaviour: json.dump(indent=2) of the whole file per insert
+    journal       one fsynced journal append per insert, with periodic atomic snapshots
+    transaction   all inserts inside kb.transaction(): one journal write
+
+Time per entry stays flat for a transaction. The journal path publishes a
+new version per insert, whose copies share all but O(sqrt(N)) of their
+buckets with the previous version (see api/kb_shared.py), so its time per
+entry grows only slowly, while the rewrite path grows with N (quadratic
+total). Each run ends by reloading the files and checking every entry came
+back.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from knowledge_base import FirstAidKnowledgeBase  # noqa: E402
+
+
+class RewriteKnowledgeBase(FirstAidKnowledgeBase):
+    """The pre-journal write path, kept here for comparison."""
+
+    def _put(self, section, name, data):
+        self.knowledge_base[section][name] = data
+        with open(self.data_file, 'w') as f:
+            json.dump({section: dict(entries.items()) for section, entries in self.knowledge_base.items()}, f,
+                      indent=2)
+
+
+def protocol(index):
+    return {
+        'name': f"protocol {index}",
+        'steps': [f"Step {step} of protocol {index}: apply gauze and press firmly" for step in range(5)],
+        'symptoms': ['bleeding', 'pain', f"symptom {index % 97}"],
+        'equipment': ['gauze', 'gloves', f"item {index % 31}"],
+    }
+
+
+def load(kb, count, use_transaction):
+    def add_all():
+        for index in range(count):
+            entry = protocol(index)
+            if index % 2:
+                kb.add_procedure(entry['name'], entry['steps'], entry['equipment'])
+            else:
+                kb.add_emergency(entry['name'], entry['steps'], entry['symptoms'], entry['equipment'])
+
+    if use_transaction:
+        with kb.transaction():
+            add_all()
+    else:
+        add_all()
+
+
+def run(mode, count):
+    directory = tempfile.mkdtemp(prefix='solstis-kb-')
+    data_file = os.path.join(directory, 'first_aid_data.json')
+    kb_class = RewriteKnowledgeBase if mode == 'rewrite' else FirstAidKnowledgeBase
+    kb = kb_class(data_file)
+    start = time.perf_counter()
+    load(kb, count, mode == 'transaction')
+    elapsed = time.perf_counter() - start
+
+    reloaded = FirstAidKnowledgeBase(data_file)
+    restored = len(reloaded.knowledge_base['emergencies']) + len(reloaded.knowledge_base['procedures'])
+    shutil.rmtree(directory)
+    if restored != count:
+        raise SystemExit(f"{mode}: reloaded {restored} of {count} entries")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Knowledge base bulk-load benchmark')
+    parser.add_argument('--sizes', default='500,1000,2000,4000,8000', help='Entry counts to load')
+    parser.add_argument('--legacy-max', type=int, default=2000,
+                        help='Largest size to run the quadratic rewrite path at')
+    args = parser.parse_args()
+
+    print(f"📚 Bulk load into FirstAidKnowledgeBase")
+    print(f"{'entries':>8} {'mode':>12} {'total s':>9} {'µs/entry':>9}")
+    for count in (int(x) for x in args.sizes.split(',')):
+        for mode in ('rewrite', 'journal', 'transaction'):
+            if mode == 'rewrite' and count > args.legacy_max:
+                continue
+            elapsed = run(mode, count)
+            print(f"{count:>8} {mode:>12} {elapsed:>9.3f} {elapsed / count * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
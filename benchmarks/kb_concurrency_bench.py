@@ -0,0 +1,142 @@
+"""Read throughput of a shared FirstAidKnowledgeBase with and without a concurrent writer.
+
+    python benchmarks/kb_concurrency_bench.py
+    python benchmarks/kb_concurrency_bench.py --entries 50000 --readers 8 --writes-per-second 50
+
+Loads a synthetic knowledge base (as kb_search_bench.py does) and runs
+--readers threads that each search it and look up the entries found, as
+threaded gunicorn workers sharing one instance would. It runs once with
+readers only and once with a writer thread adding and replacing entries at
+--writes-per-second and compacting the journal into a fresh snapshot every
+--compact-every writes. It reports reads per second and read latency for
+both. Readers never wait for the writer or for a compaction, so with the GIL
+the only read throughput lost should be the CPU share the writer itself uses
+(reported per run), and the slowest read should stay far below the time a
+compaction takes.
+
+Readers check every result against the version they searched: a result whose
+entry is missing or belongs to another name would be a torn read. After the
+run, every version the writer published except the current one must have been
+freed.
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+from kb_search_bench import TopicalWords, build
+from load_test import percentile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from knowledge_base import FirstAidKnowledgeBase  # noqa: E402
+
+
+def reader(kb, queries, stop, results):
+    latencies, torn = [], 0
+    position = 0
+    while not stop.is_set():
+        query = queries[position % len(queries)]
+        position += 1
+        start = time.perf_counter()
+        for hit in kb.search_knowledge_base(query, 5):
+            if hit['type'] != 'emergency':
+                continue
+            # Emergencies are only added or replaced, and every version's first step names the entry
+            if not hit['data']['steps'][0].startswith(hit['name'] + ':') or kb.get_emergency_info(hit['name']) is None:
+                torn += 1
+        latencies.append(time.perf_counter() - start)
+    results.append((latencies, torn))
+
+
+def writer(kb, rng, interval, compact_every, stop, published, cpu):
+    start = time.thread_time()
+    words = TopicalWords(rng)
+    names = list(kb.knowledge_base['emergencies'])
+    count = 0
+    while not stop.is_set():
+        topic = words.topic()
+        # Half the writes replace an existing entry, half add one
+        name = rng.choice(names) if count % 2 else f"{' '.join(words.take(topic, 3, shared=0))} new {count}"
+        steps = [f"{name}: " + ' '.join(words.take(topic, 8))] + [' '.join(words.take(topic, 8)) for _ in range(3)]
+        kb.add_emergency(name, steps, words.take(topic, 3, shared=0), words.take(topic, 3))
+        published.append(weakref.ref(kb.current))
+        count += 1
+        if count % compact_every == 0:
+            kb.compact()
+        stop.wait(interval)
+    cpu.append(time.thread_time() - start)
+
+
+def run(kb, queries, readers, duration, writes_per_second, compact_every, rng):
+    stop = threading.Event()
+    results, published, cpu = [], [], []
+    threads = [threading.Thread(target=reader, args=(kb, queries, stop, results)) for _ in range(readers)]
+    if writes_per_second:
+        threads.append(threading.Thread(target=writer, args=(kb, rng, 1 / writes_per_second, compact_every, stop,
+                                                                 published, cpu)))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies = sorted(latency for thread_latencies, _ in results for latency in thread_latencies)
+    return latencies, sum(torn for _, torn in results), published, sum(cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Knowledge base concurrent read/write benchmark')
+    parser.add_argument('--entries', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+    parser.add_argument('--writes-per-second', type=float, default=20)
+    parser.add_argument('--compact-every', type=int, default=20, help='Writes between compactions')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    directory = tempfile.mkdtemp(prefix='solstis-kb-')
+    data_file = os.path.join(directory, 'first_aid_data.json')
+    kb = FirstAidKnowledgeBase(data_file, sync=False)
+    build(kb, args.entries, rng)
+    # Every emergency's first step names it, so readers can check what they get back
+    with kb.transaction():
+        for name, data in list(kb.knowledge_base['emergencies'].items()):
+            kb.add_emergency(name, [f"{name}: {data['steps'][0]}"] + data['steps'][1:], data['symptoms'],
+                             data['equipment'])
+    words = TopicalWords(rng)
+    queries = [' '.join(words.take(words.topic(), rng.randint(1, 3), shared=0.1)) for _ in range(1000)]
+    for query in queries:
+        kb.search_knowledge_base(query, 5)  # warm the ranked posting lists
+    print(f"🔀 {args.entries} entries, {args.readers} reader threads, {args.duration:.0f} s per run")
+
+    print(f"{'writes/s':>9} {'writes':>7} {'writer CPU':>11} {'reads/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'torn':>5}")
+    throughput, failed = [], False
+    for writes_per_second in (0, args.writes_per_second):
+        latencies, torn, published, writer_cpu = run(kb, queries, args.readers, args.duration, writes_per_second,
+                                                     args.compact_every, rng)
+        throughput.append(len(latencies) / args.duration)
+        failed |= bool(torn)
+        print(f"{writes_per_second:>9.0f} {len(published):>7} {writer_cpu / args.duration:>11.1%} "
+              f"{throughput[-1]:>9.0f} {percentile(latencies, 50) * 1000:>8.3f} "
+              f"{percentile(latencies, 99) * 1000:>8.3f} {latencies[-1] * 1000:>8.1f} {torn:>5}")
+    gc.collect()
+    retained = sum(ref() is not None and ref() is not kb.current for ref in published)
+    failed |= bool(retained)
+    print(f"Read throughput with writes: {throughput[1] / throughput[0]:.1%} of read-only; "
+          f"{retained} of {len(published)} replaced versions still in memory")
+    shutil.rmtree(directory)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
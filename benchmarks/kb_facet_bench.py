@@ -0,0 +1,145 @@
+"""Latency of kit-aware symptom matching: facet bitsets vs scanning every entry.
+
+    python benchmarks/kb_facet_bench.py
+    python benchmarks/kb_facet_bench.py --entries 100000 --queries 2000 --top-k 5
+
+Generates a synthetic knowledge base (topics as in kb_search_bench.py) whose
+entries list two-word symptoms from their topic and equipment drawn from the
+real kits' items plus items no kit carries. Each query reports 1-3 symptoms of
+one topic for a random kit, keeping all matches, half-equipped entries or only
+fully equipped ones.
+
+Times FirstAidKnowledgeBase.match_symptoms() against the equivalent string
+scan (symptom comparison plus match_kit_items for every equipment string of
+every entry), on a sample of the same queries, and checks both rank entries
+with the same matched-symptom counts and equipment coverage.
+"""
+import argparse
+import heapq
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from eval_runner import load_app
+from kb_search_bench import TopicalWords
+from load_test import percentile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from kb_facets import FACETED_SECTIONS, HOME_SUPPLIES  # noqa: E402
+from kb_search import tokenize  # noqa: E402
+from knowledge_base import FirstAidKnowledgeBase  # noqa: E402
+from kit_items import match_kit_items  # noqa: E402
+
+# Equipment no kit carries
+EXTRA_EQUIPMENT = ["Tourniquet", "Splint", "Epinephrine auto-injector", "Aspirin", "Cold pack", "Clean water",
+                   "Sling", "Oral rehydration salts", "Eye wash station", "Heating pad"]
+COVERAGES = (0.0, 0.5, 1.0)
+
+
+def symptom_pool(words, topic, size=12):
+    return list(dict.fromkeys(' '.join(words.take(topic, 2, shared=0)) for _ in range(size)))
+
+
+def build(kb, entries, rng, equipment_pool):
+    words = TopicalWords(rng)
+    pools = {' '.join(topic): symptom_pool(words, topic) for topic in words.topics}
+    with kb.transaction():
+        for index in range(entries):
+            topic = words.topic()
+            name = ' '.join(words.take(topic, 3, shared=0)) + f" {index}"
+            steps = [' '.join(words.take(topic, 8)) for _ in range(2)]
+            symptoms = rng.sample(pools[' '.join(topic)], rng.randint(1, 4))
+            kb.add_emergency(name, steps, symptoms, rng.sample(equipment_pool, rng.randint(0, 4)))
+    return pools
+
+
+def string_scan(kb, symptoms, kit, top_k, min_coverage):
+    """Every entry's symptoms compared as strings, every equipment string matched against the kit."""
+    reported = {symptom.lower() for symptom in symptoms}
+    ranked = []
+    position = 0
+    for section in FACETED_SECTIONS:
+        for name, data in kb.knowledge_base[section].items():
+            position += 1
+            matched = sum(symptom.lower() in reported for symptom in data.get('symptoms', []))
+            if not matched:
+                continue
+            equipment = data.get('equipment', [])
+            coverage = 1.0
+            if equipment:
+                available = sum(bool(set(tokenize(item)) & HOME_SUPPLIES or match_kit_items(item, kit))
+                                for item in equipment)
+                coverage = available / len(equipment)
+            if coverage >= min_coverage:
+                ranked.append((-matched, -coverage, position, name))
+    return [(-matched, round(-coverage, 3)) for matched, coverage, _, _ in heapq.nsmallest(top_k, ranked)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kit-aware symptom matching benchmark')
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--scan-sample', type=int, default=20, help='Queries to time with the string scan')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    kits = load_app().KITS
+    equipment_pool = sorted({item['item'] for kit in kits for item in kit['contents']}) + EXTRA_EQUIPMENT
+    directory = tempfile.mkdtemp(prefix='solstis-kb-')
+    data_file = os.path.join(directory, 'first_aid_data.json')
+    pools = build(FirstAidKnowledgeBase(data_file, sync=False), args.entries, rng, equipment_pool)
+    start = time.perf_counter()
+    kb = FirstAidKnowledgeBase(data_file, sync=False)
+    load_seconds = time.perf_counter() - start
+    print(f"🩹 {args.entries} entries, {len(kb.facets.symptoms.names)} symptoms, "
+          f"{len(kb.facets.equipment.names)} equipment; loaded and indexed in {load_seconds:.1f} s")
+
+    topics = list(pools.values())
+    queries = []
+    for _ in range(args.queries):
+        pool = rng.choice(topics)
+        queries.append((rng.sample(pool, rng.randint(1, 3)), rng.choice(kits), rng.choice(COVERAGES)))
+
+    start = time.perf_counter()
+    for kit in kits:
+        kb.facets.kit(kit)
+    kit_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for symptoms, kit, min_coverage in queries:
+        start = time.perf_counter()
+        kb.match_symptoms(symptoms, kit, args.top_k, min_coverage)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    scan, agreed = [], 0
+    sample = queries[:args.scan_sample]
+    for symptoms, kit, min_coverage in sample:
+        start = time.perf_counter()
+        expected = string_scan(kb, symptoms, kit, args.top_k, min_coverage)
+        scan.append(time.perf_counter() - start)
+        got = [(len(r['matched_symptoms']), r['equipment_coverage'])
+               for r in kb.match_symptoms(symptoms, kit, args.top_k, min_coverage)]
+        agreed += got == expected
+    scan.sort()
+
+    print(f"Per-kit bitsets for {len(kits)} kits built in {kit_ms:.0f} ms")
+    print(f"{'':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print(f"{'bitsets':>12} {percentile(latencies, 50) * 1000:>8.3f} {percentile(latencies, 95) * 1000:>8.3f} "
+          f"{percentile(latencies, 99) * 1000:>8.3f}")
+    print(f"{'string scan':>12} {percentile(scan, 50) * 1000:>8.1f} {percentile(scan, 95) * 1000:>8.1f} "
+          f"{percentile(scan, 99) * 1000:>8.1f}")
+    print(f"Same ranking for {agreed}/{len(sample)} sampled queries")
+    shutil.rmtree(directory)
+    return 0 if agreed == len(sample) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
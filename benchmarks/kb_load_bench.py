@@ -0,0 +1,149 @@
+"""Knowledge base load time and memory per worker: JSON loader vs compiled mmap file.
+
+    python benchmarks/kb_load_bench.py
+    python benchmarks/kb_load_bench.py --entries 100000 --workers 4 --queries 500
+
+Generates a synthetic knowledge base (as kb_search_bench.py does), snapshots
+it and compiles it with kb_compiled.py. For each loader it then starts
+--workers forked processes that each open the knowledge base themselves, as
+gunicorn workers importing the app do, and run the same queries and name
+lookups. While all workers are alive it reads /proc/self/smaps_rollup in each:
+
+    load s      time to construct the knowledge base object
+    RSS MB      resident growth from loading and querying
+    private MB  memory only that worker holds (what each extra worker costs)
+    PSS MB      proportional share, with shared pages split between workers
+
+Results from both loaders are compared to check they rank the same entries.
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from kb_search_bench import TopicalWords, build
+from load_test import percentile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from kb_compiled import CompiledKnowledgeBase, compile_knowledge_base  # noqa: E402
+from knowledge_base import FirstAidKnowledgeBase  # noqa: E402
+
+
+def memory():
+    """Rss, Pss and private bytes of this process."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'private': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def open_kb(loader, data_file, compiled_file):
+    if loader == 'json':
+        return FirstAidKnowledgeBase(data_file, sync=False)
+    return CompiledKnowledgeBase(compiled_file)
+
+
+def worker(loader, data_file, compiled_file, queries, names, barrier, queue):
+    gc.collect()
+    before = memory()
+    start = time.perf_counter()
+    kb = open_kb(loader, data_file, compiled_file)
+    load_seconds = time.perf_counter() - start
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        kb.search_knowledge_base(query, 5)
+        latencies.append(time.perf_counter() - start)
+    for name in names:
+        kb.get_emergency_info(name)
+    gc.collect()
+    barrier.wait()
+    after = memory()
+    queue.put((load_seconds, {key: after[key] - before[key] for key in after}, sorted(latencies)))
+    barrier.wait()  # stay alive until every worker has measured
+
+
+def prepare(data_file, entries, seed, queue):
+    kb = FirstAidKnowledgeBase(data_file, sync=False)
+    build(kb, entries, random.Random(seed))
+    kb.compact()
+    names = list(kb.knowledge_base['emergencies'])[::97]
+    start = time.perf_counter()
+    compiled_file = compile_knowledge_base(data_file)
+    queue.put((compiled_file, time.perf_counter() - start, names))
+
+
+def run(loader, workers, data_file, compiled_file, queries, names):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    queue = context.Queue()
+    processes = [context.Process(target=worker, args=(loader, data_file, compiled_file, queries, names,
+                                                      barrier, queue))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Knowledge base load time and RSS benchmark')
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    directory = tempfile.mkdtemp(prefix='solstis-kb-')
+    data_file = os.path.join(directory, 'first_aid_data.json')
+    # Build and compile in a child so the workers don't inherit (and copy) its heap
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=prepare, args=(data_file, args.entries, args.seed, queue))
+    process.start()
+    compiled_file, compile_seconds, names = queue.get()
+    process.join()
+    words = TopicalWords(rng)
+    queries = [' '.join(words.take(words.topic(), rng.randint(1, 3), shared=0.1)) for _ in range(args.queries)]
+    print(f"📦 {args.entries} entries: JSON {os.path.getsize(data_file) / 1e6:.1f} MB, "
+          f"compiled {os.path.getsize(compiled_file) / 1e6:.1f} MB in {compile_seconds:.1f} s")
+
+    print(f"{'loader':>10} {'workers':>8} {'load s':>8} {'RSS MB':>8} {'private MB':>11} {'PSS MB':>8} "
+          f"{'query p50 ms':>13} {'all PSS MB':>11}")
+    for loader in ('json', 'compiled'):
+        results = run(loader, args.workers, data_file, compiled_file, queries, names)
+        loads = sorted(load for load, _, _ in results)
+        mean = {key: sum(grown[key] for _, grown, _ in results) / len(results) / 1e6 for key in ('rss', 'private', 'pss')}
+        latency = percentile(sorted(l for _, _, latencies in results for l in latencies), 50)
+        print(f"{loader:>10} {args.workers:>8} {loads[len(loads) // 2]:>8.2f} {mean['rss']:>8.1f} "
+              f"{mean['private']:>11.1f} {mean['pss']:>8.1f} {latency * 1000:>13.3f} "
+              f"{mean['pss'] * args.workers:>11.1f}")
+
+    json_kb = FirstAidKnowledgeBase(data_file, sync=False)
+    compiled_kb = CompiledKnowledgeBase(compiled_file)
+    mismatched = sum(
+        [round(r['score'], 6) for r in json_kb.search_knowledge_base(query, 5)]
+        != [round(r['score'], 6) for r in compiled_kb.search_knowledge_base(query, 5)]
+        for query in queries)
+    print(f"Top-5 scores identical for {len(queries) - mismatched}/{len(queries)} queries")
+    compiled_kb.close()
+    shutil.rmtree(directory)
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Query latency of FirstAidKnowledgeBase search at 100k entries.
+
+    python benchmarks/kb_search_bench.py
+    python benchmarks/kb_search_bench.py --entries 100000 --queries 2000 --top-k 5
+
+Generates a synthetic knowledge base of entries about 20 first aid
+situations: names, steps, symptoms and equipment draw on the situation's own
+words plus shared action words ("apply", "gently"), so each situation's terms
+appear in thousands of entries. Queries describe one situation in 1-3 words.
+
+Reports write and load-plus-index time, query latency and agreement with
+exhaustive BM25 scoring for exact top-k and for a --max-candidates cap, and
+the previous linear substring scan on a sample of the same queries.
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from load_test import percentile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from kb_search import tokenize  # noqa: E402
+from knowledge_base import FirstAidKnowledgeBase  # noqa: E402
+
+# Situations an entry is about, each with its own words; entries also use shared action words
+TOPICS = [
+    "bleeding cut gauze pressure wound soaking spurting",
+    "burn blister scald cool gel spray sunburn",
+    "sting bee wasp stinger swelling itching antihistamine",
+    "bite dog tick mosquito puncture rabies antiseptic",
+    "sprain ankle wrist twist swelling splint wrap",
+    "fracture bone deformity splint sling immobilize",
+    "nosebleed nose pinch lean forward nostril",
+    "fainting dizziness lightheaded legs elevate blood",
+    "nausea vomiting stomach sips ginger rest",
+    "cramp muscle dehydration electrolyte stretch massage",
+    "splinter tweezers sliver skin needle",
+    "eye debris flush saline irritation blink",
+    "allergic reaction hives throat epinephrine wheezing",
+    "choking airway heimlich cough abdominal",
+    "chest pain heart aspirin breathing",
+    "head concussion confusion headache vomiting",
+    "hypothermia cold shivering blanket warm",
+    "heat exhaustion sweating shade water cool",
+    "poison ingestion label control center",
+    "rash itching ointment hydrocortisone redness",
+]
+ACTIONS = "apply hold remove clean cover check call gently firmly minutes keep place".split()
+
+
+class TopicalWords:
+    """Entry and query text drawn mostly from one topic, like real first aid protocols."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.topics = [topic.split() for topic in TOPICS]
+
+    def topic(self):
+        return self.rng.choice(self.topics)
+
+    def take(self, topic, count, shared=0.3):
+        return [self.rng.choice(ACTIONS) if self.rng.random() < shared else self.rng.choice(topic)
+                for _ in range(count)]
+
+
+def build(kb, entries, rng):
+    words = TopicalWords(rng)
+    with kb.transaction():
+        for index in range(entries):
+            topic = words.topic()
+            name = ' '.join(words.take(topic, 3, shared=0)) + f" {index}"
+            steps = [' '.join(words.take(topic, 8)) for _ in range(4)]
+            equipment = words.take(topic, 3)
+            if index % 2:
+                kb.add_procedure(name, steps, equipment)
+            else:
+                kb.add_emergency(name, steps, words.take(topic, 3, shared=0), equipment)
+
+
+def linear_scan(kb, query):
+    """The previous search: substring match over names and steps, unranked."""
+    results = []
+    for section in ('emergencies', 'procedures'):
+        for name, data in kb.knowledge_base[section].items():
+            if query.lower() in name.lower() or any(query.lower() in step.lower() for step in data['steps']):
+                results.append(name)
+    return results
+
+
+def exhaustive_top_k(index, query, top_k):
+    terms = [term for term in dict.fromkeys(tokenize(query)) if term in index.postings]
+    candidates = set()
+    for term in terms:
+        candidates.update(index.postings[term])
+    count = len(index.doc_terms)
+    scores = []
+    for doc_id in candidates:
+        total = 0.0
+        for term in terms:
+            frequency = index.postings[term].get(doc_id)
+            if frequency:
+                df = len(index.postings[term])
+                total += math.log(1 + (count - df + 0.5) / (df + 0.5)) * index._impact(frequency, doc_id)
+        scores.append((total, doc_id))
+    return sorted(scores, reverse=True)[:top_k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Knowledge base search benchmark')
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--max-candidates', type=int, default=500, help='Cap for the latency-bounded variant')
+    parser.add_argument('--scan-sample', type=int, default=20, help='Queries to time with the linear scan')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    directory = tempfile.mkdtemp(prefix='solstis-kb-')
+    data_file = os.path.join(directory, 'first_aid_data.json')
+    start = time.perf_counter()
+    build(FirstAidKnowledgeBase(data_file, sync=False), args.entries, rng)
+    build_seconds = time.perf_counter() - start
+    # Reopen from disk so the index is built the way a server start builds it
+    start = time.perf_counter()
+    kb = FirstAidKnowledgeBase(data_file, sync=False)
+    load_seconds = time.perf_counter() - start
+    print(f"🔎 {args.entries} entries, {len(kb.index.postings)} terms; written in {build_seconds:.1f} s, "
+          f"loaded and indexed in {load_seconds:.1f} s")
+
+    words = TopicalWords(rng)
+    queries = [' '.join(words.take(words.topic(), rng.randint(1, 3), shared=0.1)) for _ in range(args.queries)]
+
+    def timed(max_candidates):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            kb.search_knowledge_base(query, args.top_k, max_candidates)
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)
+
+    def agreement(max_candidates):
+        exact = 0
+        for query in checked:
+            # Compare scores rather than ids: equal-scoring documents may tie-break differently
+            expected = [round(score, 9) for score, _ in exhaustive_top_k(kb.index, query, args.top_k)]
+            got = [round(score, 9) for score, _ in kb.index.search(query, args.top_k, max_candidates)]
+            exact += expected == got
+        return exact
+
+    checked = queries[:200]
+    variants = [(f"BM25 top-{args.top_k}", None), (f"capped at {args.max_candidates}", args.max_candidates)]
+
+    scan = []
+    for query in queries[:args.scan_sample]:
+        start = time.perf_counter()
+        linear_scan(kb, query)
+        scan.append(time.perf_counter() - start)
+    scan.sort()
+
+    print(f"{'':>16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'exact top-k':>12}")
+    for label, max_candidates in variants:
+        latencies = timed(max_candidates)
+        print(f"{label:>16} {percentile(latencies, 50) * 1000:>8.3f} {percentile(latencies, 95) * 1000:>8.3f} "
+              f"{percentile(latencies, 99) * 1000:>8.3f} {agreement(max_candidates):>7}/{len(checked)}")
+    print(f"{'linear scan':>16} {percentile(scan, 50) * 1000:>8.1f} {percentile(scan, 95) * 1000:>8.1f} "
+          f"{percentile(scan, 99) * 1000:>8.1f}")
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
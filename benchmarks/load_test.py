@@ -0,0 +1,332 @@
+"""Load test for api/app.py against the local stand-in upstreams.
+
+Starts mock OpenAI/ElevenLabs servers, boots the API under gunicorn for each
+worker configuration, then drives realistic multi-turn sessions at rising
+concurrency. Reports throughput, p50/p95/p99 latency and RSS per configuration.
+
+Example:
+    python benchmarks/load_test.py --workers 1,2x4,4 --concurrency 1,8,32 --duration 15
+"""
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from mock_upstreams import add_mock_arguments, config_from_args, start_mock_server
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+# Multi-turn conversations modelled on the examples in the system prompt
+SCENARIOS = [
+    [
+        "I cut my finger with a kitchen knife. It's bleeding a lot.",
+        "No, just a little shaky.",
+        "Yes.",
+        "Done.",
+        "I can't find it.",
+        "Found it.",
+        "It's been 5 minutes and the bleeding hasn't stopped.",
+    ],
+    [
+        "I cut my foot and I'm feeling faint.",
+        "There's a lot of blood and it's a deep cut.",
+        "Done.",
+        "I'm still feeling dizzy after lying down.",
+    ],
+    [
+        "I have a really bad cramp in my shoulder.",
+        "I haven't had much water today.",
+        "Done.",
+    ],
+    [
+        "I got a burn.",
+        "It's on my hand, about the size of a coin.",
+        "Done.",
+        "It still stings.",
+    ],
+]
+
+KIT_TYPES = ['standard', 'college', 'oc_standard', 'oc_vehicle']
+
+# Stand-in payloads for the upload endpoints
+FAKE_AUDIO = b'\x1aE\xdf\xa3' + bytes(8000)
+FAKE_IMAGE = b'\x89PNG\r\n\x1a\n' + bytes(4000)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_worker_spec(spec):
+    """'4' -> (4 workers, 1 thread); '2x8' -> (2 workers, 8 threads)."""
+    workers, _, threads = spec.partition('x')
+    return int(workers), int(threads or 1)
+
+
+def process_tree_rss(root_pid):
+    """Total resident memory in bytes of a process and its children (Linux /proc)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError):
+            continue
+
+    total = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+        pending.extend(children.get(pid, []))
+    return total
+
+
+class ApiServer:
+    """api/app.py running under gunicorn, pointed at the stand-in upstreams."""
+
+    def __init__(self, workers, threads, upstream_url):
+        self.workers = workers
+        self.threads = threads
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.upstream_url = upstream_url
+        self.process = None
+
+    def start(self, timeout=30):
+        env = dict(os.environ)
+        env.update({
+            'OPENAI_API_BASE': f"{self.upstream_url}/v1",
+            'OPENAI_API_KEY': 'mock-key',
+            'ELEVENLABS_API_BASE': self.upstream_url,
+            'ELEVENLABS_API_KEY': 'mock-key',
+        })
+        cmd = [
+            sys.executable, '-m', 'gunicorn',
+            '-w', str(self.workers),
+            '--threads', str(self.threads),
+            '-b', f"127.0.0.1:{self.port}",
+            '--log-level', 'warning',
+            'app:app',
+        ]
+        # The app prints debug output per request; keep it out of the report
+        self.process = subprocess.Popen(cmd, cwd=API_DIR, env=env, stdout=subprocess.DEVNULL)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if requests.get(f"{self.base_url}/api/health", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"API did not become healthy within {timeout}s")
+
+    def rss(self):
+        return process_tree_rss(self.process.pid) if self.process else 0
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+
+class Recorder:
+    """Thread-safe collection of per-request latencies and failures."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.failures = {}
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.failures[endpoint] = self.failures.get(endpoint, 0) + 1
+
+    def summary(self, elapsed):
+        all_latencies = sorted(x for values in self.latencies.values() for x in values)
+        total = len(all_latencies)
+        result = {
+            'requests': total,
+            'failures': sum(self.failures.values()),
+            'throughput_rps': total / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(all_latencies, 50) * 1000,
+            'p95_ms': percentile(all_latencies, 95) * 1000,
+            'p99_ms': percentile(all_latencies, 99) * 1000,
+            'endpoints': {},
+        }
+        for endpoint, values in self.latencies.items():
+            values = sorted(values)
+            result['endpoints'][endpoint] = {
+                'requests': len(values),
+                'failures': self.failures.get(endpoint, 0),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+            }
+        return result
+
+
+def run_session(http, base_url, user_name, rng, recorder, options):
+    """One realistic session: setup, a scripted multi-turn chat, optional media calls, clear."""
+
+    def timed(endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = http.request(method, f"{base_url}{path}", timeout=options.request_timeout, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    kit_type = rng.choice(KIT_TYPES)
+    timed('setup', 'POST', '/api/setup', json={'user_name': user_name, 'kit_type': kit_type})
+
+    if rng.random() < options.stt_ratio:
+        timed('stt', 'POST', '/api/stt', files={'file': ('recording.webm', FAKE_AUDIO, 'audio/webm')})
+    if rng.random() < options.image_ratio:
+        timed('analyze-image', 'POST', '/api/analyze-image',
+              files={'image': ('wound.png', FAKE_IMAGE, 'image/png')},
+              data={'kit_type': kit_type, 'user_context': 'small cut'})
+
+    for turn in rng.choice(SCENARIOS):
+        response = timed('chat', 'POST', '/api/chat',
+                         json={'user_input': turn, 'user_name': user_name, 'kit_type': kit_type})
+        if response is not None and response.ok and rng.random() < options.tts_ratio:
+            timed('tts', 'POST', '/api/tts', json={'text': response.json().get('response', '')})
+        if options.think_time:
+            time.sleep(rng.uniform(0, options.think_time))
+
+    timed('clear', 'POST', '/api/clear', json={'user_name': user_name})
+
+
+def run_level(server, concurrency, options):
+    """Drive `concurrency` parallel users for `options.duration` seconds."""
+    recorder = Recorder()
+    deadline = time.time() + options.duration
+    peak_rss = [server.rss()]
+
+    def user_loop(index):
+        rng = random.Random((options.seed or 0) * 1000 + index)
+        http = requests.Session()
+        session_number = 0
+        while time.time() < deadline:
+            user_name = f"load-{concurrency}-{index}-{session_number}"
+            run_session(http, server.base_url, user_name, rng, recorder, options)
+            session_number += 1
+
+    threads = [threading.Thread(target=user_loop, args=(i,), daemon=True) for i in range(concurrency)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(0.5)
+        peak_rss.append(server.rss())
+    elapsed = time.time() - start
+
+    summary = recorder.summary(elapsed)
+    summary['concurrency'] = concurrency
+    summary['peak_rss_mb'] = max(peak_rss) / (1024 * 1024)
+    return summary
+
+
+def print_table(results):
+    header = f"{'workers':>8} {'conc':>5} {'reqs':>7} {'fail':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for config in results:
+        for level in config['levels']:
+            print(f"{config['workers_spec']:>8} {level['concurrency']:>5} {level['requests']:>7} "
+                  f"{level['failures']:>5} {level['throughput_rps']:>8.1f} {level['p50_ms']:>8.0f} "
+                  f"{level['p95_ms']:>8.0f} {level['p99_ms']:>8.0f} {level['peak_rss_mb']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test api/app.py against local stand-in upstreams')
+    parser.add_argument('--workers', default='1,2,4',
+                        help="Comma-separated gunicorn configs: 'N' workers or 'NxT' workers x threads")
+    parser.add_argument('--concurrency', default='1,4,16,32', help='Comma-separated concurrent user levels')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per concurrency level')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between turns (s)')
+    parser.add_argument('--tts-ratio', type=float, default=0.5, help='Fraction of replies also sent to /api/tts')
+    parser.add_argument('--stt-ratio', type=float, default=0.2, help='Fraction of sessions that upload audio')
+    parser.add_argument('--image-ratio', type=float, default=0.1, help='Fraction of sessions that upload an image')
+    parser.add_argument('--request-timeout', type=float, default=60)
+    parser.add_argument('--json', dest='json_path', help='Write the full report to this file')
+    add_mock_arguments(parser)
+    options = parser.parse_args()
+
+    upstream = start_mock_server(config_from_args(options))
+    print(f"🧪 Mock upstreams on {upstream.base_url}")
+
+    results = []
+    try:
+        for spec in options.workers.split(','):
+            workers, threads = parse_worker_spec(spec)
+            server = ApiServer(workers, threads, upstream.base_url)
+            print(f"\n🚀 gunicorn -w {workers} --threads {threads}")
+            server.start()
+            config_result = {
+                'workers_spec': spec,
+                'workers': workers,
+                'threads': threads,
+                'idle_rss_mb': server.rss() / (1024 * 1024),
+                'levels': [],
+            }
+            try:
+                for concurrency in (int(c) for c in options.concurrency.split(',')):
+                    level = run_level(server, concurrency, options)
+                    print(f"   {concurrency:>3} users: {level['throughput_rps']:.1f} req/s, "
+                          f"p95 {level['p95_ms']:.0f} ms, {level['failures']} failures")
+                    config_result['levels'].append(level)
+            finally:
+                server.stop()
+            results.append(config_result)
+    finally:
+        upstream.shutdown()
+
+    print_table(results)
+    if options.json_path:
+        report = {'options': vars(options), 'upstream_stats': upstream.config.stats, 'results': results}
+        with open(options.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Report written to {options.json_path}")
+
+
+if __name__ == "__main__":
+    main()
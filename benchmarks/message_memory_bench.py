@@ -0,0 +1,107 @@
+"""Bytes per stored turn: dict-per-message vs MessageLog, at high session counts.
+
+    python benchmarks/message_memory_bench.py --sessions 100000 --turns 8
+
+Each representation is built in a fresh forked process and measured by RSS
+growth, so allocator overhead is included. Contents are distinct string objects
+per session, as they would be when parsed from real requests and responses.
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+from load_test import SCENARIOS
+from mock_upstreams import CANNED_REPLIES
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from message_store import MessageLog  # noqa: E402
+
+USER_TURNS = [turn for scenario in SCENARIOS for turn in scenario]
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def turn_text(index, session):
+    source = USER_TURNS if index % 2 == 0 else CANNED_REPLIES
+    # Concatenation yields a new string object, like a freshly parsed request body
+    return source[(session + index) % len(source)] + ' '
+
+
+def build_dicts(sessions, turns):
+    conversations = {}
+    for session in range(sessions):
+        messages = []
+        for index in range(turns):
+            messages.append({
+                'role': 'user' if index % 2 == 0 else 'assistant',
+                'content': turn_text(index, session),
+                'timestamp': datetime.now().isoformat()
+            })
+        conversations[f"user-{session}"] = {'kit_type': 'standard', 'messages': messages}
+    return conversations
+
+
+def build_logs(sessions, turns, compress):
+    MessageLog.compress_cold = compress
+    now = int(time.time())
+    conversations = {}
+    for session in range(sessions):
+        messages = MessageLog()
+        for index in range(turns):
+            messages.append('user' if index % 2 == 0 else 'assistant', turn_text(index, session), now)
+        conversations[f"user-{session}"] = {'kit_type': 'standard', 'messages': messages}
+    return conversations
+
+
+def measure(name, sessions, turns, queue):
+    builders = {
+        'dict': lambda: build_dicts(sessions, turns),
+        'MessageLog': lambda: build_logs(sessions, turns, False),
+        'MessageLog+zlib': lambda: build_logs(sessions, turns, True),
+    }
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    conversations = builders[name]()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    queue.put((name, rss_bytes() - before, elapsed, len(conversations)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory per stored conversation turn')
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--turns', type=int, default=8, help='Stored turns per session')
+    parser.add_argument('--hot-window', type=int, default=4,
+                        help='Uncompressed trailing turns for the zlib variant')
+    args = parser.parse_args()
+    MessageLog.hot_window = args.hot_window
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    total_turns = args.sessions * args.turns
+    print(f"🧠 {args.sessions} sessions x {args.turns} turns = {total_turns} stored turns")
+    print(f"{'representation':>16} {'RSS MB':>8} {'bytes/turn':>11} {'build s':>8}")
+    baseline = None
+    for name in ('dict', 'MessageLog', 'MessageLog+zlib'):
+        process = context.Process(target=measure, args=(name, args.sessions, args.turns, queue))
+        process.start()
+        _, grown, elapsed, _ = queue.get()
+        process.join()
+        per_turn = grown / total_turns
+        baseline = baseline or per_turn
+        print(f"{name:>16} {grown / 1024 / 1024:>8.1f} {per_turn:>11.0f} {elapsed:>8.2f}"
+              f"  ({per_turn / baseline:.0%} of dict)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Microphone capture per turn: device setup and calibration for every recording vs one long-lived stream.
+
+    python benchmarks/mic_capture_bench.py
+    python benchmarks/mic_capture_bench.py --turns 10 --open-ms 150 --reply-after-ms 200
+
+Plays a scripted room in real time: background noise, and a 1.5 s utterance
+starting --reply-after-ms after each listen() call, as when the user answers
+as soon as the prompt appears. Two ways of capturing it:
+
+    per turn     as record_audio() did with speech_recognition: open the
+                 microphone (--open-ms stands in for enumerating devices and
+                 opening the stream), calibrate to the room for 0.5 s, then
+                 listen
+    stream       MicrophoneStream (development files/mic_stream.py), opened
+                 once and capturing in the background
+
+For each it reports the time from listen() to listening, how much of the
+start of the utterance was missing from the recording, and the time from the
+end of speech to listen() returning (p50). It then times one frame of voice
+activity detection with NumPy against the pure-Python RMS the pipeline used.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import threading
+import time
+import timeit
+from array import array
+from collections import deque
+
+from load_test import percentile
+
+DEV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'development files')
+sys.path.insert(0, DEV_DIR)
+
+from mic_stream import FRAME_MS, FRAME_SAMPLES, SAMPLE_RATE, MicrophoneStream, SpeechDetector, frame_rms  # noqa: E402
+
+SPEECH_SECONDS = 1.5
+SPEECH_RMS = 1000  # frames of the utterance are well above this, the room well below
+
+
+class Room:
+    """Background noise, with speech scheduled at given times; read through sources that play it in real time."""
+
+    def __init__(self, rng):
+        self.started = time.perf_counter()
+        self.noise = [array('h', (int(rng.gauss(0, 120)) for _ in range(FRAME_SAMPLES))).tobytes()
+                      for _ in range(50)]
+        self.speech = []  # (first frame, PCM frames)
+        self.lock = threading.Lock()
+
+    def now(self):
+        return int((time.perf_counter() - self.started) * 1000 / FRAME_MS)
+
+    def say_at(self, at, frames):
+        """Schedules speech to start at perf_counter() time `at`; returns when it ends."""
+        first = int((at - self.started) * 1000 / FRAME_MS)
+        with self.lock:
+            self.speech.append((first, frames))
+        return self.started + (first + len(frames)) * FRAME_MS / 1000
+
+    def frame(self, index):
+        with self.lock:
+            for first, frames in self.speech:
+                if first <= index < first + len(frames):
+                    return frames[index - first]
+        return self.noise[index % len(self.noise)]
+
+    def source(self):
+        return RoomSource(self)
+
+
+class RoomSource:
+    """A microphone opened now: it hears the room from this moment on, one frame per FRAME_MS."""
+
+    def __init__(self, room):
+        self.room = room
+        self.next = room.now()
+
+    def read(self):
+        due = self.room.started + (self.next + 1) * FRAME_MS / 1000
+        time.sleep(max(0.0, due - time.perf_counter()))
+        self.next += 1
+        return self.room.frame(self.next - 1)
+
+
+def per_turn_listen(room, open_ms, timeout=5.0):
+    """The old record_audio(): a new microphone and calibration every turn, then speech_recognition-style listening."""
+    time.sleep(open_ms / 1000)
+    source = room.source()
+    detector = SpeechDetector()
+    for _ in range(500 // FRAME_MS):  # adjust_for_ambient_noise(duration=0.5)
+        detector.feed(source.read())
+    listening = time.perf_counter()
+    preroll = deque(maxlen=300 // FRAME_MS)
+    utterance = []
+    while True:
+        frame = source.read()
+        event = detector.feed(frame)
+        if event == 'start':
+            utterance = list(preroll)
+        if detector.in_speech or event == 'end':
+            utterance.append(frame)
+        else:
+            preroll.append(frame)
+            if not utterance and time.perf_counter() - listening > timeout:
+                return listening, None
+        if event == 'end':
+            return listening, b''.join(utterance)
+
+
+def utterance(seconds, rng):
+    frequency = rng.uniform(150, 300)
+    samples = array('h', (int(4000 * math.sin(2 * math.pi * frequency * index / SAMPLE_RATE))
+                          for index in range(int(SAMPLE_RATE * seconds)))).tobytes()
+    return [samples[start:start + FRAME_SAMPLES * 2] for start in range(0, len(samples), FRAME_SAMPLES * 2)]
+
+
+def voiced_ms(pcm):
+    size = FRAME_SAMPLES * 2
+    return sum(FRAME_MS for start in range(0, len(pcm), size) if frame_rms(pcm[start:start + size]) >= SPEECH_RMS)
+
+
+def run_turns(room, listen, turns, reply_after, rng):
+    """(listen to listening, speech missing from the recording, end of speech to return), in seconds."""
+    setups, clipped, returns = [], [], []
+    for _ in range(turns):
+        frames = utterance(SPEECH_SECONDS, rng)
+        called = time.perf_counter()
+        speech_end = room.say_at(called + reply_after, frames)
+        listening, pcm = listen()
+        returned = time.perf_counter()
+        if pcm is None:
+            raise RuntimeError("No speech detected")
+        setups.append(max(0.0, listening - called))
+        clipped.append(max(0.0, SPEECH_SECONDS - voiced_ms(pcm) / 1000))
+        returns.append(returned - speech_end)
+        time.sleep(0.5)
+    return sorted(setups), sorted(clipped), sorted(returns)
+
+
+def python_rms(pcm):
+    samples = array('h')
+    samples.frombytes(pcm)
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microphone capture benchmark')
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--open-ms', type=float, default=150, help='Stand-in for opening a microphone per turn')
+    parser.add_argument('--reply-after-ms', type=float, default=200, help='When the user starts talking')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    room = Room(rng)
+    microphone = MicrophoneStream(room.source()).start()
+    time.sleep(1.0)  # the stream has been capturing since the app started
+    print(f"🎙️ {args.turns} turns, user speaks {args.reply_after_ms:.0f} ms after listen() for "
+          f"{SPEECH_SECONDS} s, per-turn open {args.open_ms:.0f} ms + 500 ms calibration")
+
+    results = {
+        'per turn': run_turns(room, lambda: per_turn_listen(room, args.open_ms), args.turns,
+                              args.reply_after_ms / 1000, rng),
+        'stream': run_turns(room, lambda: (time.perf_counter(), microphone.listen()), args.turns,
+                            args.reply_after_ms / 1000, rng),
+    }
+    microphone.close()
+
+    print(f"{'':>10} {'listening after p50 ms':>23} {'speech clipped p50 ms':>22} {'end to return p50 ms':>21}")
+    for name, (setups, clipped, returns) in results.items():
+        print(f"{name:>10} {percentile(setups, 50) * 1000:>23.0f} {percentile(clipped, 50) * 1000:>22.0f} "
+              f"{percentile(returns, 50) * 1000:>21.0f}")
+
+    frame = room.frame(0)
+    runs = 2000
+    numpy_us = timeit.timeit(lambda: frame_rms(frame), number=runs) / runs * 1e6
+    python_us = timeit.timeit(lambda: python_rms(frame), number=runs) / runs * 1e6
+    print(f"VAD per {FRAME_MS} ms frame: NumPy {numpy_us:.1f} µs, pure Python {python_us:.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,410 @@
+"""Local stand-in servers for the OpenAI and ElevenLabs endpoints used by api/app.py.
+
+Serves chat (incl. vision and streaming), TTS, STT and voices with configurable
+latency, error rates and 429 injection so the API can be load-tested without
+spending real quota.
+
+Run standalone:
+    python benchmarks/mock_upstreams.py --port 8089 --chat-latency lognormal:400,0.5
+
+Then start the API against it:
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 ELEVENLABS_API_BASE=http://127.0.0.1:8089 \\
+    OPENAI_API_KEY=mock ELEVENLABS_API_KEY=mock python api/app.py
+"""
+import argparse
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Replies taken from the SOLSTIS examples in the system prompt
+CANNED_REPLIES = [
+    "First—are you feeling faint, dizzy, or having trouble breathing?",
+    "Good. Do you have access to clean, running water?",
+    "Great. Rinse the cut under cool water. Remove any rings first. Let me know when you're done.",
+    "From the highlighted space, take the small gauze. Press gently for 5 minutes. Let me know when you're done.",
+    "No problem—check the small highlighted section. If it's not there, we can use the large gauze in the highlighted section instead.",
+    "Well done. Place a bandage from the highlighted space so the pad covers the cut. Let me know when you're done.",
+    "How bad is the burn? What size is it and where is it located?",
+]
+
+VOICES = [
+    {"voice_id": "XcXEQzuLXRU9RcfWzEJt", "name": "Solstis", "category": "cloned"},
+    {"voice_id": "kdmDKE6EkgrWrrykO9Qt", "name": "Calm", "category": "premade"},
+    {"voice_id": "21m00Tcm4TlvDq8ikWAM", "name": "Rachel", "category": "premade"},
+]
+
+# ~15 characters spoken per second; audio is sized by the requested output format's bitrate
+CHARS_PER_SECOND = 15
+
+
+class LatencyDistribution:
+    """Latency in milliseconds drawn from a spec string.
+
+    Supported specs:
+        fixed:50              always 50 ms
+        uniform:20-200        uniformly between 20 and 200 ms
+        lognormal:400,0.5     log-normal with a median of 400 ms and sigma 0.5
+    """
+
+    def __init__(self, spec="fixed:0", seed=None):
+        self.spec = spec
+        self.rng = random.Random(seed)
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        if kind == 'fixed':
+            self.value = float(args or 0)
+        elif kind == 'uniform':
+            low, high = args.split('-')
+            self.low, self.high = float(low), float(high)
+        elif kind == 'lognormal':
+            median, sigma = args.split(',')
+            self.mu, self.sigma = math.log(float(median)), float(sigma)
+        else:
+            raise ValueError(f"Unknown latency spec: {spec}")
+
+    def sample(self):
+        """Return one latency sample in seconds."""
+        if self.kind == 'fixed':
+            ms = self.value
+        elif self.kind == 'uniform':
+            ms = self.rng.uniform(self.low, self.high)
+        else:
+            ms = self.rng.lognormvariate(self.mu, self.sigma)
+        return ms / 1000.0
+
+    def __repr__(self):
+        return f"LatencyDistribution({self.spec!r})"
+
+
+class MockConfig:
+    """Per-endpoint behaviour of the stand-in servers."""
+
+    ENDPOINTS = ('chat', 'vision', 'tts', 'stt', 'voices')
+
+    def __init__(self, latency=None, error_rate=0.0, rate_limit_rate=0.0,
+                 stream_chunk_ms=20, seed=None, prefill_ms_per_1k=0.0, connect_ms=0.0):
+        latency = latency or {}
+        self.latency = {
+            name: LatencyDistribution(latency.get(name, 'fixed:0'), seed)
+            for name in self.ENDPOINTS
+        }
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stream_chunk_delay = stream_chunk_ms / 1000.0
+        # Extra time to first token per 1000 prompt tokens, as real models spend on prefill
+        self.prefill_delay_per_token = prefill_ms_per_1k / 1000.0 / 1000
+        # Extra time on each new connection, as the TCP and TLS handshakes to the real services take
+        self.connect_delay = connect_ms / 1000.0
+        self.connections = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {name: {'requests': 0, 'errors': 0, 'rate_limited': 0} for name in self.ENDPOINTS}
+
+    def roll_failure(self, endpoint):
+        """Decide whether this request fails. Returns an HTTP status or None."""
+        with self.lock:
+            self.stats[endpoint]['requests'] += 1
+            roll = self.rng.random()
+            if roll < self.rate_limit_rate:
+                self.stats[endpoint]['rate_limited'] += 1
+                return 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats[endpoint]['errors'] += 1
+                return 500
+        return None
+
+
+def _is_vision_request(body):
+    for message in body.get('messages', []):
+        if isinstance(message.get('content'), list):
+            return True
+    return False
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class MockUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None  # set by start_mock_server
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this, Nagle plus
+        # delayed ACKs add ~40 ms to every keep-alive response.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.config.lock:
+            self.config.connections += 1
+        time.sleep(self.config.connect_delay)
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # client closed an idle keep-alive connection
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- helpers ---
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _maybe_fail(self, endpoint):
+        status = self.config.roll_failure(endpoint)
+        if status == 429:
+            self._send_json(429, {'error': {'message': 'Rate limit exceeded', 'type': 'rate_limit_error'}},
+                            {'Retry-After': '1'})
+            return True
+        if status:
+            self._send_json(status, {'error': {'message': 'Injected upstream failure', 'type': 'server_error'}})
+            return True
+        return False
+
+    # --- routing ---
+
+    def do_GET(self):
+        if self.path.startswith('/v1/voices'):
+            return self._handle_voices()
+        if self.path.startswith('/v1/models'):
+            return self._send_json(200, {'object': 'list', 'data': [{'id': 'gpt-4o-mini', 'object': 'model'}]})
+        self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        raw = self._read_body()
+        if self.path.startswith('/v1/chat/completions'):
+            return self._handle_chat(json.loads(raw or b'{}'))
+        if self.path.startswith('/v1/text-to-speech/'):
+            path, _, query = self.path.partition('?')
+            output_format = parse_qs(query).get('output_format', ['mp3_44100_128'])[0]
+            return self._handle_tts(json.loads(raw or b'{}'), path.endswith('/stream'), output_format)
+        if self.path.startswith('/v1/speech-to-text'):
+            return self._handle_stt(raw)
+        self._send_json(404, {'error': 'not found'})
+
+    # --- endpoints ---
+
+    def _handle_chat(self, body):
+        endpoint = 'vision' if _is_vision_request(body) else 'chat'
+        if self._maybe_fail(endpoint):
+            return
+        reply = self.config.rng.choice(CANNED_REPLIES)
+        prompt_text = json.dumps(body.get('messages', []))
+        usage = {
+            'prompt_tokens': _estimate_tokens(prompt_text),
+            'completion_tokens': _estimate_tokens(reply),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get('model', 'gpt-4o-mini')
+
+        # Latency until the first token; streaming adds a per-chunk delay on top
+        time.sleep(self.config.latency[endpoint].sample()
+                   + usage['prompt_tokens'] * self.config.prefill_delay_per_token)
+
+        if not body.get('stream'):
+            return self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': reply},
+                    'finish_reason': 'stop',
+                }],
+                'usage': usage,
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = reply.split(' ')
+        for i, word in enumerate(words):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': word if i == 0 else ' ' + word},
+                    'finish_reason': None,
+                }],
+            }
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            time.sleep(self.config.stream_chunk_delay)
+        done = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+        }
+        if (body.get('stream_options') or {}).get('include_usage'):
+            done['usage'] = usage
+        self._send_chunk(f"data: {json.dumps(done)}\n\n".encode('utf-8'))
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _handle_tts(self, body, streaming, output_format='mp3_44100_128'):
+        if self._maybe_fail('tts'):
+            return
+        text = body.get('text', '')
+        bytes_per_second, content_type = _audio_rate(output_format)
+        audio = _fake_audio(len(text) * bytes_per_second // CHARS_PER_SECOND)
+        time.sleep(self.config.latency['tts'].sample())
+
+        if not streaming:
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk_size = 4096
+        for start in range(0, len(audio), chunk_size):
+            self._send_chunk(audio[start:start + chunk_size])
+            time.sleep(self.config.stream_chunk_delay)
+        self._send_chunk(b"")
+
+    def _handle_stt(self, raw):
+        if self._maybe_fail('stt'):
+            return
+        time.sleep(self.config.latency['stt'].sample())
+        self._send_json(200, {
+            'language_code': 'en',
+            'text': "I cut my finger and it's bleeding.",
+            'audio_bytes': len(raw),
+        })
+
+    def _handle_voices(self):
+        if self._maybe_fail('voices'):
+            return
+        time.sleep(self.config.latency['voices'].sample())
+        self._send_json(200, {'voices': VOICES})
+
+
+def _audio_rate(output_format):
+    """(bytes per second, content type) of an ElevenLabs output format such as mp3_44100_128 or pcm_16000."""
+    codec, _, rest = output_format.partition('_')
+    sample_rate, _, bitrate = rest.partition('_')
+    if codec == 'pcm':
+        return int(sample_rate) * 2, 'audio/pcm'
+    if codec == 'ulaw':
+        return int(sample_rate), 'audio/basic'
+    return int(bitrate or 128) * 1000 // 8, 'audio/ogg' if codec == 'opus' else 'audio/mpeg'
+
+
+def _fake_audio(size):
+    """Deterministic filler bytes with an MP3 frame header at the front."""
+    header = b'\xff\xfb\x90\x64'
+    if size <= len(header):
+        return header[:max(size, 0)]
+    body = bytes(range(256)) * (size // 256 + 1)
+    return header + body[:size - len(header)]
+
+
+def start_mock_server(config=None, host='127.0.0.1', port=0):
+    """Start the stand-in servers on a background thread.
+
+    Returns the server; its base URL is available as ``server.base_url``.
+    Call ``server.shutdown()`` to stop it.
+    """
+    handler = type('ConfiguredMockHandler', (MockUpstreamHandler,), {'config': config or MockConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.config = handler.config
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_mock_arguments(parser):
+    """Register the stand-in server options on an argparse parser."""
+    parser.add_argument('--chat-latency', default='lognormal:400,0.5', help='Latency spec for chat completions')
+    parser.add_argument('--vision-latency', default='lognormal:1200,0.4', help='Latency spec for vision completions')
+    parser.add_argument('--tts-latency', default='lognormal:300,0.4', help='Latency spec for text-to-speech')
+    parser.add_argument('--stt-latency', default='lognormal:500,0.4', help='Latency spec for speech-to-text')
+    parser.add_argument('--voices-latency', default='fixed:50', help='Latency spec for the voices list')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--stream-chunk-ms', type=float, default=20, help='Delay between streamed chunks')
+    parser.add_argument('--prefill-ms-per-1k', type=float, default=0.0,
+                        help='Extra chat latency per 1000 prompt tokens')
+    parser.add_argument('--connect-ms', type=float, default=0.0,
+                        help='Extra latency on each new connection (TLS handshake)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+
+
+def config_from_args(args):
+    return MockConfig(
+        latency={
+            'chat': args.chat_latency,
+            'vision': args.vision_latency,
+            'tts': args.tts_latency,
+            'stt': args.stt_latency,
+            'voices': args.voices_latency,
+        },
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        stream_chunk_ms=args.stream_chunk_ms,
+        seed=args.seed,
+        prefill_ms_per_1k=args.prefill_ms_per_1k,
+        connect_ms=args.connect_ms,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OpenAI/ElevenLabs stand-in servers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_mock_server(config_from_args(args), host=args.host, port=args.port)
+    print(f"🧪 Mock upstreams listening on {server.base_url}")
+    print(f"   OPENAI_API_BASE={server.base_url}/v1")
+    print(f"   ELEVENLABS_API_BASE={server.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n📊 Requests served:")
+        for name, stats in server.config.stats.items():
+            print(f"   {name}: {stats}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
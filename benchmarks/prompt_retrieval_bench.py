@@ -0,0 +1,123 @@
+"""System prompt size and protocol recall: full prompt vs PROMPT_MODE=retrieval.
+
+    python benchmarks/prompt_retrieval_bench.py
+    python benchmarks/prompt_retrieval_bench.py --protocols 3 --examples 1
+
+Replays the example conversations from the system prompt, the load-test
+sessions and a few extra situations turn by turn, building the system prompt
+for each turn both ways. Reports prompt bytes and tokens per turn, the time
+spent retrieving, and whether each turn's prompt carries the protocol the
+user's words call for (e.g. bleeding that hasn't stopped needs BLEEDING
+CONTROL ESCALATION). Exits 1 if a retrieval prompt misses the always-included
+safety sections or an expected protocol.
+
+Latency against a model is measured by eval_runner.py --prompt-mode full,retrieval.
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import statistics
+import sys
+import time
+
+from eval_runner import builtin_scenarios, load_app
+from load_test import percentile
+from prompt_size_gate import count_tokens, tiktoken
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from treatment_state import TreatmentState  # noqa: E402
+
+# Situations the built-in scenarios don't cover
+EXTRA_SCENARIOS = [
+    ["My finger got cut off by a saw.", "It's bleeding a lot."],
+    ["I scalded my arm with boiling water.", "It's blistering."],
+    ["I feel really nauseous.", "I threw up once."],
+]
+
+# User wording -> protocol the prompt has to include for that turn
+EXPECTED_PROTOCOLS = [
+    (re.compile(r"hasn't stopped|won't stop|still bleeding"), 'BLEEDING CONTROL ESCALATION'),
+    (re.compile(r"can't find"), "IF THE USER CAN'T FIND AN ITEM"),
+    (re.compile(r"cut off|severed"), 'SEVERED BODY PARTS PROTOCOL'),
+    (re.compile(r"\bburn|scald"), 'BURN ASSESSMENT PROTOCOL'),
+    (re.compile(r"faint|dizz|cramp|nause"), 'COMMON SYMPTOMS - TREAT WITH FIRST AID FIRST'),
+]
+
+# Sections every retrieval prompt must still contain
+CORE_SECTIONS = ('AVAILABLE ITEMS:', 'IMPORTANT STYLE & FLOW:', 'EMERGENCY ASSESSMENT FRAMEWORK:',
+                 'NEVER repeat failed treatment methods', 'Opening message (ONLY', 'Examples:',
+                 'Only give instructions using supplies from this kit')
+
+
+def replay(app_module, turns, kit_type='standard'):
+    """Yield (user text, full prompt, retrieval prompt, retrieval seconds) for each turn."""
+    conversation = {'kit_type': kit_type, 'treatment': TreatmentState(), 'messages': []}
+    full = app_module.get_system_prompt(kit_type)
+    for text in turns:
+        conversation['messages'].append({'role': 'user', 'content': text})
+        conversation['treatment'].observe_user(text)
+        start = time.perf_counter()
+        retrieved = app_module.get_system_prompt(kit_type, app_module.prompt_situation(conversation))
+        yield text, full, retrieved, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full vs retrieved system prompt benchmark')
+    parser.add_argument('--protocols', type=int, help='PROMPT_PROTOCOLS_TOP_K (default: the API setting)')
+    parser.add_argument('--examples', type=int, help='PROMPT_EXAMPLES_TOP_K (default: the API setting)')
+    args = parser.parse_args()
+
+    app_module = load_app()
+    if args.protocols is not None:
+        app_module.PROMPT_PROTOCOLS_TOP_K = args.protocols
+    if args.examples is not None:
+        app_module.PROMPT_EXAMPLES_TOP_K = args.examples
+    scenarios = [scenario['turns'] for scenario in builtin_scenarios(app_module)] + EXTRA_SCENARIOS
+
+    full_tokens, retrieved_tokens, full_bytes, retrieved_bytes, timings = [], [], [], [], []
+    misses, expected_total = [], 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = [row for turns in scenarios for row in replay(app_module, turns)]
+    for text, full, retrieved, seconds in rows:
+        full_bytes.append(len(full.encode('utf-8')))
+        retrieved_bytes.append(len(retrieved.encode('utf-8')))
+        full_tokens.append(count_tokens(full))
+        retrieved_tokens.append(count_tokens(retrieved))
+        timings.append(seconds)
+        for section in CORE_SECTIONS:
+            if section not in retrieved:
+                misses.append(f"core section {section!r} missing for {text!r}")
+        for pattern, protocol in EXPECTED_PROTOCOLS:
+            if pattern.search(text.lower()):
+                expected_total += 1
+                if f"\n{protocol}:\n" not in retrieved:
+                    misses.append(f"{protocol} not retrieved for {text!r}")
+
+    method = 'tiktoken' if tiktoken is not None else 'estimated'
+    print(f"📝 {len(rows)} turns from {len(scenarios)} conversations "
+          f"(top {app_module.PROMPT_PROTOCOLS_TOP_K} protocols, top {app_module.PROMPT_EXAMPLES_TOP_K} examples)")
+    print(f"{'':>10} {'bytes':>7} {'tokens':>7} ({method})")
+    print(f"{'full':>10} {statistics.mean(full_bytes):>7.0f} {statistics.mean(full_tokens):>7.0f}")
+    print(f"{'retrieval':>10} {statistics.mean(retrieved_bytes):>7.0f} {statistics.mean(retrieved_tokens):>7.0f}"
+          f"   {1 - sum(retrieved_tokens) / sum(full_tokens):.0%} fewer system prompt tokens per turn")
+    timings.sort()
+    print(f"Retrieval time per turn: p50 {percentile(timings, 50) * 1000:.2f} ms, "
+          f"p99 {percentile(timings, 99) * 1000:.2f} ms")
+    print(f"Expected protocols retrieved: {expected_total - sum('not retrieved' in m for m in misses)}"
+          f"/{expected_total}")
+
+    if misses:
+        print("\n❌ Retrieval prompts are missing content:")
+        for miss in misses:
+            print(f"   {miss}")
+        return 1
+    print("✅ Every retrieval prompt kept the core safety sections and the expected protocols")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Fail when a change grows the compiled per-kit system prompt beyond its budget.
+
+Every chat turn resends the system prompt, so its size is a direct multiplier
+on prompt tokens. Budgets live in prompt_budget.json next to this script.
+
+    python benchmarks/prompt_size_gate.py            # check, exit 1 on regression
+    python benchmarks/prompt_size_gate.py --update   # accept current sizes as the new budget
+"""
+import argparse
+import json
+import os
+import sys
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompt_budget.json')
+
+# Headroom granted when accepting new sizes with --update
+DEFAULT_HEADROOM = 0.05
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+def count_tokens(text):
+    """Exact count with tiktoken when installed, otherwise the ~4 bytes/token estimate."""
+    if tiktoken is not None:
+        return len(tiktoken.get_encoding('o200k_base').encode(text))
+    return (len(text.encode('utf-8')) + 3) // 4
+
+
+def compile_prompts():
+    sys.path.insert(0, API_DIR)
+    os.environ.setdefault('OPENAI_API_KEY', 'prompt-size-gate')
+    import app
+    return {kit['id']: app.get_system_prompt(kit['id']) for kit in app.KITS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-kit system prompt size regression gate')
+    parser.add_argument('--update', action='store_true', help='Rewrite the budget from current sizes')
+    parser.add_argument('--headroom', type=float, default=DEFAULT_HEADROOM,
+                        help='Fractional allowance above current size when updating')
+    args = parser.parse_args()
+
+    prompts = compile_prompts()
+    sizes = {kit_id: len(prompt.encode('utf-8')) for kit_id, prompt in prompts.items()}
+
+    if args.update:
+        budget = {kit_id: {'max_bytes': int(size * (1 + args.headroom))} for kit_id, size in sizes.items()}
+        with open(BUDGET_FILE, 'w') as f:
+            json.dump(budget, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"💾 Wrote budget for {len(budget)} kits to {BUDGET_FILE}")
+        return 0
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+
+    method = 'tiktoken' if tiktoken is not None else 'estimated'
+    print(f"{'kit':>12} {'bytes':>7} {'budget':>7} {'tokens':>7} ({method})")
+    failures = []
+    for kit_id, size in sizes.items():
+        limit = budget.get(kit_id, {}).get('max_bytes')
+        status = 'ok'
+        if limit is None:
+            status = 'NO BUDGET'
+            failures.append(kit_id)
+        elif size > limit:
+            status = 'OVER'
+            failures.append(kit_id)
+        print(f"{kit_id:>12} {size:>7} {limit or '-':>7} {count_tokens(prompts[kit_id]):>7}  {status}")
+
+    if failures:
+        print(f"\n❌ Prompt size budget exceeded for: {', '.join(failures)}")
+        print("   Trim the prompt, or run with --update if the growth is intended.")
+        return 1
+    print("\n✅ All kit prompts within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Repeatable end-to-end benchmark of chat(), text_to_speech() and speech_to_text().
+
+Record once against the live services (needs real API keys):
+    python benchmarks/replay_bench.py sessions.cassette --record
+
+Then benchmark offline as often as needed:
+    python benchmarks/replay_bench.py sessions.cassette --speed 1 --iterations 5
+    python benchmarks/replay_bench.py sessions.cassette --speed 0      # app overhead only
+
+The API is imported in-process and driven through Flask's test client, so the
+numbers cover the request path in app.py plus the replayed upstream timing.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import math
+import os
+import statistics
+import struct
+import sys
+import time
+import wave
+
+from cassette import Cassette, start_cassette_server
+from load_test import SCENARIOS, percentile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+
+def tone_wav(seconds=1.5, rate=16000, frequency=440):
+    """A short mono WAV file so the STT path receives real audio."""
+    frames = b''.join(
+        struct.pack('<h', int(8000 * math.sin(2 * math.pi * frequency * i / rate)))
+        for i in range(int(seconds * rate))
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+def load_app(server):
+    """Import api/app.py pointed at the cassette server (env must be set before import)."""
+    os.environ['OPENAI_API_BASE'] = server.openai_base
+    os.environ['ELEVENLABS_API_BASE'] = server.elevenlabs_base
+    os.environ.setdefault('OPENAI_API_KEY', 'replay-key')
+    os.environ.setdefault('ELEVENLABS_API_KEY', 'replay-key')
+    sys.path.insert(0, API_DIR)
+    import openai
+    openai.api_base = server.openai_base
+    import app
+    return app.app
+
+
+def run_script(client, audio, timings):
+    """Drive every scenario once; returns a digest of all replies for determinism checks."""
+    digest = hashlib.sha256()
+
+    def timed(endpoint, *args, **kwargs):
+        start = time.perf_counter()
+        response = client.post(*args, **kwargs)
+        timings.setdefault(endpoint, []).append(time.perf_counter() - start)
+        digest.update(response.data)
+        return response
+
+    for index, turns in enumerate(SCENARIOS):
+        user_name = f"replay-{index}"
+        client.post('/api/setup', json={'user_name': user_name, 'kit_type': 'standard'})
+        for turn in turns:
+            response = timed('chat', '/api/chat',
+                             json={'user_input': turn, 'user_name': user_name, 'kit_type': 'standard'})
+            reply = (response.get_json() or {}).get('response')
+            if reply:
+                timed('tts', '/api/tts', json={'text': reply})
+        timed('stt', '/api/stt', data={'file': (io.BytesIO(audio), 'recording.wav', 'audio/wav')},
+              content_type='multipart/form-data')
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record/replay benchmark of the API request path')
+    parser.add_argument('cassette', help='Cassette file to record to or replay from')
+    parser.add_argument('--record', action='store_true', help='Record against the live upstreams')
+    parser.add_argument('--upstream', action='append', default=[], metavar='NAME=URL',
+                        help='Override an upstream URL when recording')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed multiplier (0 = no delays)')
+    parser.add_argument('--iterations', type=int, default=3)
+    args = parser.parse_args()
+
+    audio = tone_wav()
+
+    if args.record:
+        cassette = Cassette()
+        upstreams = dict(item.split('=', 1) for item in args.upstream)
+        server = start_cassette_server(cassette, 'record', upstreams=upstreams)
+        client = load_app(server).test_client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_script(client, audio, {})
+        server.shutdown()
+        cassette.save(args.cassette)
+        print(f"💾 Recorded {len(cassette)} interactions to {args.cassette} "
+              f"({os.path.getsize(args.cassette)} bytes)")
+        return
+
+    cassette = Cassette.load(args.cassette)
+    server = start_cassette_server(cassette, 'replay', speed=args.speed)
+    client = load_app(server).test_client()
+    print(f"📼 Replaying {len(cassette)} interactions at speed {args.speed or 'max'}")
+
+    timings, digests = {}, set()
+    for iteration in range(args.iterations):
+        cassette.rewind()
+        start = time.perf_counter()
+        # app.py prints debug output per request; keep it out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            digests.add(run_script(client, audio, timings))
+        print(f"   iteration {iteration + 1}: {time.perf_counter() - start:.2f}s")
+    server.shutdown()
+
+    print(f"\n{'endpoint':>8} {'calls':>6} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for endpoint, values in timings.items():
+        values = sorted(values)
+        print(f"{endpoint:>8} {len(values):>6} {statistics.mean(values) * 1000:>8.1f} "
+              f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f}")
+    print(f"\nDeterministic across iterations: {'yes' if len(digests) == 1 else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Speculative replies: hit rate, wasted tokens and reply latency on the prompt's example sessions.
+
+    python benchmarks/speculation_bench.py
+    python benchmarks/speculation_bench.py --fanout 1,2,3 --latency-ms 800 --think-ms 1500
+
+Replays the system prompt's USER/SOLSTIS example sessions (and the load-test
+sessions) through /api/chat, first without speculation and then with a
+Speculator for each --fanout. The model is a stand-in that answers each user
+turn with the example's reference reply to it (the reply to the same message
+after the same assistant turn) after --latency-ms, so speculative replies to
+"Done." or "Found it." are the ones a real session would get. Other messages
+get a canned reply. Users wait --think-ms between a reply and their next
+message, as they would while carrying out an instruction.
+
+Each session ends after its last reply, so the speculations made for it are
+never taken; the run then moves the Speculator's clock past its session TTL,
+as if those users had left, so they count as missed turns and wasted tokens.
+Reports the hit rate, reply latency for hit and missed turns, the tokens spent
+on served and wasted speculations and the extra spend over no speculation.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+from eval_runner import builtin_scenarios, load_app
+from load_test import percentile
+from mock_upstreams import CANNED_REPLIES
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from speculation import Speculator  # noqa: E402
+
+
+class ReferenceModel:
+    """Answers (previous reply, user message) with the example's reference reply, after a fixed latency."""
+
+    def __init__(self, scenarios, latency):
+        self.latency = latency
+        self.references = {}
+        for scenario in scenarios:
+            previous = None
+            for turn, reference in zip(scenario['turns'], scenario.get('references', [])):
+                self.references[(previous, turn)] = reference
+                previous = reference
+
+    def __call__(self, messages, max_tokens):
+        time.sleep(self.latency)
+        history = [message for message in messages if message['role'] != 'system']
+        previous = history[-2]['content'] if len(history) > 1 else None
+        reply = self.references.get((previous, history[-1]['content']))
+        if reply is None:
+            reply = CANNED_REPLIES[len(history[-1]['content']) % len(CANNED_REPLIES)]
+        usage = {'prompt_tokens': len(json.dumps(messages)) // 4, 'cached_tokens': 0,
+                 'completion_tokens': len(reply) // 4}
+        return reply, usage, self.latency * 1000
+
+
+def replay(app_module, scenarios, think):
+    """Reply latencies in seconds as (follow-up turns, other turns)."""
+    client = app_module.app.test_client()
+    follow_ups, others = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index, scenario in enumerate(scenarios):
+            user_name = f"bench-{index}"
+            client.post('/api/setup', json={'user_name': user_name, 'kit_type': scenario['kit_type']})
+            for position, turn in enumerate(scenario['turns']):
+                if position:
+                    time.sleep(think)
+                start = time.perf_counter()
+                client.post('/api/chat', json={'user_input': turn, 'user_name': user_name,
+                                               'kit_type': scenario['kit_type']})
+                (follow_ups if position else others).append(time.perf_counter() - start)
+    return sorted(follow_ups), sorted(others)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Speculative reply benchmark')
+    parser.add_argument('--fanout', default='1,2,3', help='Comma-separated follow-ups speculated per reply')
+    parser.add_argument('--latency-ms', type=float, default=800, help='Model latency')
+    parser.add_argument('--think-ms', type=float, default=1500, help='User time between a reply and the next turn')
+    parser.add_argument('--session-budget', type=int, default=20000, help='Speculative tokens per session')
+    args = parser.parse_args()
+
+    app_module = load_app()
+    scenarios = builtin_scenarios(app_module)
+    model = ReferenceModel(scenarios, args.latency_ms / 1000)
+    app_module.generate_reply = model
+    turns = sum(len(scenario['turns']) - 1 for scenario in scenarios)
+    print(f"🔮 {len(scenarios)} sessions, {turns} turns after a reply, "
+          f"{args.latency_ms:.0f} ms model latency, {args.think_ms:.0f} ms think time")
+
+    app_module.speculator = None
+    app_module.usage_tracker.kits.clear()
+    baseline, _ = replay(app_module, scenarios, args.think_ms / 1000)
+    baseline_tokens = app_module.usage_tracker.kits['standard']['total_tokens']
+
+    print(f"{'fanout':>7} {'hit rate':>9} {'p50 ms':>8} {'hit p50':>8} {'miss p50':>9} {'launched':>9} "
+          f"{'expired':>8} {'used tok':>9} {'wasted tok':>11} {'extra spend':>12}")
+    print(f"{'off':>7} {'':>9} {percentile(baseline, 50) * 1000:>8.1f}")
+    for fanout in [int(value) for value in args.fanout.split(',')]:
+        speculator = app_module.speculator = Speculator(model, fanout=fanout, session_budget=args.session_budget)
+        latencies, _ = replay(app_module, scenarios, args.think_ms / 1000)
+        speculator.executor.shutdown(wait=True)
+        # Every session is over: let the idle ones expire
+        speculator.clock = lambda: time.time() + speculator.session_ttl + 60
+        stats = speculator.snapshot()
+        hits = [latency for latency in latencies if latency < model.latency / 2]
+        misses = [latency for latency in latencies if latency >= model.latency / 2]
+        # A served speculation replaces a model call; only the wasted ones add spend
+        extra = stats['wasted_tokens'] / baseline_tokens
+        print(f"{fanout:>7} {stats['hit_rate']:>9.1%} {percentile(latencies, 50) * 1000:>8.1f} "
+              f"{percentile(hits, 50) * 1000 if hits else 0:>8.1f} "
+              f"{percentile(misses, 50) * 1000 if misses else 0:>9.1f} {stats['launched']:>9} "
+              f"{stats['expired']:>8} {stats['used_tokens']:>9} {stats['wasted_tokens']:>11} {extra:>12.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Streaming speech-to-text: end of speech to final transcript, WebSocket stream vs upload after silence.
+
+    python benchmarks/stt_stream_bench.py
+    python benchmarks/stt_stream_bench.py --utterances 10 --stt-latency-ms 500 --endpoint-ms 400
+
+Serves api/app.py on a local port against the stand-in upstreams, whose
+speech-to-text answers after --stt-latency-ms. Each utterance is synthetic
+16 kHz speech (tone bursts for words, short gaps between them) followed by
+silence, sent in real time as 20 ms frames:
+
+    stream   over /api/stt/stream, as VoiceRecorder now sends it; the server
+             ends the utterance --endpoint-ms after the last word
+    upload   as VoiceRecorder used to: wait --silence-ms of quiet, then POST
+             the whole recording to /api/stt
+
+For each it reports the time from the end of speech to the final transcript
+(p50/p99), and for the stream the time from the start of speech to the first
+partial transcript and the number of partials per utterance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+import simple_websocket
+from werkzeug.serving import make_server
+
+from eval_runner import load_app
+from load_test import free_port, percentile
+from mock_upstreams import MockConfig, start_mock_server
+from streaming_stt import pcm_to_wav
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+
+
+def utterance(words, rng):
+    """(PCM of the speech, PCM of the trailing silence)."""
+    speech = []
+    for index in range(words):
+        frequency = rng.uniform(150, 300)
+        for sample in range(int(SAMPLE_RATE * rng.uniform(0.2, 0.35))):
+            speech.append(int(4000 * math.sin(2 * math.pi * frequency * sample / SAMPLE_RATE)
+                              + rng.gauss(0, 200)))
+        if index < words - 1:
+            speech += [int(rng.gauss(0, 60)) for _ in range(int(SAMPLE_RATE * 0.06))]
+    pcm = b''.join(max(-32768, min(32767, value)).to_bytes(2, 'little', signed=True) for value in speech)
+    silence = b''.join(int(rng.gauss(0, 60)).to_bytes(2, 'little', signed=True) for _ in range(SAMPLE_RATE * 3))
+    return pcm, silence
+
+
+def frames(pcm):
+    size = SAMPLE_RATE * FRAME_MS // 1000 * 2
+    return [pcm[start:start + size] for start in range(0, len(pcm), size)]
+
+
+def stream(base_url, speech, silence):
+    """(end of speech to final, start of speech to first partial or None, partials)."""
+    ws = simple_websocket.Client(f"{base_url.replace('http', 'ws')}/api/stt/stream")
+    received = []
+
+    def receive():
+        try:
+            while True:
+                message = json.loads(ws.receive())
+                received.append((time.perf_counter(), message))
+                if message['type'] in ('final', 'error'):
+                    return
+        except simple_websocket.ConnectionClosed:
+            pass
+
+    receiver = threading.Thread(target=receive)
+    receiver.start()
+    ws.send(json.dumps({'type': 'start', 'sample_rate': SAMPLE_RATE}))
+    start = time.perf_counter()
+    sent = 0
+    speech_end = None
+    for frame in frames(speech) + frames(silence):
+        if not receiver.is_alive():
+            break  # the server closes the socket once the final transcript is sent
+        try:
+            ws.send(frame)
+        except simple_websocket.ConnectionClosed:
+            break
+        sent += len(frame)
+        if speech_end is None and sent >= len(speech):
+            speech_end = time.perf_counter()
+        # Real time: the next frame is captured FRAME_MS later
+        time.sleep(max(0.0, start + sent / 2 / SAMPLE_RATE - time.perf_counter()))
+    receiver.join(timeout=10)
+    with contextlib.suppress(simple_websocket.ConnectionClosed):
+        ws.close()
+    final = [at for at, message in received if message['type'] == 'final']
+    partials = [at for at, message in received if message['type'] == 'partial']
+    if not final:
+        raise RuntimeError(f"No final transcript: {[message for _, message in received]}")
+    return final[0] - speech_end, (partials[0] - start) if partials else None, len(partials)
+
+
+def upload(base_url, speech, silence_ms):
+    """End of speech to transcript when the client waits for silence, then uploads the recording."""
+    time.sleep(silence_ms / 1000)
+    silence = b'\x00\x00' * int(SAMPLE_RATE * silence_ms / 1000)
+    start = time.perf_counter()
+    response = requests.post(f"{base_url}/api/stt", timeout=30, files={
+        'file': ('recording.wav', pcm_to_wav(speech + silence, SAMPLE_RATE), 'audio/wav')})
+    response.raise_for_status()
+    return silence_ms / 1000 + time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming speech-to-text benchmark')
+    parser.add_argument('--utterances', type=int, default=5)
+    parser.add_argument('--words', type=int, default=8, help='Words per utterance')
+    parser.add_argument('--stt-latency-ms', type=float, default=400, help='Stand-in speech-to-text latency')
+    parser.add_argument('--endpoint-ms', type=int, default=500, help='Silence that ends a streamed utterance')
+    parser.add_argument('--silence-ms', type=int, default=2000, help="Upload client's silence wait")
+    args = parser.parse_args()
+
+    upstream = start_mock_server(MockConfig(latency={'stt': f"fixed:{args.stt_latency_ms}"}))
+    os.environ['ELEVENLABS_API_BASE'] = upstream.base_url
+    os.environ['ELEVENLABS_API_KEY'] = 'bench-key'
+    os.environ['STT_ENDPOINT_MS'] = str(args.endpoint_ms)
+    app_module = load_app()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    port = free_port()
+    server = make_server('127.0.0.1', port, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+
+    rng = random.Random(7)
+    utterances = [utterance(args.words, rng) for _ in range(args.utterances)]
+    speech_s = sum(len(speech) for speech, _ in utterances) / len(utterances) / 2 / SAMPLE_RATE
+    print(f"🎙️ {args.utterances} utterances of {speech_s:.1f} s, STT {args.stt_latency_ms:.0f} ms, "
+          f"endpoint {args.endpoint_ms} ms, upload silence wait {args.silence_ms} ms")
+
+    finals, first_partials, partial_counts, uploads = [], [], [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for speech, silence in utterances:
+            final, first_partial, partials = stream(base_url, speech, silence)
+            finals.append(final)
+            partial_counts.append(partials)
+            if first_partial is not None:
+                first_partials.append(first_partial)
+            uploads.append(upload(base_url, speech, args.silence_ms))
+    server.shutdown()
+    upstream.shutdown()
+
+    print(f"{'':>8} {'end of speech to final p50 ms':>30} {'p99 ms':>8}")
+    for name, values in (('stream', sorted(finals)), ('upload', sorted(uploads))):
+        print(f"{name:>8} {percentile(values, 50) * 1000:>30.0f} {percentile(values, 99) * 1000:>8.0f}")
+    if first_partials:
+        print(f"First partial {percentile(sorted(first_partials), 50) * 1000:.0f} ms after speech began (p50), "
+              f"{sum(partial_counts) / len(partial_counts):.1f} partials per utterance")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Training data preparation: memory of reading a conversation journal, whole-file vs streamed.
+
+    python benchmarks/training_data_bench.py
+    python benchmarks/training_data_bench.py --sessions 5000,20000,80000 --concurrent 500 --max-open-sessions 2000
+
+Writes a synthetic journal directory like the API's: a snapshot holding half
+of the sessions, then a segment in which the other half chat --concurrent at
+a time and go idle without being cleared, as sessions do when users just
+leave. It then reads the dialogs back with "development files/
+prepare_training_data.py" two ways:
+
+    whole-file    the previous reader: json.load() of the snapshot, and every
+                  session kept open until the end of the input
+    streamed      read_dialogs(): the snapshot decoded one session at a time,
+                  at most --max-open-sessions held at once
+
+For each it reports the dialogs read, the time and the peak Python heap
+(tracemalloc), and checks that both readers return the same dialogs. Then it
+runs build_dataset() on the largest journal, and checks that dialogs that
+differ only in case and spacing are deduplicated while dialogs that differ in
+a number are both kept, and that an emergency dialog (the directive and the
+model's reply logged as two assistant turns) is kept as one reply.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DEV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'development files')
+sys.path.insert(0, DEV_DIR)
+
+from prepare_training_data import build_dataset, expand_inputs, read_dialogs  # noqa: E402
+
+TURNS = [
+    ("I cut my finger with a kitchen knife. It's bleeding a lot.",
+     "I'm here to help. Press the gauze firmly on the cut and hold it for 5 minutes."),
+    ("Okay, I'm pressing on it now.", "Good. Keep steady pressure. Let me know when 5 minutes have passed."),
+    ("It's been 5 minutes and it stopped.", "Great. Rinse it gently with clean water, then put on a bandage."),
+]
+
+
+def dialog(index):
+    messages = []
+    for user, assistant in TURNS:
+        messages.append({'role': 'user', 'content': f"{user} (session {index})"})
+        messages.append({'role': 'assistant', 'content': assistant})
+    return messages
+
+
+def write_journal(directory, sessions, concurrent):
+    """A snapshot with the first half of the sessions, and a segment in which the rest chat `concurrent` at a time."""
+    half = sessions // 2
+    snapshot = {
+        'sessions': {f"s{index}": {'kit_type': 'standard', 'messages': dialog(index)} for index in range(half)},
+        'last_active': {f"s{index}": 0 for index in range(half)},
+    }
+    with open(os.path.join(directory, 'snapshot-00000001.json'), 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    del snapshot
+    with open(os.path.join(directory, 'journal-00000001.log'), 'w') as f:
+        for start in range(half, sessions, concurrent):
+            window = range(start, min(start + concurrent, sessions))
+            for index in window:
+                f.write(json.dumps({'op': 'setup', 's': f"s{index}", 'kit': 'standard', 't': 0}) + '\n')
+            for n in range(len(TURNS) * 2):
+                for index in window:
+                    f.write(json.dumps({'op': 'msg', 's': f"s{index}", 'kit': 'standard', 'n': n,
+                                        'm': dialog(index)[n], 't': 0}, separators=(',', ':')) + '\n')
+
+
+def whole_file_dialogs(paths):
+    """The previous reader: whole snapshot in memory, every session open until the end."""
+    open_sessions = {}
+    for path in expand_inputs(paths):
+        with open(path) as f:
+            if os.path.basename(path).startswith('snapshot-'):
+                for session_id, conversation in json.load(f)['sessions'].items():
+                    open_sessions[session_id] = conversation['messages']
+                continue
+            for line in f:
+                record = json.loads(line)
+                if record.get('op') in ('setup', 'clear'):
+                    finished = open_sessions.pop(record['s'], None)
+                    if finished:
+                        yield finished
+                elif record.get('op') == 'msg':
+                    messages = open_sessions.setdefault(record['s'], [])
+                    if record['n'] == len(messages):
+                        messages.append(record['m'])
+    yield from open_sessions.values()
+
+
+def measure(dialogs):
+    """(dialog count, order-independent digest, seconds, peak heap MB) of consuming `dialogs`."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    count, digest = 0, 0
+    for messages in dialogs:
+        count += 1
+        digest ^= int.from_bytes(hashlib.blake2b(json.dumps(messages).encode(), digest_size=8).digest(), 'little')
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return count, digest, elapsed, peak
+
+
+def check_dedup(directory):
+    """Case and spacing variants are one dialog; a changed number is a different one."""
+    base = dialog(0)
+    variants = [
+        base,
+        [dict(m, content=m['content'].upper()) for m in base],
+        [dict(m, content=m['content'].replace(' ', '  ')) for m in base],
+        [dict(m, content=m['content'].replace('5 minutes', '15 minutes')) for m in base],
+    ]
+    path = os.path.join(directory, 'variants.jsonl')
+    with open(path, 'w') as f:
+        for messages in variants:
+            f.write(json.dumps({'messages': messages}) + '\n')
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = build_dataset([path], os.path.join(directory, 'variants'), workers=1, dedup_capacity=1000)
+    return stats['written'] == 2 and stats['duplicates'] == 2
+
+
+def check_emergency_dialog(directory):
+    """The directive and the reply that follows it become one assistant turn."""
+    messages = [
+        {'role': 'user', 'content': "He's not breathing"},
+        {'role': 'assistant', 'content': "Call 911 now. Start chest compressions."},
+        {'role': 'assistant', 'content': "Push hard and fast in the center of the chest."},
+    ]
+    path = os.path.join(directory, 'emergency.jsonl')
+    with open(path, 'w') as f:
+        f.write(json.dumps({'messages': messages}) + '\n')
+    output = os.path.join(directory, 'emergency')
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = build_dataset([path], output, workers=1)
+    if stats['written'] != 1:
+        return False
+    with open(os.path.join(output, os.listdir(output)[0])) as f:
+        reply = json.loads(f.readline())['messages'][-1]
+    return reply == {'role': 'assistant', 'content': messages[1]['content'] + '\n\n' + messages[2]['content']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Training data preparation memory benchmark')
+    parser.add_argument('--sessions', default='5000,20000,80000', help='Sessions in each synthetic journal')
+    parser.add_argument('--concurrent', type=int, default=500, help='Sessions chatting at once in the segment')
+    parser.add_argument('--max-open-sessions', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=2, help='Conversion processes for build_dataset()')
+    args = parser.parse_args()
+
+    print(f"🗂️ Journal read, {args.concurrent} sessions at once, streamed reader holds at most "
+          f"{args.max_open_sessions}")
+    print(f"{'sessions':>9} {'input MB':>9} {'reader':>11} {'dialogs':>8} {'s':>6} {'peak MB':>8}")
+    ok = True
+    directory = tempfile.mkdtemp(prefix='solstis-training-')
+    try:
+        for sessions in (int(x) for x in args.sessions.split(',')):
+            journal = os.path.join(directory, f"journal-{sessions}")
+            os.makedirs(journal)
+            write_journal(journal, sessions, args.concurrent)
+            size = sum(os.path.getsize(os.path.join(journal, name)) for name in os.listdir(journal)) / 1024 / 1024
+            results = {
+                'whole-file': measure(whole_file_dialogs([journal])),
+                'streamed': measure(read_dialogs([journal], args.max_open_sessions, max_messages=1000)),
+            }
+            for reader, (count, _, elapsed, peak) in results.items():
+                print(f"{sessions:>9} {size:>9.1f} {reader:>11} {count:>8} {elapsed:>6.2f} {peak:>8.1f}")
+            same = results['whole-file'][:2] == results['streamed'][:2]
+            ok = ok and same
+            if not same:
+                print("   ❌ the readers returned different dialogs")
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = build_dataset([journal], os.path.join(directory, 'shards'), workers=args.workers,
+                                  max_open_sessions=args.max_open_sessions)
+        print(f"build_dataset({sessions} sessions): {stats['written']} written, {stats['duplicates']} duplicates, "
+              f"{stats['too_long']} too long in {time.perf_counter() - start:.1f} s")
+        dedup_ok = check_dedup(directory)
+        print(f"   {'✅' if dedup_ok else '❌'} case/spacing variants dropped, a changed number kept")
+        emergency_ok = check_emergency_dialog(directory)
+        print(f"   {'✅' if emergency_ok else '❌'} emergency directive and reply kept as one assistant turn")
+        ok = ok and dedup_ok and emergency_ok
+    finally:
+        shutil.rmtree(directory)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Prompt tokens and latency per turn: raw history vs the treatment-state block.
+
+    python benchmarks/treatment_state_bench.py
+    python benchmarks/treatment_state_bench.py --turns 40 --prefill-ms-per-1k 150
+
+Drives one long scripted session through /api/chat in-process against the
+stand-in upstreams, once per history mode:
+
+    untruncated   every stored turn is sent (what the prompt would need to keep
+                  all context without the state block)
+    last-10       the current default, PROMPT_HISTORY_MODE=full
+    state         PROMPT_HISTORY_MODE=state: state block + last few turns
+
+Prompt tokens come from the stand-in's usage estimate (JSON length / 4). With
+--prefill-ms-per-1k the stand-in also charges latency per prompt token, so the
+latency column reflects prompt size. The last sections replay the example
+dialog from the system prompt through the tracker and check that the failed
+treatments and the escalation survive, and that negated improvements ("not
+getting better") mark the treatment failed.
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import statistics
+import sys
+import time
+
+from load_test import SCENARIOS
+from mock_upstreams import MockConfig, start_mock_server
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+MODES = ('untruncated', 'last-10', 'state')
+
+# (user reply after "apply pressure", expected status of direct pressure)
+OUTCOME_REPLIES = [
+    ("It stopped.", 'worked'),
+    ("Much better now, thanks", 'worked'),
+    ("I'm not sure, but I think it stopped", 'worked'),
+    ("It is not getting better", 'failed'),
+    ("It hasn't slowed at all", 'failed'),
+    ("The bleeding has not stopped", 'failed'),
+    ("It's not any better", 'failed'),
+    ("It never really stopped", 'failed'),
+    ("It still hasn't stopped", 'failed'),
+    ("Done", 'done'),
+]
+
+
+def load_app(upstream):
+    os.environ['OPENAI_API_BASE'] = f"{upstream.base_url}/v1"
+    os.environ['OPENAI_API_KEY'] = 'bench-key'
+    os.environ.pop('CONVERSATION_JOURNAL_DIR', None)
+    import openai
+    openai.api_base = f"{upstream.base_url}/v1"
+    import app
+    return app
+
+
+def run_session(app_module, mode, turns):
+    """Return (prompt tokens, latency seconds) for each turn of one long session."""
+    user_name = f"bench-{mode}"
+    app_module.PROMPT_HISTORY_MODE = 'state' if mode == 'state' else 'full'
+    tracker = app_module.usage_tracker
+    original_limits = tracker.limits_for
+    if mode == 'untruncated':
+        tracker.limits_for = lambda session_id: (10 ** 6, original_limits(session_id)[1])
+
+    script = [turn for scenario in SCENARIOS for turn in scenario]
+    client = app_module.app.test_client()
+    client.post('/api/setup', json={'user_name': user_name, 'kit_type': 'standard'})
+    results = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for index in range(turns):
+                before = tracker.sessions.get(user_name, {}).get('prompt_tokens', 0)
+                start = time.perf_counter()
+                client.post('/api/chat', json={'user_input': script[index % len(script)],
+                                               'user_name': user_name, 'kit_type': 'standard'})
+                elapsed = time.perf_counter() - start
+                results.append((tracker.sessions[user_name]['prompt_tokens'] - before, elapsed))
+    finally:
+        tracker.limits_for = original_limits
+    return results
+
+
+def bench_modes(turns, prefill_ms_per_1k, chat_latency):
+    upstream = start_mock_server(MockConfig(latency={'chat': chat_latency}, seed=7,
+                                            prefill_ms_per_1k=prefill_ms_per_1k))
+    app_module = load_app(upstream)
+    run_session(app_module, 'last-10', 5)  # warm up imports and connections
+
+    print(f"💬 One session of {turns} turns, prefill {prefill_ms_per_1k:g} ms per 1k prompt tokens")
+    print(f"{'mode':>12} {'tokens t1':>10} {'t10':>6} {f't{turns}':>6} {'mean':>6} {'total':>8} "
+          f"{'mean ms':>8} {'last ms':>8}")
+    totals = {}
+    for mode in MODES:
+        results = run_session(app_module, mode, turns)
+        tokens = [t for t, _ in results]
+        latencies = [s for _, s in results]
+        totals[mode] = sum(tokens)
+        print(f"{mode:>12} {tokens[0]:>10} {tokens[min(9, turns - 1)]:>6} {tokens[-1]:>6} "
+              f"{statistics.mean(tokens):>6.0f} {sum(tokens):>8} "
+              f"{statistics.mean(latencies) * 1000:>8.1f} {latencies[-1] * 1000:>8.1f}")
+    upstream.shutdown()
+    print(f"   state vs untruncated: {totals['state'] / totals['untruncated']:.0%} of prompt tokens; "
+          f"vs last-10: {totals['state'] / totals['last-10']:.0%}")
+    return app_module
+
+
+def check_example_dialog(app_module):
+    """Replay the prompt's example dialog and check the safety-critical facts survive."""
+    from treatment_state import TreatmentState
+
+    examples = app_module.get_system_prompt('standard').split('Examples:')[1]
+    # The first example conversation ends with the call to 9-1-1
+    pairs = re.findall(r'USER: (.*)\nSOLSTIS: (.*)', examples)[:8]
+    kit = next(k for k in app_module.KITS if k['id'] == 'standard')
+    state = TreatmentState()
+    start = time.perf_counter()
+    for user_text, assistant_text in pairs:
+        state.observe_user(user_text)
+        state.observe_assistant(assistant_text, kit)
+    per_turn_us = (time.perf_counter() - start) / (2 * len(pairs)) * 1e6
+
+    failed = {name for name, status in state.treatments.items() if status == 'failed'}
+    checks = {
+        'direct pressure marked failed': 'direct pressure' in failed,
+        'hemostatic gauze marked failed': 'hemostatic gauze' in failed,
+        'escalation is emergency': state.escalation == 'emergency',
+        'block tells the model not to repeat': 'Do NOT repeat' in state.to_prompt_block(),
+    }
+    print(f"\n🩹 Example dialog ({len(pairs)} exchanges, {per_turn_us:.1f} µs per observed turn)")
+    print(state.to_prompt_block())
+    for label, passed in checks.items():
+        print(f"   {'✅' if passed else '❌'} {label}")
+    return all(checks.values())
+
+
+def check_outcome_replies():
+    """Each reply to a pressure instruction must leave direct pressure with the expected status."""
+    from treatment_state import TreatmentState
+
+    print(f"\n🗨️ Outcome replies ({len(OUTCOME_REPLIES)})")
+    passed_all = True
+    for reply, expected in OUTCOME_REPLIES:
+        state = TreatmentState()
+        state.observe_assistant("Apply pressure to the cut with the gauze.")
+        state.observe_user(reply)
+        status = state.treatments['direct pressure']
+        passed_all = passed_all and status == expected
+        print(f"   {'✅' if status == expected else '❌'} {reply!r}: {status} (expected {expected})")
+    return passed_all
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Treatment-state prompt benchmark')
+    parser.add_argument('--turns', type=int, default=30, help='User turns in the session')
+    parser.add_argument('--prefill-ms-per-1k', type=float, default=100.0,
+                        help='Stand-in latency per 1000 prompt tokens')
+    parser.add_argument('--chat-latency', default='fixed:50', help='Base stand-in chat latency spec')
+    args = parser.parse_args()
+
+    app_module = bench_modes(args.turns, args.prefill_ms_per_1k, args.chat_latency)
+    dialog_ok = check_example_dialog(app_module)
+    if not (check_outcome_replies() and dialog_ok):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Text-to-speech formats: bytes per second of speech for each negotiated format, and Range requests on cached audio.
+
+    python benchmarks/tts_format_bench.py
+    python benchmarks/tts_format_bench.py --tts-latency-ms 400 --link-kbps 128
+
+Serves api/app.py on a local port against the stand-in upstreams, whose TTS
+answers after --tts-latency-ms with audio sized by the requested output
+format. For each format, asked for with parameters or an Accept header, it
+reports:
+
+    bytes/s       audio bytes per second of speech
+    first ms      the first request, synthesized
+    cached ms     the same audio again as a GET, from the cache
+    link s        time to download the reply over a --link-kbps connection
+
+Then it resumes a download halfway with a Range request, and checks that the
+206 response carries exactly the rest of the audio.
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+from eval_runner import load_app
+from load_test import free_port
+from mock_upstreams import CHARS_PER_SECOND, MockConfig, start_mock_server
+
+REPLY = ("From the highlighted space, take the small gauze. Press gently on the cut for five minutes, "
+         "then let me know when you're done.")
+
+# (label, JSON fields, headers)
+REQUESTS = [
+    ('mp3 (default)', {}, {}),
+    ('mp3 32 kbps', {'format': 'mp3', 'bitrate': 32}, {}),
+    ('opus (Accept)', {}, {'Accept': 'audio/ogg'}),
+    ('opus 64 kbps', {'format': 'opus', 'bitrate': 64}, {}),
+    ('pcm (Accept)', {}, {'Accept': 'audio/pcm, audio/mpeg;q=0.5'}),
+    ('pcm 24 kHz', {'format': 'pcm', 'sample_rate': 24000}, {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Text-to-speech format benchmark')
+    parser.add_argument('--tts-latency-ms', type=float, default=300, help='Stand-in text-to-speech latency')
+    parser.add_argument('--link-kbps', type=float, default=256, help='Client connection speed for the link column')
+    args = parser.parse_args()
+
+    upstream = start_mock_server(MockConfig(latency={'tts': f"fixed:{args.tts_latency_ms}"}))
+    os.environ['ELEVENLABS_API_BASE'] = upstream.base_url
+    os.environ['ELEVENLABS_API_KEY'] = 'bench-key'
+    os.environ['WARM_START_TTS'] = '0'
+    app_module = load_app()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    port = free_port()
+    server = make_server('127.0.0.1', port, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{port}/api/tts"
+    speech_seconds = len(REPLY) / CHARS_PER_SECOND
+    print(f"🔊 {speech_seconds:.1f} s reply, TTS {args.tts_latency_ms:.0f} ms, link {args.link_kbps:.0f} kbps")
+
+    print(f"{'':>14} {'output format':>14} {'bytes':>7} {'bytes/s':>8} {'first ms':>9} {'cached ms':>10} "
+          f"{'link s':>7}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = []
+        for label, fields, headers in REQUESTS:
+            start = time.perf_counter()
+            first = requests.post(url, json=dict(fields, text=REPLY), headers=headers, timeout=30)
+            first_ms = (time.perf_counter() - start) * 1000
+            first.raise_for_status()
+            start = time.perf_counter()
+            cached = requests.get(url, params=dict(fields, text=REPLY), headers=headers, timeout=30)
+            cached_ms = (time.perf_counter() - start) * 1000
+            if cached.content != first.content:
+                raise RuntimeError(f"{label}: cached audio differs")
+            rows.append((label, first.headers['X-Audio-Format'], len(first.content), first_ms, cached_ms))
+    for label, output_format, size, first_ms, cached_ms in rows:
+        print(f"{label:>14} {output_format:>14} {size:>7} {size / speech_seconds:>8.0f} {first_ms:>9.0f} "
+              f"{cached_ms:>10.1f} {size * 8 / 1000 / args.link_kbps:>7.2f}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        full = requests.get(url, params={'text': REPLY}, timeout=30).content
+        half = len(full) // 2
+        start = time.perf_counter()
+        resumed = requests.get(url, params={'text': REPLY}, headers={'Range': f"bytes={half}-"}, timeout=30)
+        resumed_ms = (time.perf_counter() - start) * 1000
+    ok = resumed.status_code == 206 and resumed.content == full[half:]
+    print(f"Resume at byte {half}: {resumed.status_code} {resumed.headers.get('Content-Range')}, "
+          f"{len(resumed.content)} bytes in {resumed_ms:.1f} ms, {'matches' if ok else 'DOES NOT match'} the rest")
+    print(f"Cache: {app_module.tts_cache.snapshot()}")
+    server.shutdown()
+    upstream.shutdown()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Latency and accuracy of /api/typeahead completions.
+
+    python benchmarks/typeahead_bench.py
+    python benchmarks/typeahead_bench.py --top-k 5 --typo-queries 2000
+
+Queries are prefixes of every kit item name and knowledge-base symptom, as a
+user would type them letter by letter, plus the same prefixes with one typo
+(a swapped, dropped or changed letter). For each set it reports how often the
+intended completion is in the top k, and server-side latency percentiles for
+the first lookup of a query and for repeated lookups. Completions from another
+kit's contents count as failures.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from eval_runner import load_app
+from load_test import percentile
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+sys.path.insert(0, API_DIR)
+
+from typeahead import TypeaheadIndex, normalize  # noqa: E402
+
+
+def typed_prefixes(text, minimum=2):
+    typed = ' '.join(normalize(text))
+    return [typed[:length] for length in range(minimum, len(typed) + 1) if typed[length - 1] != ' ']
+
+
+def add_typo(query, rng):
+    positions = [i for i in range(1, len(query) - 1) if query[i].isalpha() and query[i + 1].isalpha()]
+    if not positions:
+        return None
+    i = rng.choice(positions)
+    kind = rng.choice(('swap', 'drop', 'change'))
+    if kind == 'swap':
+        return query[:i] + query[i + 1] + query[i] + query[i + 2:]
+    if kind == 'drop':
+        return query[:i] + query[i + 1:]
+    return query[:i] + rng.choice('aeioustrn'.replace(query[i], '')) + query[i + 1:]
+
+
+def build_queries(app_module, rng, typo_queries):
+    """(query, kit id, expected completion text) for prefixes of items and symptoms."""
+    exact = []
+    for kit in app_module.KITS:
+        for item in kit['contents']:
+            exact.extend((prefix, kit['id'], item['item']) for prefix in typed_prefixes(item['item'], 3))
+    for section in ('protocols', 'emergencies', 'procedures'):
+        for data in app_module.prompt_knowledge.knowledge_base[section].values():
+            for symptom in data.get('symptoms', []):
+                exact.extend((prefix, 'standard', symptom) for prefix in typed_prefixes(symptom, 4))
+    typos = []
+    candidates = [q for q in exact if len(q[0]) >= 5]
+    while len(typos) < typo_queries:
+        query, kit_id, expected = rng.choice(candidates)
+        mistyped = add_typo(query, rng)
+        if mistyped:
+            typos.append((mistyped, kit_id, expected))
+    return exact, typos
+
+
+def run(index, app_module, queries, top_k):
+    kit_items = {kit['id']: {item['item'] for item in kit['contents']} for kit in app_module.KITS}
+    all_items = set().union(*kit_items.values())
+    hits, foreign, first, repeat = 0, 0, [], []
+    for query, kit_id, expected in queries:
+        start = time.perf_counter()
+        completions = index.complete(query, kit_id, top_k)
+        first.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        index.complete(query, kit_id, top_k)
+        repeat.append(time.perf_counter() - start)
+        texts = [c['text'] for c in completions]
+        hits += expected in texts
+        foreign += any(text in all_items and text not in kit_items[kit_id] for text in texts)
+    return hits, foreign, sorted(first), sorted(repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Typeahead latency and accuracy benchmark')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--typo-queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    start = time.perf_counter()
+    index = TypeaheadIndex(app_module.KITS, app_module.prompt_knowledge)
+    build_ms = (time.perf_counter() - start) * 1000
+    exact, typos = build_queries(app_module, random.Random(args.seed), args.typo_queries)
+    print(f"🔤 {len(index.completions)} completions across {len(app_module.KITS)} kits, "
+          f"indexed in {build_ms:.0f} ms")
+
+    print(f"{'queries':>16} {'count':>6} {'in top-' + str(args.top_k):>9} {'other kit':>10} "
+          f"{'first p50':>10} {'first p99':>10} {'again p99':>10}  (µs)")
+    failed = False
+    for label, queries in (('prefix', exact), ('prefix + typo', typos)):
+        hits, foreign, first, repeat = run(index, app_module, queries, args.top_k)
+        failed |= bool(foreign) or percentile(first, 99) > 0.001
+        print(f"{label:>16} {len(queries):>6} {hits / len(queries):>9.1%} {foreign:>10} "
+              f"{percentile(first, 50) * 1e6:>10.0f} {percentile(first, 99) * 1e6:>10.0f} "
+              f"{percentile(repeat, 99) * 1e6:>10.0f}")
+    if failed:
+        print("\n❌ Completions leaked across kits or p99 exceeded 1 ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
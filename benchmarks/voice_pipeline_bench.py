@@ -0,0 +1,192 @@
+"""Voice loop: end of speech to first audio, sequential vs pipelined, and how fast barge-in silences a reply.
+
+    python benchmarks/voice_pipeline_bench.py
+    python benchmarks/voice_pipeline_bench.py --turns 5 --stt-ms 500 --first-token-ms 400 --tts-first-ms 250
+
+Runs "development files/voice_pipeline.py" against a scripted microphone and
+a speaker that takes real time to play, with stand-in backends:
+transcription after --stt-ms, a reply that streams its first token after
+--first-token-ms and the rest every --token-ms, and TTS that starts after
+--tts-first-ms and delivers audio faster than it plays.
+
+    sequential   the same stand-ins called one after another, as run() did:
+                 transcribe, wait for the whole reply, synthesize all of it
+    pipelined    VoicePipeline: sentences are synthesized and played while
+                 the reply is still streaming
+
+Both are timed from the moment end of speech is detected. Then --turns more
+turns are interrupted by the user 1 s into the reply. For those it reports
+the time from the start of the interruption to the reply going silent, and
+checks that only the sentences that were played were kept in the history.
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from load_test import percentile
+
+DEV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'development files')
+sys.path.insert(0, DEV_DIR)
+
+from voice_pipeline import FRAME_BYTES, FRAME_MS, SAMPLE_RATE, VoicePipeline  # noqa: E402
+
+TRANSCRIPT = "I cut my finger with a kitchen knife and it's bleeding a lot."
+REPLY = ("I'm here to help. Grab the gauze pads from the box lit up in blue. Press one firmly on the cut and "
+         "raise your hand above your heart. Keep steady pressure for five minutes without lifting to check. "
+         "Let me know when you've done that.")
+WORDS_PER_SECOND = 2.5
+
+
+def tone(seconds, amplitude=4000, frequency=220):
+    samples = int(SAMPLE_RATE * seconds)
+    return b''.join(int(amplitude * math.sin(2 * math.pi * frequency * index / SAMPLE_RATE))
+                    .to_bytes(2, 'little', signed=True) for index in range(samples))
+
+
+class ScriptedDevice:
+    """A microphone that reads queued speech (or silence) in real time, and a speaker that plays in real time."""
+
+    def __init__(self):
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.frames_read = 0
+        self.writes = []  # (start, end) of each write
+
+    def say(self, pcm):
+        with self.lock:
+            for start in range(0, len(pcm), FRAME_BYTES):
+                self.pending.append(pcm[start:start + FRAME_BYTES].ljust(FRAME_BYTES, b'\x00'))
+
+    def read(self):
+        self.frames_read += 1
+        time.sleep(max(0.0, self.started + self.frames_read * FRAME_MS / 1000 - time.perf_counter()))
+        with self.lock:
+            return self.pending.popleft() if self.pending else b'\x00' * FRAME_BYTES
+
+    def write(self, pcm):
+        start = time.perf_counter()
+        time.sleep(len(pcm) / 2 / SAMPLE_RATE)
+        self.writes.append((start, time.perf_counter()))
+
+
+class StandIns:
+    def __init__(self, stt_ms, first_token_ms, token_ms, tts_first_ms):
+        self.stt = stt_ms / 1000
+        self.first_token = first_token_ms / 1000
+        self.token = token_ms / 1000
+        self.tts_first = tts_first_ms / 1000
+
+    def transcribe(self, pcm):
+        time.sleep(self.stt)
+        return TRANSCRIPT
+
+    def stream_reply(self, messages):
+        time.sleep(self.first_token)
+        for index, word in enumerate(REPLY.split(' ')):
+            if index:
+                time.sleep(self.token)
+            yield ' ' + word if index else word
+
+    def synthesize(self, text):
+        time.sleep(self.tts_first)
+        audio = b'\x01\x00' * int(SAMPLE_RATE * len(text.split()) / WORDS_PER_SECOND)
+        chunk = SAMPLE_RATE // 10 * 2  # 100 ms of audio, delivered every 25 ms
+        for start in range(0, len(audio), chunk):
+            if start:
+                time.sleep(0.025)
+            yield audio[start:start + chunk]
+
+
+def sequential_first_audio(stand_ins):
+    """Seconds from end of speech to the first audio, calling the stand-ins one after another."""
+    start = time.perf_counter()
+    text = stand_ins.transcribe(b'')
+    reply = ''.join(stand_ins.stream_reply([{"role": "user", "content": text}]))
+    next(iter(stand_ins.synthesize(reply)))
+    return time.perf_counter() - start
+
+
+class Assistant:
+    def __init__(self):
+        self.history = [{"role": "system", "content": "You are Solstis."}]
+
+    def clear(self):
+        self.history = self.history[:1]
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise RuntimeError("Timed out waiting for the voice pipeline")
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Voice pipeline benchmark')
+    parser.add_argument('--turns', type=int, default=3, help='Turns played to the end, then turns interrupted')
+    parser.add_argument('--stt-ms', type=float, default=500)
+    parser.add_argument('--first-token-ms', type=float, default=400)
+    parser.add_argument('--token-ms', type=float, default=30)
+    parser.add_argument('--tts-first-ms', type=float, default=250)
+    args = parser.parse_args()
+
+    stand_ins = StandIns(args.stt_ms, args.first_token_ms, args.token_ms, args.tts_first_ms)
+    device = ScriptedDevice()
+    assistant = Assistant()
+    log = []
+    pipeline = VoicePipeline(device, assistant, stand_ins.transcribe, stand_ins.stream_reply,
+                             stand_ins.synthesize, log=log.append)
+    threading.Thread(target=lambda: asyncio.run(pipeline.run()), daemon=True).start()
+    print(f"🗣️ STT {args.stt_ms:.0f} ms, first token {args.first_token_ms:.0f} ms + {args.token_ms:.0f} ms/token "
+          f"({len(REPLY.split())} tokens), TTS first chunk {args.tts_first_ms:.0f} ms")
+
+    sequential = sorted(sequential_first_audio(stand_ins) for _ in range(args.turns))
+    pipelined = []
+    for _ in range(args.turns):
+        count = len(pipeline.turns)
+        device.say(tone(1.5))
+        wait_for(lambda: len(pipeline.turns) > count and 'done' in pipeline.turns[-1].marks)
+        pipelined.append(pipeline.turns[-1].marks['playing'] / 1000)
+    pipelined.sort()
+
+    silenced, kept_ok = [], True
+    for _ in range(args.turns):
+        count = len(pipeline.turns)
+        device.say(tone(1.5))
+        wait_for(lambda: len(pipeline.turns) > count and 'playing' in pipeline.turns[-1].marks)
+        interrupted = pipeline.turns[-1]
+        time.sleep(1.0)
+        history_length = len(assistant.history)
+        said = time.perf_counter()
+        device.say(tone(1.0))
+        wait_for(lambda: 'interrupted' in interrupted.marks)
+        stopped = interrupted.speech_end + interrupted.marks['interrupted'] / 1000
+        last_write = max(end for start, end in device.writes if start < stopped)
+        silenced.append(last_write - said)
+        # The interrupted reply is cut to the sentences that were played, never the whole reply
+        kept = assistant.history[history_length]['content'] if len(assistant.history) > history_length else ''
+        kept_ok = kept_ok and kept != REPLY
+        wait_for(lambda: len(pipeline.turns) > count + 1 and 'done' in pipeline.turns[-1].marks)
+    silenced.sort()
+
+    print(f"{'':>12} {'first audio p50 ms':>19} {'p99 ms':>8}")
+    for name, values in (('sequential', sequential), ('pipelined', pipelined)):
+        print(f"{name:>12} {percentile(values, 50) * 1000:>19.0f} {percentile(values, 99) * 1000:>8.0f}")
+    print(f"Barge-in: reply silent {percentile(silenced, 50) * 1000:.0f} ms (p50) after the interruption began "
+          f"(barge-in needs {pipeline.barge_in_ms} ms of speech); history kept only played sentences: "
+          f"{'yes' if kept_ok else 'NO'}")
+    for line in log:
+        if line.startswith('⏱️'):
+            print(f"   {line}")
+    return 0 if kept_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
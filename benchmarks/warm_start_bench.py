@@ -0,0 +1,134 @@
+"""Worker warm start: time to ready, first-request latency and shared memory, cold vs warm.
+
+    python benchmarks/warm_start_bench.py
+    python benchmarks/warm_start_bench.py --workers 4 --connect-ms 150 --requests 20
+
+Starts the stand-in upstreams with --connect-ms on every new connection (the
+TCP and TLS handshakes a fresh connection to OpenAI or ElevenLabs costs), then
+boots api/app.py under gunicorn twice: with WARM_START=0 (each worker imports
+the app, builds prompts and connects on its first request) and WARM_START=1
+(gunicorn.conf.py preloads the app, prepares prompts and greeting audio in the
+master, freezes the heap, and opens each worker's connections before it
+accepts traffic). For each it reports:
+
+    ready s       from starting gunicorn to the first healthy response
+    first chat    the first /api/chat after that, and the median of the rest
+    first tts     the first /api/tts of a kit greeting, and the median of the rest
+    private MB    memory each worker holds alone, averaged over workers
+    PSS MB        proportional share per worker, with shared pages split
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from eval_runner import load_app
+from load_test import API_DIR, free_port, percentile
+from mock_upstreams import MockConfig, start_mock_server
+
+
+def worker_memory(master_pid):
+    """(private, PSS) bytes of each gunicorn worker, from /proc/<pid>/smaps_rollup."""
+    result = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            if parent != master_pid:
+                continue
+            fields = {}
+            with open(f'/proc/{entry}/smaps_rollup') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 3 and parts[2] == 'kB':
+                        fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+            result.append((fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss']))
+        except (OSError, IndexError, KeyError):
+            continue
+    return result
+
+
+def run(warm, workers, upstream, count, greeting, timeout=60):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.update({
+        'OPENAI_API_BASE': f"{upstream.base_url}/v1",
+        'OPENAI_API_KEY': 'mock-key',
+        'ELEVENLABS_API_BASE': upstream.base_url,
+        'ELEVENLABS_API_KEY': 'mock-key',
+        'WARM_START': '1' if warm else '0',
+    })
+    env.pop('CONVERSATION_JOURNAL_DIR', None)
+    cmd = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f"127.0.0.1:{port}",
+           '--log-level', 'warning', 'app:app']
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=API_DIR, env=env, stdout=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if requests.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"API did not become healthy within {timeout}s")
+            time.sleep(0.05)
+        ready = time.perf_counter() - start
+
+        def timed(path, body):
+            request_start = time.perf_counter()
+            requests.post(f"{base_url}{path}", json=body, timeout=30).raise_for_status()
+            return time.perf_counter() - request_start
+
+        chat, tts = [], []
+        for index in range(count):
+            user = {'user_name': f"bench-{index}", 'kit_type': 'standard'}
+            requests.post(f"{base_url}/api/setup", json=user, timeout=10)
+            chat.append(timed('/api/chat', dict(user, user_input='I cut my finger.')))
+            tts.append(timed('/api/tts', {'text': greeting}))
+        memory = worker_memory(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return ready, chat, tts, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gunicorn warm start benchmark')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=20, help='Chat and TTS requests per run')
+    parser.add_argument('--connect-ms', type=float, default=150, help='Upstream connection setup time')
+    parser.add_argument('--chat-latency-ms', type=float, default=400)
+    parser.add_argument('--tts-latency-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    greeting = app_module.GREETING.format(kit_name=app_module.KITS[0]['name'])
+    upstream = start_mock_server(MockConfig(latency={'chat': f"fixed:{args.chat_latency_ms}",
+                                                     'tts': f"fixed:{args.tts_latency_ms}"},
+                                            connect_ms=args.connect_ms))
+    print(f"🔥 {args.workers} workers, upstream {args.connect_ms:.0f} ms per new connection, "
+          f"chat {args.chat_latency_ms:.0f} ms, TTS {args.tts_latency_ms:.0f} ms")
+    print(f"{'':>5} {'ready s':>8} {'first chat':>11} {'p50 chat':>9} {'first tts':>10} {'p50 tts':>8} "
+          f"{'private MB':>11} {'PSS MB':>7}")
+    for warm in (False, True):
+        ready, chat, tts, memory = run(warm, args.workers, upstream, args.requests, greeting)
+        rest_chat, rest_tts = sorted(chat[1:]), sorted(tts[1:])
+        private = sum(value for value, _ in memory) / max(len(memory), 1) / 1e6
+        pss = sum(value for _, value in memory) / max(len(memory), 1) / 1e6
+        print(f"{'warm' if warm else 'cold':>5} {ready:>8.2f} {chat[0] * 1000:>11.0f} "
+              f"{percentile(rest_chat, 50) * 1000:>9.0f} {tts[0] * 1000:>10.0f} "
+              f"{percentile(rest_tts, 50) * 1000:>8.0f} {private:>11.1f} {pss:>7.1f}")
+    print(f"Upstream connections opened: {upstream.config.connections}")
+    upstream.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
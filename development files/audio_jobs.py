@@ -0,0 +1,163 @@
+"""Speech synthesis for solstis_web.py on background workers, delivered to the browser as a stream.
+
+speak_text() used to synthesize and play each reply on the server inside the
+request, so /setup, /chat, /clear and /speak_text only returned once the
+whole reply had been spoken. Now a handler submits the text and returns; a
+worker thread synthesizes it, and the browser fetches /audio/<job id>, which
+streams the chunks as the worker produces them.
+
+The queue is bounded: when `max_depth` jobs are already waiting, submit()
+returns None and the reply is shown without audio rather than spoken late.
+A new reply for a session replaces that session's earlier ones: submit()
+with an `owner` (or cancel()) cancels its jobs that are still queued or being
+synthesized, so the reply the user is waiting for never queues behind stale
+audio. Jobs are kept until they finish, and then the newest `keep` finished
+ones, so the browser can fetch them after the handler has returned.
+"""
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+AUDIO_TIMEOUT_SECONDS = 30
+
+
+class AudioJob:
+    def __init__(self, text, owner=None):
+        self.id = secrets.token_urlsafe(12)
+        self.text = text
+        self.owner = owner
+        self.chunks = []
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.created = time.perf_counter()
+        self.condition = threading.Condition()
+
+    def _append(self, chunk):
+        with self.condition:
+            if not self.done:
+                self.chunks.append(chunk)
+                self.condition.notify_all()
+
+    def _finish(self, error=None):
+        with self.condition:
+            if not self.done:
+                self.done = True
+                self.error = error
+                self.condition.notify_all()
+
+    def _cancel(self):
+        """Ends the job; a listener gets the chunks produced so far."""
+        with self.condition:
+            if not self.done:
+                self.cancelled = True
+                self.done = True
+                self.error = "cancelled"
+                self.condition.notify_all()
+
+    def stream(self, timeout=AUDIO_TIMEOUT_SECONDS):
+        """Yields the audio chunks, waiting for the worker to produce each one."""
+        index = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.condition:
+                while index == len(self.chunks) and not self.done:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    self.condition.wait(remaining)
+                chunks = self.chunks[index:]
+                done = self.done
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if done and index == len(self.chunks):
+                return
+
+
+class AudioJobQueue:
+    """Runs `synthesize(text)`, which yields audio chunks, on `workers` background threads."""
+
+    def __init__(self, synthesize, workers=2, max_depth=8, keep=64):
+        self.synthesize = synthesize
+        self.workers = workers
+        self.keep = keep
+        self.queue = queue.Queue(maxsize=max_depth)
+        self.jobs = OrderedDict()  # job ID -> AudioJob, oldest first
+        self.lock = threading.Lock()
+        self.threads = []
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0}
+
+    def _start(self):
+        # Started on first use rather than at import, so forked gunicorn workers each get their own threads
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"audio-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, text, owner=None):
+        """Queue `text` in place of `owner`'s unfinished jobs; returns the AudioJob, or None when the queue is full."""
+        job = AudioJob(text, owner)
+        with self.lock:
+            if not self.threads:
+                self._start()
+            if owner is not None:
+                self._cancel_owned(owner)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.stats["rejected"] += 1
+                return None
+            self.stats["submitted"] += 1
+            self.jobs[job.id] = job
+            self._evict()
+        return job
+
+    def cancel(self, owner):
+        """Cancel `owner`'s jobs that are queued or being synthesized."""
+        with self.lock:
+            self._cancel_owned(owner)
+
+    def _cancel_owned(self, owner):
+        for job in self.jobs.values():
+            if job.owner == owner and not job.done:
+                job._cancel()
+
+    def _evict(self):
+        # Only finished jobs: a queued job's /audio URL has already been handed to the browser
+        excess = len(self.jobs) - self.keep
+        if excess > 0:
+            for job_id in [job_id for job_id, job in self.jobs.items() if job.done][:excess]:
+                del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job.cancelled:
+                with self.lock:
+                    self.stats["cancelled"] += 1
+                continue
+            try:
+                for chunk in self.synthesize(job.text):
+                    if job.cancelled:
+                        break
+                    if chunk:
+                        job._append(chunk)
+                job._finish()
+                outcome = "cancelled" if job.cancelled else "completed"
+            except Exception as e:
+                print(f"Error generating audio: {e}")
+                job._finish(str(e))
+                outcome = "failed"
+            with self.lock:
+                self.stats[outcome] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, queued=self.queue.qsize(), workers=self.workers)
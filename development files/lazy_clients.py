@@ -0,0 +1,43 @@
+"""OpenAI and ElevenLabs clients that are only built when first used.
+
+Importing openai and elevenlabs and constructing their clients is most of a
+cold start. Text-only deployments never speak, and the chat page renders
+without either, so solstis_web.py and solstis_voice.py hold LazyClient
+stand-ins and import the real clients on first use. The microphone
+(mic_stream.py) is opened the same way, on the first recording.
+"""
+import os
+import threading
+
+
+class LazyClient:
+    """Stands in for a client, building it with `factory()` on first attribute access."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    @property
+    def loaded(self):
+        return self._client is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def create_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def create_elevenlabs_client():
+    from elevenlabs import ElevenLabs
+    return ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
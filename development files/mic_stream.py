@@ -0,0 +1,231 @@
+"""Long-lived microphone capture: a ring buffer of recent audio, a running noise floor and speech endpointing.
+
+record_audio() used to open a new sr.Microphone and Recognizer every turn,
+enumerating the microphones and spending 0.5 s calibrating to the room
+before it listened, so every turn paid for that and anything said in the
+meantime was lost. MicrophoneStream opens the input once, and a reader
+thread keeps:
+
+- the last `buffer_seconds` of audio in a FrameRing, a preallocated NumPy
+  array addressed by frame number;
+- a SpeechDetector running on every frame. It compares the frame's energy
+  with a noise floor learned from the quiet frames, so there is no per-turn
+  calibration and the threshold follows the room.
+
+listen() only waits for the detector: the utterance it returns starts
+`preroll_ms` before speech was detected, read back from the ring, so the
+first syllable is not clipped even if the user started talking as the
+prompt appeared.
+
+Audio is 16 kHz 16-bit mono PCM. The source returns one FRAME_MS frame per
+read(); PyAudioSource is the real one.
+"""
+import io
+import math
+import threading
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def frame_rms(pcm):
+    """Root mean square of 16-bit little-endian PCM samples."""
+    samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype='<i2').astype(np.float64)
+    if not samples.size:
+        return 0.0
+    return math.sqrt(samples.dot(samples) / samples.size)
+
+
+def pcm_to_wav(pcm, sample_rate=SAMPLE_RATE):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class NoiseFloor:
+    """Running estimate of the background level: drops quickly to quieter frames, rises slowly to louder ones."""
+
+    def __init__(self, rise=0.02, fall=0.2):
+        self.rise = rise
+        self.fall = fall
+        self.level = None
+
+    def update(self, rms):
+        if self.level is None:
+            self.level = rms
+        else:
+            self.level += (rms - self.level) * (self.fall if rms < self.level else self.rise)
+
+
+class SpeechDetector:
+    """Speech detection over PCM frames; feed() returns 'start', 'end' or None for each frame.
+
+    A frame is speech when its energy is `ratio` times the noise floor, and
+    at least `min_threshold`. Frames outside speech update the floor.
+    """
+
+    def __init__(self, min_threshold=300.0, ratio=3.0, start_ms=100, end_ms=700):
+        self.min_threshold = min_threshold
+        self.ratio = ratio
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.noise_floor = NoiseFloor()
+        self.in_speech = False
+        self.voiced_ms = 0.0
+        self.quiet_ms = 0.0
+
+    def threshold(self, factor=1.0):
+        return max(self.min_threshold, (self.noise_floor.level or 0.0) * self.ratio) * factor
+
+    def feed(self, pcm, factor=1.0, start_ms=None):
+        """`factor` and `start_ms` raise the bar for this frame (e.g. while the speaker is playing)."""
+        duration_ms = len(pcm) / 2 / SAMPLE_RATE * 1000
+        rms = frame_rms(pcm)
+        if rms >= self.threshold(factor):
+            self.quiet_ms = 0.0
+            self.voiced_ms += duration_ms
+            if not self.in_speech and self.voiced_ms >= (start_ms or self.start_ms):
+                self.in_speech = True
+                return 'start'
+            return None
+        if not self.in_speech:
+            self.voiced_ms = 0.0
+            if rms < self.threshold():
+                self.noise_floor.update(rms)
+            return None
+        self.quiet_ms += duration_ms
+        if self.quiet_ms >= self.end_ms:
+            self.in_speech = False
+            self.voiced_ms = 0.0
+            return 'end'
+        return None
+
+
+class FrameRing:
+    """The last `capacity` frames in a preallocated int16 array; frame n is the n-th frame ever appended."""
+
+    def __init__(self, capacity, frame_samples=FRAME_SAMPLES):
+        self.samples = np.zeros((capacity, frame_samples), dtype=np.int16)
+        self.capacity = capacity
+        self.written = 0
+
+    def append(self, pcm):
+        frame = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype='<i2')[:self.samples.shape[1]]
+        row = self.samples[self.written % self.capacity]
+        row[:len(frame)] = frame
+        row[len(frame):] = 0
+        self.written += 1
+
+    def read(self, first, last):
+        """PCM of frames first to last (exclusive), clamped to the frames still held."""
+        first = max(first, self.written - self.capacity, 0)
+        last = min(last, self.written)
+        if first >= last:
+            return b''
+        return self.samples[np.arange(first, last) % self.capacity].tobytes()
+
+
+class PyAudioSource:
+    """The default microphone through PyAudio, 16 kHz mono."""
+
+    def __init__(self):
+        import pyaudio
+        self.pyaudio = pyaudio.PyAudio()
+        self.input = self.pyaudio.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+                                       frames_per_buffer=FRAME_SAMPLES)
+
+    def read(self):
+        return self.input.read(FRAME_SAMPLES, exception_on_overflow=False)
+
+    def close(self):
+        self.input.close()
+        self.pyaudio.terminate()
+
+
+class MicrophoneStream:
+    """A microphone that is always capturing; listen() returns the next utterance."""
+
+    def __init__(self, source=None, buffer_seconds=30, preroll_ms=300, **detector_options):
+        self.source = source
+        self.ring = FrameRing(int(buffer_seconds * 1000 / FRAME_MS))
+        self.detector = SpeechDetector(**detector_options)
+        self.preroll_frames = preroll_ms // FRAME_MS
+        self.changed = threading.Condition()
+        self.speech_start = None  # frame where the latest speech began
+        self.speech_end = None  # frame where the latest speech ended
+        self._stop = threading.Event()
+        self._reader = None
+        self._reading = False  # until the reader thread exits
+        self._error = None  # what stopped the reader, re-raised by listen()
+
+    def start(self):
+        if self.source is None:
+            self.source = PyAudioSource()
+        self._reader = threading.Thread(target=self._read, name="microphone", daemon=True)
+        self._reading = True
+        self._reader.start()
+        return self
+
+    def _read(self):
+        try:
+            while not self._stop.is_set():
+                pcm = self.source.read()
+                event = self.detector.feed(pcm)
+                with self.changed:
+                    self.ring.append(pcm)
+                    if event == 'start':
+                        self.speech_start = self.ring.written - int(self.detector.voiced_ms // FRAME_MS)
+                    elif event == 'end':
+                        self.speech_end = self.ring.written
+                    self.changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            # Wake listen() so it does not wait for frames that will never come
+            with self.changed:
+                self._reading = False
+                self.changed.notify_all()
+
+    def listen(self, timeout=5.0, phrase_time_limit=10.0):
+        """PCM of the next utterance, or None if no speech starts within `timeout` seconds.
+
+        Re-raises the error that stopped the microphone, and returns None once it is closed.
+        """
+        with self.changed:
+            called = self.ring.written
+            # Speech that began just before the call counts: the user may have started as the prompt appeared
+            started = self.changed.wait_for(
+                lambda: (self.speech_start is not None and self.speech_start >= called - self.preroll_frames)
+                or not self._reading, timeout)
+            if not self._reading:
+                if self._error is not None:
+                    raise self._error
+                return None
+            if not started:
+                return None
+            start = self.speech_start
+            limit = start + int(phrase_time_limit * 1000 / FRAME_MS)
+            # Frames arrive in real time, so the limit is reached about phrase_time_limit seconds in;
+            # the timeout only matters if the source stalls
+            self.changed.wait_for(
+                lambda: (self.speech_end is not None and self.speech_end > start) or self.ring.written >= limit
+                or not self._reading, phrase_time_limit + 1.0)
+            if not self._reading and self._error is not None:
+                raise self._error
+            end = self.speech_end if self.speech_end is not None and self.speech_end > start else self.ring.written
+            return self.ring.read(start - self.preroll_frames, end)
+
+    def close(self):
+        self._stop.set()
+        if self._reader:
+            self._reader.join(timeout=1)
+        if self.source is not None and hasattr(self.source, 'close'):
+            self.source.close()
@@ -1,17 +1,65 @@
+"""Build fine-tuning data from Solstis conversation logs.
+
+    python prepare_training_data.py logs/*.jsonl.gz --output-dir training_data
+    python prepare_training_data.py /var/solstis/journal --max-tokens 4096 --shard-mb 50 --workers 8
+
+Inputs are read lazily, line by line, and may be:
+- conversation records, one JSON object per line with a "messages" list
+  (the training JSONL format itself qualifies)
+- the API's conversation journal: a journal directory (latest snapshot plus
+  the segments after it) or individual journal-*.log files
+Files ending in .gz are decompressed on the fly.
+
+Each dialog becomes one example via create_training_example(). Duplicate
+dialogs (same text after case and whitespace normalisation) are dropped using
+a fixed-size Bloom filter, examples over --max-tokens are dropped, and the
+rest are written to size-bounded JSONL shards. Conversion and token counting
+run in a process pool with a bounded number of batches in flight. Snapshots
+are decoded one session at a time, at most --max-open-sessions journal
+sessions are held at once and a session is only kept while it could still fit
+in --max-tokens, so memory stays flat however large the input is.
+
+Run without inputs to write the small built-in sample set, as before.
+"""
+import argparse
+import glob
+import gzip
+import hashlib
 import json
+import math
 import os
+import resource
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def create_training_example(user_input, assistant_response, context=None):
-    """Create a single training example in the required format."""
+SYSTEM_PROMPT = ("You are Solstis, a calm, helpful, and reassuring AI assistant that provides "
+                 "step-by-step first-aid instructions during minor health emergencies.")
+
+# OpenAI chat formatting overhead per message and per reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('o200k_base')
+except ImportError:
+    _ENCODING = None
+
+
+def create_training_example(user_input, assistant_response, context=None, history=None):
+    """Create a single training example in the required format.
+
+    `history` is the list of earlier {'role', 'content'} turns of the same dialog.
+    """
     messages = []
-    
+
     # Add system message
     messages.append({
         "role": "system",
-        "content": "You are Solstis, a calm, helpful, and reassuring AI assistant that provides step-by-step first-aid instructions during minor health emergencies."
+        "content": SYSTEM_PROMPT
     })
-    
+
     # Add context if provided
     if context:
         messages.append({
@@ -22,7 +70,14 @@ def create_training_example(user_input, assistant_response, context=None):
             "role": "assistant",
             "content": "I understand the context. How can I help you?"
         })
-    
+
+    # Add earlier turns of a multi-turn dialog
+    for turn in history or []:
+        messages.append({
+            "role": turn["role"],
+            "content": turn["content"]
+        })
+
     # Add the main interaction
     messages.append({
         "role": "user",
@@ -32,7 +87,7 @@ def create_training_example(user_input, assistant_response, context=None):
         "role": "assistant",
         "content": assistant_response
     })
-    
+
     return {
         "messages": messages
     }
@@ -42,15 +97,321 @@ def save_training_data(examples, filename=None):
     if filename is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"training_data_{timestamp}.jsonl"
-    
+
     with open(filename, 'w') as f:
         for example in examples:
             f.write(json.dumps(example) + '\n')
-    
+
     print(f"Saved {len(examples)} examples to {filename}")
     return filename
 
-def main():
+# === Streaming pipeline ===
+
+def count_tokens(messages):
+    """Tokens the example costs to train on (tiktoken if installed, else ~4 chars per token)."""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        content = message["content"]
+        total += TOKENS_PER_MESSAGE + (len(_ENCODING.encode(content)) if _ENCODING else len(content) // 4 + 1)
+    return total
+
+
+def dialog_fingerprint(turns):
+    """128-bit hash of the dialog text with case and spacing normalised.
+
+    Numbers and punctuation are kept: "press for 5 minutes" and "press for 15
+    minutes" are different advice.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for turn in turns:
+        text = ' '.join(turn["content"].lower().split())
+        digest.update(turn["role"].encode() + b'\x00' + text.encode() + b'\x01')
+    return digest.digest()
+
+
+class BloomFilter:
+    """Fixed-size set of fingerprints; false positives (dropped uniques) at about `error_rate`."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        bits = max(8, int(-capacity * math.log(error_rate) / (0.693 ** 2)))
+        self.size = bits
+        self.hashes = max(1, round(bits / capacity * 0.693))
+        self.bits = bytearray((bits + 7) // 8)
+
+    def add(self, fingerprint):
+        """Add a 16-byte fingerprint; return True if it was (probably) already present."""
+        first = int.from_bytes(fingerprint[:8], 'little')
+        second = int.from_bytes(fingerprint[8:], 'little') | 1
+        present = True
+        for i in range(self.hashes):
+            position = (first + i * second) % self.size
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & mask:
+                present = False
+                self.bits[byte] |= mask
+        return present
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def expand_inputs(paths):
+    """Files to read, in order; journal directories expand to their snapshot and segments."""
+    for path in paths:
+        if os.path.isdir(path):
+            snapshots = sorted(glob.glob(os.path.join(path, 'snapshot-*.json')))
+            yield from snapshots[-1:]
+            yield from sorted(glob.glob(os.path.join(path, 'journal-*.log')))
+        else:
+            yield from sorted(glob.glob(path)) or [path]
+
+
+class _JsonReader:
+    """Reads a JSON document from a text file value by value, holding about one value in memory."""
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        # Reads grow with the unread buffer, so decoding one large value stays linear
+        data = self.f.read(max(self.chunk_size, len(self.buffer) - self.position))
+        if not data:
+            return False
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, or '' at the end of the file."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer) or not self._fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in the snapshot")
+        self.position += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next read
+            if end == len(self.buffer) and not isinstance(value, (dict, list, str)) and self._fill():
+                continue
+            self.position = end
+            return value
+
+
+def snapshot_sessions(f):
+    """(session ID, conversation) pairs of a journal snapshot, decoded one session at a time."""
+    reader = _JsonReader(f)
+    reader.expect('{')
+    while reader.peek() not in ('}', ''):
+        key = reader.value()
+        reader.expect(':')
+        if key != 'sessions':
+            reader.value()
+        else:
+            reader.expect('{')
+            while reader.peek() != '}':
+                session_id = reader.value()
+                reader.expect(':')
+                yield session_id, reader.value()
+                if reader.peek() == ',':
+                    reader.expect(',')
+            return  # what follows (last_active) is not needed
+        if reader.peek() == ',':
+            reader.expect(',')
+
+
+def read_dialogs(paths, max_open_sessions=10_000, max_messages=None):
+    """Yield dialogs (lists of {'role', 'content'}) from conversation records or journal events.
+
+    Journal sessions are emitted when they are cleared or set up again, and the
+    rest at the end. Past `max_open_sessions` open at once, the least recently
+    active is emitted early and the rest of it skipped. A session that reaches
+    more than `max_messages` messages is emitted then (it can only be dropped as
+    too long) and the rest of it skipped. Memory is bounded by those two limits
+    whatever the size of the input.
+    """
+    open_sessions = OrderedDict()  # session ID -> messages, or None once skipped; least recently active first
+
+    def admit(session_id, messages):
+        if max_messages and len(messages) > max_messages:
+            open_sessions[session_id] = None
+            yield messages
+        while len(open_sessions) > max_open_sessions:
+            _, oldest = open_sessions.popitem(last=False)
+            if oldest:
+                yield oldest
+
+    for path in expand_inputs(paths):
+        if os.path.basename(path).startswith('snapshot-'):
+            # Sessions still active at the last compaction; the segments continue them
+            with _open_text(path) as f:
+                for session_id, conversation in snapshot_sessions(f):
+                    open_sessions[session_id] = conversation['messages']
+                    yield from admit(session_id, conversation['messages'])
+            continue
+        with _open_text(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'messages' in record:
+                    yield record['messages']
+                elif record.get('op') in ('setup', 'clear'):
+                    finished = open_sessions.pop(record['s'], None)
+                    if finished:
+                        yield finished
+                elif record.get('op') == 'msg':
+                    session_id = record['s']
+                    if session_id in open_sessions:
+                        open_sessions.move_to_end(session_id)
+                        messages = open_sessions[session_id]
+                    elif record['n'] == 0:
+                        messages = open_sessions[session_id] = []
+                    else:
+                        continue  # the start of this dialog was emitted early, or is not in the inputs
+                    # Journal replays may repeat an index; keep the first copy
+                    if messages is not None and record['n'] == len(messages):
+                        messages.append(record['m'])
+                        yield from admit(session_id, messages)
+    yield from (messages for messages in open_sessions.values() if messages)
+
+
+def convert_dialog(messages, max_tokens):
+    """Turn one logged dialog into (fingerprint, tokens, JSONL line) or (reason, None, None)."""
+    turns = []
+    for m in messages:
+        if m.get("role") not in ("user", "assistant") or not isinstance(m.get("content"), str):
+            continue
+        if turns and turns[-1]["role"] == m["role"]:
+            # The API logs an emergency directive and the model's reply as two assistant turns
+            turns[-1]["content"] += "\n\n" + m["content"]
+        else:
+            turns.append({"role": m["role"], "content": m["content"]})
+    # Train on complete exchanges only: start with the user, end on a reply
+    while turns and turns[0]["role"] != "user":
+        turns.pop(0)
+    while turns and turns[-1]["role"] != "assistant":
+        turns.pop()
+    if len(turns) < 2 or any(not turn["content"].strip() for turn in turns):
+        return 'invalid', None, None
+
+    example = create_training_example(turns[-2]["content"], turns[-1]["content"], history=turns[:-2])
+    tokens = count_tokens(example["messages"])
+    if tokens > max_tokens:
+        return 'too_long', None, None
+    return dialog_fingerprint(turns), tokens, json.dumps(example, ensure_ascii=False) + '\n'
+
+
+def convert_batch(batch, max_tokens):
+    return [convert_dialog(messages, max_tokens) for messages in batch]
+
+
+class ShardWriter:
+    """Writes JSONL shards of at most `shard_bytes` each, renamed into place when complete."""
+
+    def __init__(self, output_dir, shard_bytes, prefix='train'):
+        self.output_dir = output_dir
+        self.shard_bytes = shard_bytes
+        self.prefix = prefix
+        self.index = 0
+        self.file = None
+        self.written = 0
+        self.paths = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, line):
+        data = line.encode('utf-8')
+        if self.file and self.written + len(data) > self.shard_bytes:
+            self._close_shard()
+        if not self.file:
+            self.path = os.path.join(self.output_dir, f"{self.prefix}-{self.index:05d}.jsonl")
+            self.file = open(self.path + '.tmp', 'wb')
+            self.written = 0
+        self.file.write(data)
+        self.written += len(data)
+
+    def _close_shard(self):
+        self.file.close()
+        os.replace(self.path + '.tmp', self.path)
+        self.paths.append(self.path)
+        self.file = None
+        self.index += 1
+
+    def close(self):
+        if self.file:
+            self._close_shard()
+
+
+def _batches(dialogs, batch_size):
+    batch = []
+    for dialog in dialogs:
+        batch.append(dialog)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_dataset(paths, output_dir, max_tokens=4096, shard_bytes=100 * 1024 * 1024,
+                  workers=None, batch_size=256, dedup_capacity=10_000_000, max_open_sessions=10_000):
+    """Stream `paths` into deduplicated, length-limited JSONL shards. Returns counters."""
+    stats = {'dialogs': 0, 'written': 0, 'duplicates': 0, 'too_long': 0, 'invalid': 0, 'tokens': 0}
+    seen = BloomFilter(dedup_capacity)
+    writer = ShardWriter(output_dir, shard_bytes)
+    workers = workers or os.cpu_count()
+    # Every message costs at least TOKENS_PER_MESSAGE + 1 tokens, so longer dialogs cannot fit
+    max_messages = max_tokens // (TOKENS_PER_MESSAGE + 1)
+
+    def collect(future):
+        for fingerprint, tokens, line in future.result():
+            stats['dialogs'] += 1
+            if line is None:
+                stats[fingerprint] += 1
+            elif seen.add(fingerprint):
+                stats['duplicates'] += 1
+            else:
+                writer.write(line)
+                stats['written'] += 1
+                stats['tokens'] += tokens
+
+    # Keep a bounded window of batches in flight; results are written in input order
+    pending = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in _batches(read_dialogs(paths, max_open_sessions, max_messages), batch_size):
+            pending.append(pool.submit(convert_batch, batch, max_tokens))
+            if len(pending) >= workers * 2:
+                collect(pending.pop(0))
+        for future in pending:
+            collect(future)
+    writer.close()
+    stats['shards'] = writer.paths
+    return stats
+
+
+def write_sample_data():
     # Example training data
     examples = [
         create_training_example(
@@ -67,15 +428,46 @@ def main():
         ),
         # Add more examples here
     ]
-    
+
     # Save the training data
-    filename = save_training_data(examples)
+    return save_training_data(examples)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fine-tuning JSONL shards from conversation logs')
+    parser.add_argument('inputs', nargs='*', help='Conversation log files, globs or journal directories')
+    parser.add_argument('--output-dir', default=f"training_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    parser.add_argument('--max-tokens', type=int, default=4096, help='Drop examples longer than this')
+    parser.add_argument('--shard-mb', type=float, default=100, help='Maximum shard size in MB')
+    parser.add_argument('--workers', type=int, default=None, help='Conversion processes (default: CPU count)')
+    parser.add_argument('--dedup-capacity', type=int, default=10_000_000,
+                        help='Expected unique dialogs; sizes the dedup filter')
+    parser.add_argument('--max-open-sessions', type=int, default=10_000,
+                        help='Journal sessions held at once; the least recently active is emitted early')
+    args = parser.parse_args()
+
+    if not args.inputs:
+        filename = write_sample_data()
+        files = [filename]
+    else:
+        stats = build_dataset(args.inputs, args.output_dir, args.max_tokens, int(args.shard_mb * 1024 * 1024),
+                              args.workers, dedup_capacity=args.dedup_capacity,
+                              max_open_sessions=args.max_open_sessions)
+        files = stats['shards']
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"Read {stats['dialogs']} dialogs: wrote {stats['written']} examples "
+              f"({stats['tokens']} tokens{'' if _ENCODING else ', estimated'}) to {len(files)} shards in "
+              f"{args.output_dir}")
+        print(f"Dropped {stats['duplicates']} duplicates, {stats['too_long']} over {args.max_tokens} tokens, "
+              f"{stats['invalid']} invalid. Peak RSS {peak_mb:.0f} MB")
+        if not files:
+            return
+
     print(f"\nTo use this data for fine-tuning:")
-    print(f"1. Review the data in {filename}")
+    print(f"1. Review the data in {files[0]}")
     print(f"2. Use OpenAI's fine-tuning API:")
-    print(f"   openai tools fine_tunes.prepare_data -f {filename}")
+    print(f"   openai tools fine_tunes.prepare_data -f {files[0]}")
     print(f"3. Start the fine-tuning job:")
-    print(f"   openai api fine_tunes.create -t {filename} -m gpt-3.5-turbo")
+    print(f"   openai api fine_tunes.create -t {files[0]} -m gpt-3.5-turbo")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
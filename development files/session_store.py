@@ -0,0 +1,108 @@
+"""Server-side session state for solstis_web.py, keyed by an opaque session ID.
+
+Flask's default session is a signed cookie, so every request shipped the whole
+conversation (and the kit's system prompt) to the browser and back, and
+browsers drop cookies past ~4 KB. The cookie now only holds the session ID;
+the user's name, kit and messages live here. Sessions idle for longer than
+`ttl` seconds are dropped.
+
+MemorySessionStore keeps state in the process, which is enough for one
+worker. FileSessionStore writes one JSON file per session to a directory, so
+several gunicorn workers (or a restart) see the same sessions; set
+SESSION_STORE_DIR to use it.
+"""
+import copy
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+SESSION_TTL_SECONDS = 24 * 60 * 60
+SWEEP_INTERVAL_SECONDS = 5 * 60
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self.sessions = {}  # session ID -> (last used, state)
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+
+    def get(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            # A copy, like FileSessionStore: a request that fails part-way leaves the stored state alone
+            return copy.deepcopy(entry[1])
+
+    def save(self, session_id, state):
+        now = time.monotonic()
+        with self.lock:
+            self.sessions[session_id] = (now, state)
+            if now - self.last_sweep > SWEEP_INTERVAL_SECONDS:
+                self.last_sweep = now
+                for expired in [key for key, (used, _) in self.sessions.items() if now - used > self.ttl]:
+                    del self.sessions[expired]
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class FileSessionStore:
+    def __init__(self, directory, ttl=SESSION_TTL_SECONDS):
+        self.directory = directory
+        self.ttl = ttl
+        self.last_sweep = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        # IDs come from a signed cookie, but never let one name a path outside the directory
+        if not session_id or not session_id.replace('-', '').replace('_', '').isalnum():
+            return None
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def get(self, session_id):
+        path = self._path(session_id)
+        try:
+            if path is None or time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, session_id, state):
+        path = self._path(session_id)
+        if path is None:
+            raise ValueError(f"Invalid session ID: {session_id!r}")
+        # Write then rename, so a worker never reads a half-written file
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
+        now = time.time()
+        if now - self.last_sweep > SWEEP_INTERVAL_SECONDS:
+            self.last_sweep = now
+            for name in os.listdir(self.directory):
+                stale = os.path.join(self.directory, name)
+                try:
+                    if now - os.path.getmtime(stale) > self.ttl:
+                        os.remove(stale)
+                except OSError:
+                    pass
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.json'))
+
+
+def create_session_store():
+    ttl = int(os.getenv("SESSION_TTL_SECONDS", SESSION_TTL_SECONDS))
+    directory = os.getenv("SESSION_STORE_DIR")
+    return FileSessionStore(directory, ttl) if directory else MemorySessionStore(ttl)
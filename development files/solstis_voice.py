@@ -1,16 +1,17 @@
+import asyncio
+import io
 import os
-import tempfile
-import speech_recognition as sr
 from dotenv import load_dotenv
-from openai import OpenAI
-from elevenlabs import ElevenLabs, VoiceSettings, stream, play
+from lazy_clients import LazyClient, create_elevenlabs_client, create_openai_client
+from mic_stream import pcm_to_wav
+from voice_pipeline import PyAudioDevice, VoicePipeline
 
 # === Load environment variables ===
 load_dotenv()
 
-# === Clients ===
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-elevenlabs_client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+# === Clients (built on first use) ===
+client = LazyClient(create_openai_client)
+elevenlabs_client = LazyClient(create_elevenlabs_client)
 
 VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID") or "kdmDKE6EkgrWrrykO9Qt"
 
@@ -64,44 +65,31 @@ class SolstisAssistant:
     def clear(self):
         self.history = [{"role": "system", "content": SYSTEM_PROMPT}]
 
-# === Record Audio ===
-def record_audio():
-    recognizer = sr.Recognizer()
-    mic_list = sr.Microphone.list_microphone_names()
-    print("🎤 Available mics:", mic_list)
-
-    with sr.Microphone() as source:
-        recognizer.energy_threshold = 300
-        recognizer.pause_threshold = 0.7
-        recognizer.adjust_for_ambient_noise(source, duration=0.5)
-
-        print("🎤 Listening... Speak now.")
-        try:
-            audio = recognizer.listen(source, timeout=5, phrase_time_limit=10)
-            print("⏳ Processing...")
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-                temp_audio.write(audio.get_wav_data())
-                return temp_audio.name
-        except sr.WaitTimeoutError:
-            print("⏱️ No speech detected. Try again.")
-            return None
-
-# === Transcribe Audio Using Whisper (OpenAI v1) ===
-def transcribe_audio(audio_path):
-    with open(audio_path, "rb") as f:
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=f
-        )
-        return transcript.text
-
-# === Speak Text with ElevenLabs ===
-def speak_text(text):
-    print(f"💬 Solstis: {text}\n")
-    audio_stream = elevenlabs_client.text_to_speech.stream(
+# === Voice backends for the pipeline (voice_pipeline.py) ===
+def transcribe_pcm(pcm):
+    """Transcribe 16 kHz mono PCM with Whisper"""
+    audio = io.BytesIO(pcm_to_wav(pcm))
+    audio.name = "speech.wav"
+    return client.audio.transcriptions.create(model="whisper-1", file=audio).text
+
+def stream_reply(messages):
+    """Yield the reply's text as gpt-4o streams it"""
+    stream = client.chat.completions.create(model="gpt-4o", messages=messages, stream=True)
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+
+def synthesize_pcm(text):
+    """Yield 16 kHz PCM of `text` as ElevenLabs streams it"""
+    from elevenlabs import VoiceSettings
+    yield from elevenlabs_client.text_to_speech.stream(
         voice_id=VOICE_ID,
         model_id="eleven_turbo_v2",
         optimize_streaming_latency=1,
+        output_format="pcm_16000",
         text=text,
         voice_settings=VoiceSettings(
             stability=0.5,
@@ -110,38 +98,22 @@ def speak_text(text):
             use_speaker_boost=True
         )
     )
-    play(audio_stream)
 
 # === Main Loop ===
 def run():
     print("🩺 Solstis Voice Assistant — say something or Ctrl+C to quit.\n")
     print("💡 Example: 'I cut my finger with a kitchen knife. It's bleeding a lot.'")
-    print("💡 Say 'clear' to reset the conversation.\n")
-
-    assistant = SolstisAssistant()
-
-    while True:
-        try:
-            audio_file = record_audio()
-            if not audio_file:
-                continue
-
-            user_text = transcribe_audio(audio_file)
-            os.remove(audio_file)
-
-            if user_text.strip().lower() == "clear":
-                assistant.clear()
-                speak_text("Conversation history cleared.")
-                continue
-
-            response = assistant.ask(user_text)
-            speak_text(response)
-
-        except KeyboardInterrupt:
-            print("\n👋 Exiting Solstis.")
-            break
-        except Exception as e:
-            print(f"⚠️ Error: {e}")
+    print("💡 Say 'clear' to reset the conversation.")
+    print("💡 Speak while Solstis is talking to interrupt it (headphones help).\n")
+
+    device = PyAudioDevice()
+    pipeline = VoicePipeline(device, SolstisAssistant(), transcribe_pcm, stream_reply, synthesize_pcm)
+    try:
+        asyncio.run(pipeline.run())
+    except KeyboardInterrupt:
+        print("\n👋 Exiting Solstis.")
+    finally:
+        device.close()
 
 if __name__ == "__main__":
     run()
@@ -1,10 +1,11 @@
 import os
 import tempfile
-import speech_recognition as sr
-from flask import Flask, render_template_string, request, session, redirect, url_for, jsonify
-from openai import OpenAI
-from elevenlabs import ElevenLabs, VoiceSettings, stream, play
+from functools import lru_cache
+from flask import Flask, Response, abort, render_template_string, request, session, redirect, url_for, jsonify
 from dotenv import load_dotenv
+from audio_jobs import AudioJobQueue
+from lazy_clients import LazyClient, create_elevenlabs_client, create_openai_client
+from session_store import create_session_store, new_session_id
 
 # Load environment variables
 load_dotenv()
@@ -12,9 +13,10 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key")
 
-# === Clients ===
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-elevenlabs_client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+# === Clients (built on first use; voice dependencies are imported only when speaking or recording) ===
+client = LazyClient(create_openai_client)
+elevenlabs_client = LazyClient(create_elevenlabs_client)
+VOICE_ENABLED = bool(os.getenv("ELEVENLABS_API_KEY"))
 
 VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID") or "kdmDKE6EkgrWrrykO9Qt"
 
@@ -117,6 +119,7 @@ KITS = [
     }
 ]
 
+@lru_cache(maxsize=None)
 def get_system_prompt(kit_type):
     # Find the kit by ID
     kit = None
@@ -189,9 +192,8 @@ class SolstisAssistant:
     def __init__(self, user_name="there", kit_type="standard"):
         self.user_name = user_name
         self.kit_type = kit_type
-        self.conversation_history = [
-            {"role": "system", "content": get_system_prompt(kit_type)}
-        ]
+        # User and assistant messages only; the system prompt is looked up by kit ID for each request
+        self.conversation_history = []
         self.has_greeted = False
     
     def get_initial_greeting(self):
@@ -217,7 +219,7 @@ class SolstisAssistant:
         # Get response with full context
         response = client.chat.completions.create(
             model="gpt-4.1-nano",
-            messages=self.conversation_history
+            messages=[{"role": "system", "content": get_system_prompt(self.kit_type)}] + self.conversation_history
         )
         
         # Add assistant response to history
@@ -227,29 +229,28 @@ class SolstisAssistant:
         return assistant_response
     
     def clear_history(self):
-        self.conversation_history = [
-            {"role": "system", "content": get_system_prompt(self.kit_type)}
-        ]
+        self.conversation_history = []
         self.has_greeted = False
 
 # === Voice Functions ===
+def open_microphone():
+    from mic_stream import MicrophoneStream
+    return MicrophoneStream().start()
+
+# Opened on the first recording and kept capturing, so later turns skip device setup and calibration
+microphone = LazyClient(open_microphone)
+
 def record_audio():
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        recognizer.energy_threshold = 300
-        recognizer.pause_threshold = 0.7
-        recognizer.adjust_for_ambient_noise(source, duration=0.5)
-        
-        print("🎤 Listening... Speak now.")
-        try:
-            audio = recognizer.listen(source, timeout=5, phrase_time_limit=10)
-            print("⏳ Processing...")
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-                temp_audio.write(audio.get_wav_data())
-                return temp_audio.name
-        except sr.WaitTimeoutError:
-            print("⏱️ No speech detected.")
-            return None
+    from mic_stream import pcm_to_wav
+    print("🎤 Listening... Speak now.")
+    pcm = microphone.listen(timeout=5, phrase_time_limit=10)
+    if pcm is None:
+        print("⏱️ No speech detected.")
+        return None
+    print("⏳ Processing...")
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
+        temp_audio.write(pcm_to_wav(pcm))
+        return temp_audio.name
 
 def transcribe_audio(audio_path):
     with open(audio_path, "rb") as f:
@@ -259,30 +260,39 @@ def transcribe_audio(audio_path):
         )
         return transcript.text
 
-def speak_text(text):
-    print(f"💬 Solstis: {text}")
-    try:
-        # Generate audio without playing it
-        audio_stream = elevenlabs_client.text_to_speech.stream(
-            voice_id=VOICE_ID,
-            model_id="eleven_turbo_v2",
-            optimize_streaming_latency=1,
-            text=text,
-            voice_settings=VoiceSettings(
-                stability=0.5,
-                similarity_boost=0.75,
-                style=0.0,
-                use_speaker_boost=True
-            )
+def synthesize_speech(text):
+    """Yields MP3 chunks of `text` as ElevenLabs streams them"""
+    from elevenlabs import VoiceSettings
+    yield from elevenlabs_client.text_to_speech.stream(
+        voice_id=VOICE_ID,
+        model_id="eleven_turbo_v2",
+        optimize_streaming_latency=1,
+        text=text,
+        voice_settings=VoiceSettings(
+            stability=0.5,
+            similarity_boost=0.75,
+            style=0.0,
+            use_speaker_boost=True
         )
-        
-        # For now, we'll play it on the server side
-        # In a production app, you'd want to stream this to the client
-        play(audio_stream)
-        return True
-    except Exception as e:
-        print(f"Error generating audio: {e}")
-        return False
+    )
+
+# Synthesis runs on background workers; the browser plays the audio from /audio/<job id>
+audio_jobs = AudioJobQueue(
+    synthesize_speech,
+    workers=int(os.getenv("AUDIO_WORKERS", 2)),
+    max_depth=int(os.getenv("AUDIO_QUEUE_DEPTH", 8)),
+)
+
+def queue_speech(text, session_id=None):
+    """Queue `text` in place of the session's earlier speech; returns the URL the browser plays it from, or None"""
+    print(f"💬 Solstis: {text}")
+    if not VOICE_ENABLED:
+        return None
+    job = audio_jobs.submit(text, owner=session_id)
+    if job is None:
+        print("Audio queue full, replying without voice")
+        return None
+    return url_for('audio', job_id=job.id)
 
 # === Enhanced HTML Template ===
 CHAT_TEMPLATE = '''
@@ -661,7 +671,7 @@ CHAT_TEMPLATE = '''
             <p>Your AI-powered medical assistant</p>
         </div>
         
-        {% if not session.get('user_name') or not session.get('kit_type') %}
+        {% if not state.get('user_name') or not state.get('kit_type') %}
         <div class="setup-form">
             <h2>Welcome to Solstis</h2>
             <form method="post" action="/setup">
@@ -701,8 +711,8 @@ CHAT_TEMPLATE = '''
         </div>
         {% else %}
         <div class="kit-info">
-            <div class="kit-name">{{ session.get('kit_name', 'Standard Kit') }}</div>
-            <div class="kit-description">{{ session.get('kit_description', 'Comprehensive first aid kit') }}</div>
+            <div class="kit-name">{{ state.get('kit_name', 'Standard Kit') }}</div>
+            <div class="kit-description">{{ state.get('kit_description', 'Comprehensive first aid kit') }}</div>
         </div>
         
         <div class="chat-container">
@@ -767,14 +777,30 @@ CHAT_TEMPLATE = '''
         
         scrollToBottom();
         
-        // Start automatic voice conversation when page loads
-        setTimeout(() => {
-            if (voiceBtn) {
-                voiceBtn.classList.add('listening');
-                showStatus('Starting voice conversation...', 'info');
-                setTimeout(() => startRecordingCycle(), 1000);
-            }
-        }, 2000);
+        // Play audio the server is synthesizing; resolves when playback ends (or fails)
+        function playAudio(url) {
+            if (!url) return Promise.resolve();
+            return new Promise(resolve => {
+                const audio = new Audio(url);
+                audio.addEventListener('ended', resolve);
+                audio.addEventListener('error', resolve);
+                audio.play().catch(error => {
+                    console.error('Audio playback error:', error);
+                    resolve();
+                });
+            });
+        }
+        
+        // Play the greeting, then start automatic voice conversation
+        playAudio({{ pending_audio|tojson }}).then(() => {
+            setTimeout(() => {
+                if (voiceBtn) {
+                    voiceBtn.classList.add('listening');
+                    showStatus('Starting voice conversation...', 'info');
+                    setTimeout(() => startRecordingCycle(), 1000);
+                }
+            }, 2000);
+        });
         
         // Automatic voice conversation functionality
         let isRecording = false;
@@ -876,12 +902,12 @@ CHAT_TEMPLATE = '''
                     addMessageToChat('solstis', data.response);
                     
                     // Wait for audio to finish, then continue listening
-                    setTimeout(() => {
+                    playAudio(data.audio_url).then(() => {
                         if (isListening) {
                             showStatus('Listening for your response...', 'info');
                             setTimeout(() => startRecordingCycle(), 2000);
                         }
-                    }, 3000);
+                    });
                 } else {
                     throw new Error(data.error || 'Unknown error');
                 }
@@ -930,6 +956,7 @@ CHAT_TEMPLATE = '''
                     console.log('Speak response:', data);
                     if (data.success) {
                         showStatus('Playing audio...', 'success');
+                        playAudio(data.audio_url);
                     } else {
                         showStatus('Failed to play audio: ' + (data.error || 'Unknown error'), 'error');
                     }
@@ -961,37 +988,51 @@ CHAT_TEMPLATE = '''
 </html>
 '''
 
-def get_assistant():
-    user_name = session.get('user_name', 'there')
-    kit_type = session.get('kit_type', 'standard')
-    
-    if 'history' not in session:
-        session['history'] = [
-            {"role": "system", "content": get_system_prompt(kit_type)}
-        ]
-        # Add initial greeting
-        assistant = SolstisAssistant(user_name, kit_type)
-        initial_greeting = assistant.get_initial_greeting()
-        session['history'].append({"role": "assistant", "content": initial_greeting})
-        
+# === Server-side sessions ===
+# The cookie only holds an opaque session ID; the name, kit and messages are kept here
+session_store = create_session_store()
+
+def load_state():
+    """The visitor's (session ID, state); a new or expired session gets a fresh ID and {}"""
+    session_id = session.get('sid')
+    state = session_store.get(session_id) if session_id else None
+    if state is None:
+        return new_session_id(), {}
+    return session_id, state
+
+def save_state(session_id, state):
+    session_store.save(session_id, state)
+    if session.get('sid') != session_id:
+        session.clear()
+        session['sid'] = session_id
+
+def start_conversation(session_id, state):
+    """Reset the history to the kit greeting and speak it"""
+    assistant = SolstisAssistant(state.get('user_name', 'there'), state.get('kit_type', 'standard'))
+    initial_greeting = assistant.get_initial_greeting()
+    state['history'] = [{"role": "assistant", "content": initial_greeting}]
+    # Played by the page the handler redirects to
+    state['pending_audio'] = queue_speech(initial_greeting, session_id)
+
+def get_assistant(session_id, state):
+    if 'history' not in state:
         # Speak the initial greeting if this is a new session
-        try:
-            speak_text(initial_greeting)
-        except Exception as e:
-            print(f"Error speaking initial greeting: {e}")
+        start_conversation(session_id, state)
     
-    assistant = SolstisAssistant(user_name, kit_type)
-    assistant.conversation_history = session.get('history', [
-        {"role": "system", "content": get_system_prompt(kit_type)}
-    ])
+    assistant = SolstisAssistant(state.get('user_name', 'there'), state.get('kit_type', 'standard'))
+    assistant.conversation_history = state['history']
     return assistant
 
 @app.route('/', methods=['GET'])
 def index():
-    history = session.get('history', [])
+    session_id, state = load_state()
+    history = state.get('history', [])
     # Only show user/assistant messages
     filtered = [m for m in history if m['role'] in ('user', 'assistant')]
-    return render_template_string(CHAT_TEMPLATE, history=filtered)
+    pending_audio = state.pop('pending_audio', None)
+    if pending_audio:
+        save_state(session_id, state)
+    return render_template_string(CHAT_TEMPLATE, history=filtered, state=state, pending_audio=pending_audio)
 
 @app.route('/setup', methods=['POST'])
 def setup():
@@ -1012,24 +1053,15 @@ def setup():
         kit = KITS[0]  # Default to first kit
         kit_type = kit['id']
     
-    session['user_name'] = user_name
-    session['kit_type'] = kit_type
-    session['kit_name'] = kit['name']
-    session['kit_description'] = kit['description']
+    session_id, state = load_state()
+    state['user_name'] = user_name
+    state['kit_type'] = kit_type
+    state['kit_name'] = kit['name']
+    state['kit_description'] = kit['description']
     
     # Initialize conversation with greeting
-    assistant = SolstisAssistant(user_name, kit_type)
-    initial_greeting = assistant.get_initial_greeting()
-    session['history'] = [
-        {"role": "system", "content": get_system_prompt(kit_type)},
-        {"role": "assistant", "content": initial_greeting}
-    ]
-    
-    # Speak the initial greeting
-    try:
-        speak_text(initial_greeting)
-    except Exception as e:
-        print(f"Error speaking initial greeting: {e}")
+    start_conversation(session_id, state)
+    save_state(session_id, state)
     
     return redirect(url_for('index'))
 
@@ -1039,47 +1071,36 @@ def chat():
     if not user_input:
         return redirect(url_for('index'))
     
-    assistant = get_assistant()
+    session_id, state = load_state()
+    assistant = get_assistant(session_id, state)
     solstis_response = assistant.ask(user_input)
     
-    # Save updated history to session
-    session['history'] = assistant.conversation_history
+    # Save updated history to the session store
+    state['history'] = assistant.conversation_history
     
     # Check if this is an AJAX request (auto mode)
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        # Auto-speak the response
-        try:
-            speak_text(solstis_response)
-            return jsonify({
-                'success': True, 
-                'response': solstis_response,
-                'message': 'Response spoken automatically'
-            })
-        except Exception as e:
-            return jsonify({
-                'success': False, 
-                'response': solstis_response,
-                'error': str(e)
-            })
+        # Auto-speak the response: the browser plays audio_url while it is synthesized.
+        # Queuing it cancels a new session's greeting, so the page must not play that job later.
+        audio_url = queue_speech(solstis_response, session_id)
+        state.pop('pending_audio', None)
+        save_state(session_id, state)
+        return jsonify({
+            'success': True, 
+            'response': solstis_response,
+            'audio_url': audio_url
+        })
     
+    save_state(session_id, state)
     return redirect(url_for('index'))
 
 @app.route('/clear', methods=['POST'])
 def clear():
-    user_name = session.get('user_name', 'there')
-    kit_type = session.get('kit_type', 'standard')
-    assistant = SolstisAssistant(user_name, kit_type)
-    initial_greeting = assistant.get_initial_greeting()
-    session['history'] = [
-        {"role": "system", "content": get_system_prompt(kit_type)},
-        {"role": "assistant", "content": initial_greeting}
-    ]
-    
-    # Speak the initial greeting after clearing
-    try:
-        speak_text(initial_greeting)
-    except Exception as e:
-        print(f"Error speaking initial greeting after clear: {e}")
+    session_id, state = load_state()
+    # Stop speech from the cleared conversation, then speak the initial greeting
+    audio_jobs.cancel(session_id)
+    start_conversation(session_id, state)
+    save_state(session_id, state)
     
     return redirect(url_for('index'))
 
@@ -1124,13 +1145,22 @@ def speak_text_endpoint():
             return jsonify({'success': False, 'error': 'No text provided'})
         
         print(f"🔊 Speaking text: {text[:50]}...")
-        success = speak_text(text)
-        print(f"✅ Text-to-speech {'successful' if success else 'failed'}")
-        return jsonify({'success': success})
+        audio_url = queue_speech(text, session.get('sid'))
+        if not audio_url:
+            return jsonify({'success': False, 'error': 'Voice is disabled or busy'})
+        return jsonify({'success': True, 'audio_url': audio_url})
     except Exception as e:
         print(f"❌ Error in text-to-speech: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/audio/<job_id>', methods=['GET'])
+def audio(job_id):
+    job = audio_jobs.get(job_id)
+    if job is None:
+        abort(404)
+    # Streams chunks as the worker synthesizes them
+    return Response(job.stream(), mimetype='audio/mpeg', headers={'Cache-Control': 'no-store'})
+
 if __name__ == "__main__":
     # Development vs Production settings
     debug_mode = os.getenv("FLASK_ENV") == "development"
@@ -1142,7 +1172,7 @@ if __name__ == "__main__":
     print(f"Host: {host}")
     print(f"Port: {port}")
     print(f"Debug: {debug_mode}")
-    print(f"Voice enabled: {bool(os.getenv('ELEVENLABS_API_KEY'))}")
+    print(f"Voice enabled: {VOICE_ENABLED}")
     print(f"Available kits: {', '.join([kit['id'] for kit in KITS])}")
     
     app.run(
@@ -0,0 +1,283 @@
+"""Pipelined voice loop for solstis_voice.py: listen, transcribe, speak the reply as it streams, stop when interrupted.
+
+run() used to record, write a WAV file, transcribe it, wait for the whole
+completion and then play the whole reply, one step after another. Here the
+steps overlap:
+
+- the microphone is read continuously and SpeechDetector (mic_stream.py),
+  which tracks the room's noise floor, cuts utterances, ending one after
+  `end_ms` of quiet;
+- the reply streams token by token and is split into sentences as each one
+  completes; each sentence is synthesized while the one before it plays, so
+  the first sentence is heard before the reply is finished;
+- the microphone keeps listening while Solstis speaks. Speech during a turn
+  (barge-in) cancels its transcription, generation and playback, and becomes
+  the next turn. Only the sentences that were played are kept in the history.
+
+Each turn logs when every stage finished, relative to the end of the user's
+speech. The backends are plain functions so a stand-in can replace any of
+them:
+
+    transcribe(pcm) -> str
+    stream_reply(messages) -> iterator of text deltas
+    synthesize(text) -> iterator of PCM chunks
+
+Audio is 16 kHz 16-bit mono PCM throughout. The device reads one FRAME_MS
+frame per read() and plays PCM passed to write(); PyAudioDevice is the
+real one.
+"""
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from mic_stream import FRAME_MS, SAMPLE_RATE, SpeechDetector
+
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2
+# Playback is written in short slices so a barge-in silences it within one slice
+PLAYBACK_SLICE_BYTES = FRAME_BYTES * 2
+
+CLEAR_COMMAND = "clear"
+CLEARED_REPLY = "Conversation history cleared."
+
+# A sentence ends at ., ! or ? (and any closing quotes or brackets) followed by whitespace
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+_DONE = object()
+
+
+class SentenceChunker:
+    """Splits streamed text into sentences as soon as each one is complete.
+
+    Sentences shorter than `min_chars` ("Good.") are joined to the next one,
+    so TTS is not asked for a fragment at a time.
+    """
+
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self.buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self.buffer[start:match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return rest or None
+
+
+class TurnTimings:
+    """When each stage of a turn finished, in ms after the end of the user's speech."""
+
+    STAGES = ('transcribed', 'first_token', 'first_sentence', 'first_audio', 'playing', 'done', 'interrupted')
+
+    def __init__(self, number, speech_end):
+        self.number = number
+        self.speech_end = speech_end
+        self.marks = {}
+
+    def mark(self, stage):
+        self.marks.setdefault(stage, (time.perf_counter() - self.speech_end) * 1000)
+
+    def __str__(self):
+        stages = [f"{stage} +{self.marks[stage]:.0f} ms" for stage in self.STAGES if stage in self.marks]
+        return f"⏱️ Turn {self.number}: " + ", ".join(stages)
+
+
+class PyAudioDevice:
+    """Microphone and speaker through PyAudio, both 16 kHz mono."""
+
+    def __init__(self):
+        import pyaudio
+        self.pyaudio = pyaudio.PyAudio()
+        self.input = self.pyaudio.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+                                       frames_per_buffer=FRAME_BYTES // 2)
+        self.output = self.pyaudio.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, output=True)
+
+    def read(self):
+        return self.input.read(FRAME_BYTES // 2, exception_on_overflow=False)
+
+    def write(self, pcm):
+        self.output.write(pcm)
+
+    def close(self):
+        self.input.close()
+        self.output.close()
+        self.pyaudio.terminate()
+
+
+class VoicePipeline:
+    """The voice loop: `assistant.history` is the conversation, `assistant.clear()` resets it."""
+
+    def __init__(self, device, assistant, transcribe, stream_reply, synthesize, threshold=300.0,
+                 end_ms=700, barge_in_factor=3.0, barge_in_ms=200, log=print):
+        self.device = device
+        self.assistant = assistant
+        self.transcribe = transcribe
+        self.stream_reply = stream_reply
+        self.synthesize = synthesize
+        # While Solstis is speaking the microphone also hears the speaker, so barge-in needs louder,
+        # longer speech than starting a turn does
+        self.vad = SpeechDetector(threshold, end_ms=end_ms)
+        self.barge_in_factor = barge_in_factor
+        self.barge_in_ms = barge_in_ms
+        self.log = log
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="voice")
+        self.turn = None  # the in-flight turn's task
+        self.playing = False
+        self.turns = []  # TurnTimings of every turn, newest last
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        frames = asyncio.Queue()
+        stop = threading.Event()
+
+        def read_microphone():
+            while not stop.is_set():
+                loop.call_soon_threadsafe(frames.put_nowait, self.device.read())
+
+        reader = threading.Thread(target=read_microphone, name="microphone", daemon=True)
+        reader.start()
+        try:
+            await self.listen(frames)
+        finally:
+            stop.set()
+            if self.turn:
+                self.turn.cancel()
+
+    async def listen(self, frames):
+        preroll = deque(maxlen=10)  # audio just before speech was detected, so the first word is kept
+        utterance = bytearray()
+        self.log("🎤 Listening...")
+        while True:
+            frame = await frames.get()
+            if self.playing:
+                event = self.vad.feed(frame, self.barge_in_factor, self.barge_in_ms)
+            else:
+                event = self.vad.feed(frame)
+            if event == 'start':
+                utterance = bytearray(b"".join(preroll))
+                if self.turn and not self.turn.done():
+                    self.log("✋ Barge-in: stopping the reply")
+                    self.turn.cancel()
+            if self.vad.in_speech or event == 'end':
+                utterance += frame
+            else:
+                preroll.append(frame)
+            if event == 'end':
+                timings = TurnTimings(len(self.turns) + 1, time.perf_counter())
+                self.turns.append(timings)
+                self.turn = asyncio.ensure_future(self.respond(bytes(utterance), timings))
+
+    async def _iterate(self, factory, cancelled):
+        """Runs a blocking iterator on the executor, yielding its items on the event loop."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def pump():
+            iterator = factory()
+            try:
+                for item in iterator:
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+                loop.call_soon_threadsafe(queue.put_nowait, (_DONE, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (_DONE, e))
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close:
+                    close()
+
+        loop.run_in_executor(self.executor, pump)
+        while True:
+            item, error = await queue.get()
+            if error:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+
+    async def respond(self, pcm, timings):
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+        sentences = asyncio.Queue()
+        audio = asyncio.Queue(maxsize=64)
+        spoken = []
+        user_text = None
+
+        async def generate(reply_factory):
+            chunker = SentenceChunker()
+            async for delta in self._iterate(reply_factory, cancelled):
+                timings.mark('first_token')
+                for sentence in chunker.feed(delta):
+                    timings.mark('first_sentence')
+                    await sentences.put(sentence)
+            rest = chunker.flush()
+            if rest:
+                timings.mark('first_sentence')
+                await sentences.put(rest)
+            await sentences.put(None)
+
+        async def synthesize():
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    break
+                async for chunk in self._iterate(lambda: self.synthesize(sentence), cancelled):
+                    timings.mark('first_audio')
+                    await audio.put(chunk)
+                await audio.put(sentence)  # played to here: the sentence was heard
+            await audio.put(None)
+
+        async def play():
+            while True:
+                chunk = await audio.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, str):
+                    spoken.append(chunk)
+                    continue
+                timings.mark('playing')
+                self.playing = True
+                for start in range(0, len(chunk), PLAYBACK_SLICE_BYTES):
+                    await loop.run_in_executor(self.executor, self.device.write,
+                                               chunk[start:start + PLAYBACK_SLICE_BYTES])
+
+        try:
+            user_text = (await loop.run_in_executor(self.executor, self.transcribe, pcm)).strip()
+            timings.mark('transcribed')
+            if not user_text:
+                return
+            self.log(f"🧠 You said: {user_text}")
+            if user_text.lower().strip(" .!") == CLEAR_COMMAND:
+                self.assistant.clear()
+                user_text = None
+                reply_factory = lambda: iter([CLEARED_REPLY])  # noqa: E731
+            else:
+                self.assistant.history.append({"role": "user", "content": user_text})
+                messages = list(self.assistant.history)
+                reply_factory = lambda: self.stream_reply(messages)  # noqa: E731
+            await asyncio.gather(generate(reply_factory), synthesize(), play())
+            timings.mark('done')
+        except asyncio.CancelledError:
+            timings.mark('interrupted')
+            raise
+        except Exception as e:
+            self.log(f"⚠️ Error: {e}")
+        finally:
+            cancelled.set()
+            self.playing = False
+            if user_text and spoken:
+                reply = " ".join(spoken)
+                self.assistant.history.append({"role": "assistant", "content": reply})
+                self.log(f"💬 Solstis: {reply}\n")
+            self.log(str(timings))
@@ -4,6 +4,24 @@ import ImageUploader from './ImageUploader';
 import MessageList from './MessageList';
 import './Chat.css';
 
+// Same text as GREETING in api/app.py, whose audio the server synthesizes at startup
+const greetingBody = (kitName) => `I'm here to help with your ${kitName}. If this is a life-threatening emergency, please call 911 immediately. Otherwise, I'll guide you step-by-step. Can you tell me what happened?`;
+
+// The part of a reply left to speak once its emergency directive has been spoken
+const unspokenPart = (reply, directive) => {
+  if (!directive) return reply;
+  const normalize = (text) => text.toLowerCase().replace(/[^a-z0-9]+/g, ' ').trim();
+  if (normalize(reply) === normalize(directive)) return '';
+  return reply.split(directive).join(' ').trim();
+};
+
+// Browser speech, resolving once the utterance has finished
+const speakUtterance = (utterance) => new Promise((resolve) => {
+  utterance.onend = resolve;
+  utterance.onerror = resolve;
+  speechSynthesis.speak(utterance);
+});
+
 const Chat = ({ user, onLogout }) => {
   const [messages, setMessages] = useState([]);
   const [inputText, setInputText] = useState('');
@@ -11,6 +29,8 @@ const Chat = ({ user, onLogout }) => {
   const [isListening, setIsListening] = useState(false);
   const [status, setStatus] = useState('');
   const messagesEndRef = useRef(null);
+  // Speech plays one utterance at a time, in the order it was queued
+  const speechQueue = useRef(Promise.resolve());
 
   // Auto-scroll to bottom
   const scrollToBottom = () => {
@@ -23,7 +43,7 @@ const Chat = ({ user, onLogout }) => {
 
   // Initialize with greeting
   useEffect(() => {
-    const greeting = `Hey ${user.name}. I'm here to help with your ${user.kit.name}. If this is a life-threatening emergency, please call 911 immediately. Otherwise, I'll guide you step-by-step. Can you tell me what happened?`;
+    const greeting = `Hey ${user.name}. ${greetingBody(user.kit.name)}`;
     
     setMessages([
       {
@@ -34,10 +54,17 @@ const Chat = ({ user, onLogout }) => {
       }
     ]);
 
-    // Speak the greeting
-    speakText(greeting);
+    // Speak the greeting: the name, then the part the server already has audio for
+    queueSpeech(`Hey ${user.name}.`);
+    queueSpeech(greetingBody(user.kit.name));
   }, [user]);
 
+  const queueSpeech = (text) => {
+    if (!text) return speechQueue.current;
+    speechQueue.current = speechQueue.current.then(() => speakText(text));
+    return speechQueue.current;
+  };
+
   const speakText = async (text) => {
     try {
       const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5001';
@@ -59,14 +86,17 @@ const Chat = ({ user, onLogout }) => {
         const audioBlob = await response.blob();
         const audioUrl = URL.createObjectURL(audioBlob);
         
-        // Play the audio
+        // Play the audio, resolving once it has finished
         const audio = new Audio(audioUrl);
-        audio.play();
-        
-        // Clean up the URL after playing
-        audio.onended = () => {
-          URL.revokeObjectURL(audioUrl);
-        };
+        await new Promise((resolve) => {
+          // Clean up the URL after playing
+          audio.onended = () => {
+            URL.revokeObjectURL(audioUrl);
+            resolve();
+          };
+          audio.onerror = resolve;
+          audio.play().catch(resolve);
+        });
       } else {
         console.warn('ElevenLabs TTS failed, falling back to browser TTS');
         // Fallback to browser TTS if ElevenLabs fails
@@ -88,7 +118,7 @@ const Chat = ({ user, onLogout }) => {
             utterance.voice = preferredVoice;
           }
           
-          speechSynthesis.speak(utterance);
+          await speakUtterance(utterance);
         }
       }
     } catch (error) {
@@ -99,7 +129,7 @@ const Chat = ({ user, onLogout }) => {
         utterance.rate = 0.9;
         utterance.pitch = 1;
         utterance.volume = 1;
-        speechSynthesis.speak(utterance);
+        await speakUtterance(utterance);
       }
     }
   };
@@ -129,27 +159,52 @@ const Chat = ({ user, onLogout }) => {
         body: JSON.stringify({
           user_input: text.trim(),
           user_name: user.name,
-          kit_type: user.kitType
+          kit_type: user.kitType,
+          stream: true
         })
       });
 
-      if (response.ok) {
-        const data = await response.json();
-        
-        const assistantMessage = {
-          id: Date.now() + 1,
+      if (!response.ok) {
+        throw new Error('Failed to get response');
+      }
+
+      // Newline-delimited JSON: an emergency directive may arrive before the full reply
+      let directive = null;
+      const addAssistantMessage = (content, emergency, spoken = content) => {
+        setMessages(prev => [...prev, {
+          id: Date.now() + prev.length,
           role: 'assistant',
-          content: data.response,
+          content,
+          emergency,
           timestamp: new Date()
-        };
+        }]);
+        queueSpeech(spoken);
+      };
 
-        setMessages(prev => [...prev, assistantMessage]);
-        setStatus('Response received');
-        
-        // Speak the response
-        speakText(data.response);
-      } else {
-        throw new Error('Failed to get response');
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const event = JSON.parse(line);
+          if (event.type === 'emergency') {
+            directive = event.response;
+            addAssistantMessage(event.response, true);
+            setStatus('Emergency: call 9-1-1');
+          } else if (event.type === 'response') {
+            // Don't read the directive out a second time if the reply repeats it
+            addAssistantMessage(event.response, false, unspokenPart(event.response, directive));
+            setStatus('Response received');
+          } else {
+            throw new Error(event.error || 'Failed to get response');
+          }
+        }
       }
     } catch (error) {
       console.error('Chat error:', error);
@@ -183,7 +238,7 @@ const Chat = ({ user, onLogout }) => {
     setMessages(prev => [...prev, userMessage, assistantMessage]);
     
     // Speak the analysis
-    speakText(analysis);
+    queueSpeech(analysis);
     
     // The conversation context will be maintained through the messages state
     // and sent to the backend on the next chat message
@@ -194,7 +249,7 @@ const Chat = ({ user, onLogout }) => {
       const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5001';
       await fetch(`${apiUrl}/api/clear`, { method: 'POST' });
       
-      const greeting = `Hey ${user.name}. I'm here to help with your ${user.kit.name}. If this is a life-threatening emergency, please call 911 immediately. Otherwise, I'll guide you step-by-step. Can you tell me what happened?`;
+      const greeting = `Hey ${user.name}. ${greetingBody(user.kit.name)}`;
       
       setMessages([
         {
@@ -205,7 +260,8 @@ const Chat = ({ user, onLogout }) => {
         }
       ]);
 
-      speakText(greeting);
+      queueSpeech(`Hey ${user.name}.`);
+      queueSpeech(greetingBody(user.kit.name));
       setStatus('Conversation cleared');
     } catch (error) {
       console.error('Clear error:', error);
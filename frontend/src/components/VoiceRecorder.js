@@ -1,6 +1,29 @@
 import React, { useEffect, useRef, useState } from 'react';
 import './VoiceRecorder.css';
 
+const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5001';
+
+// Sample rate of the PCM frames streamed to /api/stt/stream
+const STREAM_SAMPLE_RATE = 16000;
+
+// Average Float32 samples down to 16 kHz and convert them to 16-bit PCM
+const toPcm16 = (samples, sampleRate) => {
+  const ratio = sampleRate / STREAM_SAMPLE_RATE;
+  const length = Math.floor(samples.length / ratio);
+  const pcm = new Int16Array(length);
+  for (let i = 0; i < length; i++) {
+    const start = Math.floor(i * ratio);
+    const end = Math.max(start + 1, Math.floor((i + 1) * ratio));
+    let sum = 0;
+    for (let j = start; j < end; j++) {
+      sum += samples[j];
+    }
+    const value = Math.max(-1, Math.min(1, sum / (end - start)));
+    pcm[i] = value < 0 ? value * 0x8000 : value * 0x7fff;
+  }
+  return pcm.buffer;
+};
+
 const VoiceRecorder = ({ onTranscript, isListening, setIsListening, disabled }) => {
   const [debugInfo, setDebugInfo] = useState('Click to start');
   const [isRecording, setIsRecording] = useState(false);
@@ -10,6 +33,83 @@ const VoiceRecorder = ({ onTranscript, isListening, setIsListening, disabled })
   const streamRef = useRef(null);
   const silenceTimerRef = useRef(null);
   const lastChunkTimeRef = useRef(0);
+  const socketRef = useRef(null);
+  const audioContextRef = useRef(null);
+  const processorRef = useRef(null);
+
+  // Stream PCM frames to /api/stt/stream while the user speaks. The server pushes partial
+  // transcripts and sends the final one as soon as it hears the end of speech.
+  // Resolves false if the socket cannot be opened, so the caller can fall back to uploading.
+  const startStreaming = (stream) => new Promise((resolve) => {
+    const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+    if (!window.WebSocket || !AudioContextClass) {
+      resolve(false);
+      return;
+    }
+    const socket = new WebSocket(`${apiUrl.replace(/^http/, 'ws')}/api/stt/stream`);
+    let opened = false;
+    
+    socket.onopen = () => {
+      opened = true;
+      socketRef.current = socket;
+      socket.send(JSON.stringify({ type: 'start', sample_rate: STREAM_SAMPLE_RATE }));
+      
+      const context = new AudioContextClass();
+      audioContextRef.current = context;
+      const source = context.createMediaStreamSource(stream);
+      const processor = context.createScriptProcessor(1024, 1, 1);
+      processor.onaudioprocess = (event) => {
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(toPcm16(event.inputBuffer.getChannelData(0), context.sampleRate));
+        }
+      };
+      source.connect(processor);
+      processor.connect(context.destination);
+      processorRef.current = processor;
+      
+      console.log('▶️ Streaming started');
+      setDebugInfo('Streaming - speak now!');
+      setIsRecording(true);
+      setIsListening(true);
+      resolve(true);
+    };
+    
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'partial') {
+        setDebugInfo(`Hearing: "${message.text}"`);
+      } else if (message.type === 'final') {
+        console.log('✅ Final transcript:', message.text, `(${message.reason})`);
+        setDebugInfo(`Transcript: "${message.text}"`);
+        socketRef.current = null;
+        stopCapture();
+        if (message.text && message.text.trim()) {
+          onTranscript(message.text.trim());
+        }
+      } else if (message.type === 'error') {
+        console.error('❌ STT stream error:', message.error);
+        setDebugInfo(`STT Error: ${message.error}`);
+        socketRef.current = null;
+        stopCapture();
+      }
+    };
+    
+    socket.onerror = () => {
+      if (!opened) {
+        console.log('⚠️ STT stream unavailable, recording for upload instead');
+        resolve(false);
+      }
+    };
+    
+    socket.onclose = () => {
+      if (!opened) {
+        resolve(false);
+      } else if (socketRef.current === socket) {
+        socketRef.current = null;
+        stopCapture();
+      }
+    };
+  });
 
   const startRecording = async () => {
     console.log('🔴 Starting recording...');
@@ -32,6 +132,10 @@ const VoiceRecorder = ({ onTranscript, isListening, setIsListening, disabled })
       console.log('✅ Microphone access granted');
       setDebugInfo('Microphone access granted');
       
+      if (await startStreaming(stream)) {
+        return;
+      }
+      
       // Step 2: Create MediaRecorder with supported format
       console.log('📹 Creating MediaRecorder...');
       
@@ -119,6 +223,23 @@ const VoiceRecorder = ({ onTranscript, isListening, setIsListening, disabled })
     console.log('🛑 Stopping recording...');
     setDebugInfo('Stopping recording...');
     
+    // Streaming: ask the server to finalize with the audio it has; the transcript arrives on the socket
+    if (socketRef.current && socketRef.current.readyState === WebSocket.OPEN) {
+      socketRef.current.send(JSON.stringify({ type: 'stop' }));
+    }
+    stopCapture();
+  };
+
+  const stopCapture = () => {
+    if (processorRef.current) {
+      processorRef.current.disconnect();
+      processorRef.current = null;
+    }
+    if (audioContextRef.current) {
+      audioContextRef.current.close();
+      audioContextRef.current = null;
+    }
+    
     // Clear silence timer
     if (silenceTimerRef.current) {
       clearTimeout(silenceTimerRef.current);
@@ -160,7 +281,6 @@ const VoiceRecorder = ({ onTranscript, isListening, setIsListening, disabled })
       console.log('📤 Sending complete audio to STT API...');
       setDebugInfo('Sending to STT API...');
       
-      const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5001';
       const response = await fetch(`${apiUrl}/api/stt`, {
         method: 'POST',
         body: formData
@@ -221,6 +341,12 @@ const VoiceRecorder = ({ onTranscript, isListening, setIsListening, disabled })
   // Cleanup on unmount
   useEffect(() => {
     return () => {
+      if (socketRef.current) {
+        socketRef.current.close();
+      }
+      if (audioContextRef.current) {
+        audioContextRef.current.close();
+      }
       if (mediaRecorderRef.current) {
         mediaRecorderRef.current.stop();
       }